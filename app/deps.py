@@ -1,9 +1,12 @@
 # app/deps.py
 from __future__ import annotations
 import os
+import time
 from typing import AsyncIterator, Optional, Any
 from fastapi import Header, HTTPException, Request
 
+from app.services import metrics
+
 # --- API Key 依赖（兼容两种环境变量名） ---
 def require_api_key(x_api_key: Optional[str] = Header(None)) -> None:
     expected = os.getenv("API_KEY") or os.getenv("PORTPULSE_API_KEY")
@@ -25,7 +28,9 @@ async def get_conn(request: Request) -> AsyncIterator[Any]:
         # 无数据库也可运行
         yield NoopConn()
         return
+    t0 = time.perf_counter()
     conn = await pool.acquire()
+    metrics.DB_POOL_WAIT.observe(time.perf_counter() - t0)
     try:
         yield conn
     finally:
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 import uuid
+from contextlib import asynccontextmanager
 from http import HTTPStatus
 from typing import Optional, Set
 
@@ -15,16 +16,6 @@ from starlette.middleware.base import BaseHTTPMiddleware
 # ✨ 新增：CORS 中间件
 from fastapi.middleware.cors import CORSMiddleware
 
-# --- Sentry（可选） ---
-SENTRY_DSN = os.getenv("SENTRY_DSN")
-if SENTRY_DSN:
-    try:
-        import sentry_sdk
-        from sentry_sdk.integrations.fastapi import FastAPIIntegration
-        sentry_sdk.init(dsn=SENTRY_DSN, traces_sample_rate=0.05, integrations=[FastAPIIntegration()])
-    except Exception:
-        pass
-
 # --- 外部中间件（有则用） ---
 try:
     from app.middlewares.request_id import RequestIdMiddleware as ExternalRequestIdMw
@@ -37,7 +28,15 @@ except Exception:
     ExternalApiKeyMw = None
 
 from app.middlewares.rate_limit import RateLimitMiddleware
-from app.openapi_extra import add_api_key_security
+from app.middlewares.metrics import MetricsMiddleware
+from app.middlewares.profiling import ProfileMiddleware, ProfileAppSpan
+from app.middlewares.compression import CompressionMiddleware
+from app.middlewares.admission import AdmissionMiddleware
+from app.middlewares.usage import UsageMiddleware
+from app.middlewares.access_log import AccessLogMiddleware
+from app.openapi_extra import install_openapi
+from app.services import access_log, admission, freshness, invalidation, port_data, usage, warmup
+from app.services.json_codec import FastJSONResponse
 
 
 # ---------- 本地兜底中间件 ----------
@@ -59,7 +58,7 @@ class _LocalApiKeyMiddleware(BaseHTTPMiddleware):
         self.valid = set(k for k in (valid_keys or set()) if k)
         self.demo = demo_key
         self._public_paths = {
-            "/", "/v1/health", "/openapi.json", "/docs", "/redoc", "/robots.txt",
+            "/", "/v1/health", "/v1/ready", "/openapi.json", "/docs", "/redoc", "/robots.txt", "/metrics",
             # 验收需要公开的两个元信息端点
             "/v1/meta/sources", "/v1/sources",
         }
@@ -122,7 +121,7 @@ class _CommonHeadersMiddleware(BaseHTTPMiddleware):
         # 暴露关键头，便于前端获取
         response.headers.setdefault(
             "Access-Control-Expose-Headers",
-            "ETag, Content-Length, Content-Type, X-Request-ID",
+            "ETag, Content-Length, Content-Type, X-Request-ID, X-Data-Stale",
         )
 
         # 只读端点默认缓存策略（若业务已设置则尊重，并补齐 no-transform）
@@ -148,7 +147,57 @@ def _collect_keys() -> tuple[Set[str], Optional[str]]:
     return keys, demo_key
 
 
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # 启动：从已落盘的覆盖/派生文件恢复每港口最新数据时间（/v1/meta/freshness）
+    try:
+        freshness.TRACKER.bootstrap()
+    except Exception:
+        pass
+    # 跨 worker 缓存失效：LISTEN（有 DB）/ 跟读本地失效日志（app/services/invalidation.py）
+    bus = invalidation.start(port_data.get_repository())
+    # 后台预热 Core30，完成前 /v1/ready = 503（app/services/warmup.py）
+    warm = warmup.start(app)
+    # 按 key 计量：后台批量刷库，关闭时再刷一次（app/services/usage.py）
+    meter = usage.start()
+    # 访问日志：队列 + 后台写线程（app/services/access_log.py）
+    access = access_log.start()
+    yield
+    if warm is not None:
+        warm.cancel()
+    await usage.stop(meter)
+    access_log.stop(access)
+    await invalidation.stop(bus)
+    # 关闭：PortDataRepository 的 DB 后端按需建的连接池
+    try:
+        from app.services.deps import close_db_pool
+        await close_db_pool()
+    except Exception:
+        pass
+
+
+def _init_sentry() -> None:
+    """Sentry（可选）：仅配置了 SENTRY_DSN 才导入 sentry_sdk（它本身的 import 就不便宜）。"""
+    dsn = os.getenv("SENTRY_DSN")
+    if not dsn:
+        return
+    try:
+        import sentry_sdk
+        from sentry_sdk.integrations.fastapi import FastAPIIntegration
+        sentry_sdk.init(dsn=dsn, traces_sample_rate=0.05, integrations=[FastAPIIntegration()])
+    except Exception:
+        pass
+
+
+def _env_on(name: str, default: bool = False) -> bool:
+    v = os.getenv(name, "").strip().lower()
+    if not v:
+        return default
+    return v in ("1", "true", "yes", "on")
+
+
 def create_app() -> FastAPI:
+    _init_sentry()
     app = FastAPI(
         title="PortPulse API",
         version=os.getenv("APP_VERSION", "0.1.1"),
@@ -160,8 +209,20 @@ def create_app() -> FastAPI:
             "  - Demo: header `X-API-Key: dev_demo_123`\n"
             "  - Production: `X-API-Key: <pp_xxx>` or `Authorization: Bearer <key>`\n"
         ),
+        lifespan=_lifespan,
+        # orjson + 排序键（app/services/json_codec.py）；热点路由直接返回 json_response() 跳过 jsonable_encoder
+        default_response_class=FastJSONResponse,
     )
 
+    # 按需剖析（仅配置了 ADMIN_API_KEY 时挂载）：最内层标记“路由+业务”span
+    profiling_on = bool(os.getenv("ADMIN_API_KEY", "").strip())
+    if profiling_on:
+        app.add_middleware(ProfileAppSpan)
+
+    # 响应压缩：必须紧贴路由（外层 BaseHTTPMiddleware 会把 body 改成分块流），见 app/middlewares/compression.py
+    if not os.getenv("DISABLE_COMPRESSION"):
+        app.add_middleware(CompressionMiddleware)
+
     # ✨ 新增：CORS（放开只读端点；公开 API 建议 *）
     app.add_middleware(
         CORSMiddleware,
@@ -181,6 +242,14 @@ def create_app() -> FastAPI:
     # ✨ 新增：统一响应头（暴露头/缓存策略）
     app.add_middleware(_CommonHeadersMiddleware)
 
+    # 准入控制：按路由类别自适应限并发，排不上的快速 503（在鉴权/限流之内，401/429 不占名额）
+    if admission.enabled():
+        app.add_middleware(AdmissionMiddleware)
+
+    # 按 key 计量：在鉴权之内（401 不计）、准入控制之外（503 也记上）；只累加内存计数
+    if usage.enabled():
+        app.add_middleware(UsageMiddleware)
+
     valid_keys, demo_key = _collect_keys()
     if ExternalApiKeyMw:
         try:
@@ -194,28 +263,39 @@ def create_app() -> FastAPI:
         app.add_middleware(RateLimitMiddleware)
 
     # 路由
-    from app.routers import meta, hs, alerts, ports, health  # noqa: E402
+    from app.routers import meta, hs, alerts, ports, health, metrics, datasets, usage as usage_router  # noqa: E402
     app.include_router(meta.router)                         # /v1 + /v1/meta/sources + /v1/sources
     app.include_router(hs.router, prefix="/v1/hs", tags=["hs"])
     app.include_router(alerts.router, prefix="/v1", tags=["alerts"])
     app.include_router(ports.router, prefix="/v1/ports", tags=["ports"])
+    app.include_router(datasets.router)  # /v1/datasets（夜间全量导出，静态文件 + Range）
     app.include_router(health.router)  # /v1/health
+    app.include_router(metrics.router)  # /metrics（Prometheus 抓取，免鉴权）
+    app.include_router(usage_router.router)  # /v1/usage（调用方 key 的用量）
 
+    # 可选路由：按开关才 import（冷启动不为用不到的模块买单）
     # 可选 Trio 端点
     try:
-        if os.getenv("ENABLE_PORTS_TRIO", "").strip().lower() in ("1","true","yes","on"):
+        if _env_on("ENABLE_PORTS_TRIO"):
             from app.routers import ports_trio  # noqa: E402
             app.include_router(ports_trio.router, prefix="/v1/ports", tags=["ports"])
     except Exception:
         pass
 
-    # Admin（可选）
+    # Admin 回填（可选）：默认仅在配置了 BACKFILL_SECRET / ADMIN_SECRET 时挂载（未配置时本就只会 503）
     try:
-        from app.routers import admin_backfill  # noqa: E402
-        app.include_router(admin_backfill.router, prefix="/v1/admin", tags=["admin"])
+        if _env_on("ENABLE_ADMIN_BACKFILL",
+                   default=bool(os.getenv("BACKFILL_SECRET") or os.getenv("ADMIN_SECRET"))):
+            from app.routers import admin_backfill  # noqa: E402
+            app.include_router(admin_backfill.router, prefix="/v1/admin", tags=["admin"])
     except Exception:
         pass
 
+    # Admin debug：剖析结果浏览（/v1/admin/debug/profiles），与剖析中间件同开关
+    if profiling_on:
+        from app.routers import admin_debug  # noqa: E402
+        app.include_router(admin_debug.router, prefix="/v1/admin", tags=["admin"])
+
     # devportal（可选）
     try:
         if os.path.isdir("docs/devportal"):
@@ -257,6 +337,17 @@ def create_app() -> FastAPI:
                      "request_id": rid, "hint": ""},
         )
 
+    # 回源超时（services/singleflight.py 的 per-key timeout）：503 + Retry-After，而不是 500
+    @app.exception_handler(TimeoutError)
+    async def _timeout_exc(request: Request, exc: TimeoutError):
+        rid = _request_id(request)
+        return JSONResponse(
+            status_code=503,
+            headers={"x-request-id": rid, "Retry-After": "1"},
+            content={"code": "http_503", "message": "Upstream data source timed out", "request_id": rid,
+                     "hint": "retry shortly"},
+        )
+
     @app.exception_handler(Exception)
     async def _any_exc(request: Request, exc: Exception):
         rid = _request_id(request)
@@ -266,7 +357,15 @@ def create_app() -> FastAPI:
             content={"code": "http_500", "message": "Internal Server Error", "request_id": rid, "hint": ""},
         )
 
-    add_api_key_security(app)
+    # /openapi.json：白名单 + 别名 + 鉴权方案，一次生成、预压缩、强 ETag（app/openapi_extra.py）
+    install_openapi(app)
+    # 指标：包住鉴权/限流，401/429 也计入；health bypass 仍在最外层
+    app.add_middleware(MetricsMiddleware)
+    # 访问日志：在指标之外（401 / 429 / 503 也有记录）；事件循环里只入队
+    if access_log.enabled():
+        app.add_middleware(AccessLogMiddleware)
+    if profiling_on:
+        app.add_middleware(ProfileMiddleware)  # X-Profile: 1 + 管理员 key
     app.add_middleware(_HealthBypassMiddleware)  # 放最后
 
     return app
@@ -304,70 +403,6 @@ class _PortsUnlocodeGuardMiddleware(_BHM):
                 break
         return await call_next(request)
 
-# === OpenAPI schema whitelist + alias (contract-only) ===
-from fastapi.openapi.utils import get_openapi
-
-_OPENAPI_PATH_WHITELIST = {
-    "/v1/health",
-    "/v1/meta/sources",   # 主口径
-    "/v1/sources",        # 兼容别名
-    "/v1/ports/{unlocode}/overview",
-    "/v1/ports/{unlocode}/trend",
-    "/v1/ports/{unlocode}/snapshot",
-    "/v1/ports/{unlocode}/dwell",
-    "/v1/ports/{unlocode}/alerts",
-    "/v1/hs/{hs_code}/imports",
-}
-_OPENAPI_ALIASES = {
-    "/v1/hs/{code}/imports": "/v1/hs/{hs_code}/imports",
-}
-
-_cached_openapi_schema = None
-
-def custom_openapi():
-    """Contract-only OpenAPI: whitelist + alias, cached."""
-    global _cached_openapi_schema
-    if _cached_openapi_schema is not None:
-        return _cached_openapi_schema
-
-    schema = get_openapi(
-        title=app.title,
-        version=app.version,
-        description=getattr(app, "description", None),
-        routes=app.routes,
-    )
-
-    paths = schema.get("paths", {}) or {}
-    filtered = {k: v for k, v in paths.items() if k in _OPENAPI_PATH_WHITELIST}
-
-    import copy
-    for alias, src in _OPENAPI_ALIASES.items():
-        if src in filtered and alias not in filtered:
-            filtered[alias] = copy.deepcopy(filtered[src])
-
-    schema["paths"] = filtered
-    _cached_openapi_schema = schema
-    return _cached_openapi_schema
-
-# 覆盖一次即可（放在文件结尾其他 openapi 覆盖语句之前/替换之）
-app.openapi = custom_openapi  # type: ignore
-
-# --- OpenAPI fixup: ensure /v1/hs/{code}/imports alias key is present (acceptance contract) ---
-try:
-    schema = app.openapi()
-    if isinstance(schema, dict):
-        paths = schema.get("paths", {}) or {}
-        src = "/v1/hs/{hs_code}/imports"
-        alias = "/v1/hs/{code}/imports"
-        if src in paths and alias not in paths:
-            paths[alias] = paths[src]
-            schema["paths"] = paths
-            app.openapi_schema = schema
-except Exception:
-    # 不影响服务主流程
-    pass
-
-
 # ✨ 新增：兜底 OPTIONS（用于 CORS 预检；让未显式声明的路径也返回 204）
 @app.options("/{full_path:path}")
 async def _options_all(full_path: str):
@@ -0,0 +1,76 @@
+# app/middlewares/access_log.py
+"""
+结构化访问日志（app/services/access_log.py）：响应发完后拼一行字段入队，写文件在后台线程。
+
+纯 ASGI，挂在指标中间件之外（401 / 429 / 503 都有记录）；探针与 /metrics 抓取不记。
+"""
+from __future__ import annotations
+
+import time
+from datetime import datetime, timezone
+
+from app.middlewares.metrics import route_template
+from app.services import access_log, metrics, tiers, usage
+
+SKIP_PATHS = {"/v1/health", "/v1/ready", "/metrics"}
+
+
+def _cache_status(status: int, stale: bool, seen: dict):
+    if status == 304:
+        return "revalidated"
+    if stale:
+        return "stale"
+    return seen.get("port_data")
+
+
+class AccessLogMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in SKIP_PATHS or not access_log.active():
+            return await self.app(scope, receive, send)
+
+        t0 = time.perf_counter()
+        status, nbytes, rid, stale = 500, 0, None, False
+        seen: dict = {}
+        token = metrics.REQUEST_CACHE.set(seen)
+
+        async def _send(message):
+            nonlocal status, nbytes, rid, stale
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for k, v in message.get("headers") or ():
+                    k = k.lower()
+                    if k == b"x-request-id":
+                        rid = v.decode("latin-1")
+                    elif k == b"x-data-stale":
+                        stale = True
+            elif message["type"] == "http.response.body":
+                nbytes += len(message.get("body") or b"")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            metrics.REQUEST_CACHE.reset(token)
+            sample = access_log.sampled(status)
+            if sample is not None:
+                if rid is None:
+                    rid = next((v.decode("latin-1") for k, v in scope.get("headers") or ()
+                                if k.lower() == b"x-request-id"), None)
+                key = tiers.api_key(scope)
+                access_log.log({
+                    "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                    "request_id": rid,
+                    "method": scope.get("method"),
+                    "path": scope.get("path"),
+                    "query": (scope.get("query_string") or b"").decode("latin-1"),
+                    "route": route_template(scope),
+                    "status": status,
+                    "latency_ms": round((time.perf_counter() - t0) * 1000, 2),
+                    "bytes": nbytes,
+                    "key": usage.key_id(key) if key else None,
+                    "cache": _cache_status(status, stale, seen),
+                    "sample": sample,
+                })
@@ -0,0 +1,72 @@
+# app/middlewares/admission.py
+"""
+准入控制（app/services/admission.py）：按路由类别限并发、按 key 等级排优先级（app/services/tiers.py），
+排不上队的请求快速 503 + Retry-After。
+
+纯 ASGI 实现，挂在鉴权 / 限流之内：401 / 429 不占名额；名额一直占到响应发完，
+但自适应用的延迟取“首字节”（导出流式发送的时长不算进处理延迟）。
+"""
+from __future__ import annotations
+
+import math
+import time
+import uuid
+
+from starlette.responses import JSONResponse
+
+from app.services import admission, tiers
+
+SKIP_PATHS = {"/", "/v1/health", "/v1/ready", "/metrics", "/openapi.json", "/docs", "/redoc", "/robots.txt"}
+
+
+def _request_id(scope) -> str:
+    for k, v in scope.get("headers") or ():
+        if k.lower() == b"x-request-id":
+            return v.decode("latin-1")
+    return str(uuid.uuid4())
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: admission.Controller | None = None):
+        self.app = app
+        self.controller = controller or admission.CONTROLLER
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS" or scope.get("path") in SKIP_PATHS:
+            return await self.app(scope, receive, send)
+        lane = self.controller.lane(scope)
+        tier = tiers.tier_for(scope)
+        tiers.TIER.set(tier)  # 下游按等级限 DB 连接（tiers.db_slot）
+        start = time.perf_counter()
+        if not await lane.acquire(tier):
+            await self._busy(scope, receive, send, lane)
+            admission.TIER_LATENCY.observe(time.perf_counter() - start, tier)
+            return
+
+        t0 = time.perf_counter()
+        ttfb = None
+
+        async def _send(message):
+            nonlocal ttfb
+            if ttfb is None and message["type"] == "http.response.start":
+                ttfb = time.perf_counter() - t0
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            end = time.perf_counter()
+            lane.release(ttfb if ttfb is not None else end - t0, tier)
+            admission.TIER_LATENCY.observe(end - start, tier)
+
+    @staticmethod
+    async def _busy(scope, receive, send, lane: admission.Lane):
+        rid = _request_id(scope)
+        retry = max(1, math.ceil(lane.deadline))
+        resp = JSONResponse(
+            status_code=503,
+            headers={"Retry-After": str(retry), "x-request-id": rid, "Cache-Control": "no-store"},
+            content={"code": "http_503", "message": "Server busy", "request_id": rid,
+                     "hint": f"retry in {retry}s"},
+        )
+        await resp(scope, receive, send)
@@ -15,7 +15,7 @@ class ApiKeyMiddleware(BaseHTTPMiddleware):
     约定：
       - 演示 key（NEXT_PUBLIC_DEMO_API_KEY，默认 dev_demo_123）仅放行 GET
       - 正式 key（ADMIN_API_KEY 或 API_KEYS 里逗号分隔）放行所有
-      - /, /v1/health, /openapi.json, /docs, /redoc, /robots.txt 始终放行
+      - /, /v1/health, /v1/ready, /metrics, /openapi.json, /docs, /redoc, /robots.txt 始终放行
     同时把解析到的 key 放到 request.state.api_key
     """
 
@@ -45,7 +45,7 @@ class ApiKeyMiddleware(BaseHTTPMiddleware):
         self._header_names = [h.lower() for h in names]
 
         # 永远放行
-        self.public_paths = {"/", "/v1/health", "/openapi.json", "/docs", "/redoc", "/robots.txt"}
+        self.public_paths = {"/", "/v1/health", "/v1/ready", "/metrics", "/openapi.json", "/docs", "/redoc", "/robots.txt"}
 
     def _get_key(self, request: Request) -> Optional[str]:
         hdrs = dict((k.decode().lower(), v.decode()) for k, v in request.scope.get("headers", []))
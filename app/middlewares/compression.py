@@ -0,0 +1,170 @@
+# app/middlewares/compression.py
+"""
+响应压缩（gzip / br / zstd，见 app/services/compression.py）。
+
+纯 ASGI 实现，挂在最内层（紧贴路由）：路由返回的是单块 body（more_body=False），可以整块压缩；
+外层的 BaseHTTPMiddleware 会把响应改成分块流，放在外面就分不清“导出流”和“普通响应”了。
+
+- 只压：GET、200、可压缩的 Content-Type、未带 Content-Encoding（/openapi.json 已自带预压缩）、
+  body >= COMPRESS_MIN_BYTES
+- 流式响应（首块 more_body=True，如文件/导出/Range）原样透传，不缓冲
+- 压缩结果缓存（VariantCache）：只缓存带强 ETag 的响应，按「path + ETag + 编码」取（热点 CSV / 数据集 /
+  元数据只在数据变化后压缩一次）。弱 ETag（trend JSON，body 带 as_of=now）每次现压：缓存的话压缩客户端
+  会一直拿到冻结的 as_of；没有 ETag 的（/metrics、错误、/v1/usage）基本一次性，进缓存只会挤掉有用的条目
+- ETag：压缩变体带编码后缀（"<tag>-gzip"），请求里的 If-None-Match 先还原成原始 ETag 再交给路由，
+  304 回写客户端手里那个变体的 ETag
+- 大 body（>= COMPRESS_OFFLOAD_BYTES）丢到线程池压缩，不阻塞事件循环
+"""
+from __future__ import annotations
+
+import os
+
+import anyio
+
+from app.services import compression, metrics
+from app.services.profiling import span
+
+MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+OFFLOAD_BYTES = int(os.getenv("COMPRESS_OFFLOAD_BYTES", "262144"))
+
+_COMPRESSIBLE = (b"text/", b"application/json", b"application/xml", b"application/javascript",
+                 b"application/problem+json", b"application/x-ndjson")
+_DROP = {b"content-length", b"etag", b"vary"}
+
+
+def _compressible(ctype: bytes) -> bool:
+    ctype = ctype.lower()
+    return ctype.startswith(_COMPRESSIBLE) or ctype.split(b";", 1)[0].endswith(b"+json")
+
+
+def _vary(headers: list) -> bytes:
+    vals = [v for k, v in headers if k.lower() == b"vary"]
+    if any(b"accept-encoding" in v.lower() or v.strip() == b"*" for v in vals):
+        return b", ".join(vals)
+    return b", ".join(vals + [b"Accept-Encoding"])
+
+
+async def _encode(body: bytes, enc: str, path: str = "", etag: bytes | None = None):
+    # ETag 只在同一 URL 内区分表示（不同港口数据相同时 ETag 可能相同），所以带上 path
+    key = None
+    if etag and not etag.startswith(b"W/"):
+        key = (compression.etag_key(path, etag), enc)
+        hit, out = compression.VARIANTS.get(key)
+        metrics.record_cache("compress", hit)
+        if hit:
+            return out
+    fn = compression.CODECS[enc]
+    with span("compress"):
+        if len(body) >= OFFLOAD_BYTES:
+            out = await anyio.to_thread.run_sync(fn, body)
+        else:
+            out = fn(body)
+    if len(out) >= len(body):
+        out = None
+    if key is not None:
+        compression.VARIANTS.put(key, out)
+    return out
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_bytes: int = MIN_BYTES):
+        self.app = app
+        self.min_bytes = min_bytes
+
+    @staticmethod
+    def _vary_only(send):
+        """不压缩的请求也要带 Vary（否则共享缓存可能把原文回给支持 gzip 的客户端，或反之）。"""
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                headers = message.get("headers") or []
+                ctype = next((v for k, v in headers if k.lower() == b"content-type"), b"")
+                if _compressible(ctype):
+                    new = [(k, v) for k, v in headers if k.lower() != b"vary"]
+                    new.append((b"vary", _vary(headers)))
+                    message = {**message, "headers": new}
+            await send(message)
+        return _send
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") != "GET":
+            return await self.app(scope, receive, send)
+        accept, inm = None, None
+        for k, v in scope.get("headers") or ():
+            k = k.lower()
+            if k == b"accept-encoding":
+                accept = v.decode("latin-1")
+            elif k == b"if-none-match":
+                inm = v.decode("latin-1")
+        enc = compression.negotiate(accept, compression.CODECS)
+        if enc == "identity":
+            return await self.app(scope, receive, self._vary_only(send))
+
+        sent = {}
+        if inm:
+            inm, sent = compression.strip_encoding_suffix(inm)
+            if sent:
+                scope = dict(scope)
+                scope["headers"] = [(k, v) for k, v in scope["headers"] if k.lower() != b"if-none-match"]
+                scope["headers"].append((b"if-none-match", inm.encode("latin-1")))
+
+        start = None
+        passthrough = False
+
+        async def _send(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                # http.response.pathsend / zerocopysend 等扩展：原样透传
+                passthrough = True
+                if start is not None:
+                    await send(start)
+                return await send(message)
+
+            headers = list(start.get("headers") or [])
+            hmap = {k.lower(): v for k, v in headers}
+            status = start["status"]
+            body = message.get("body", b"")
+
+            if status == 304:
+                etag = hmap.get(b"etag")
+                if etag is not None and sent:
+                    held = sent.get(etag.decode("latin-1").removeprefix("W/"))
+                    if held:
+                        headers = [(k, v) for k, v in headers if k.lower() != b"etag"]
+                        headers.append((b"etag", held.encode("latin-1")))
+                        start = {**start, "headers": headers}
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            if (message.get("more_body") or status != 200 or b"content-encoding" in hmap
+                    or b"content-range" in hmap or len(body) < self.min_bytes
+                    or not _compressible(hmap.get(b"content-type", b""))):
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            out = await _encode(body, enc, scope.get("path", ""), hmap.get(b"etag"))
+            passthrough = True
+            if out is None:  # 压不动（已是压缩格式等）
+                await send(start)
+                return await send(message)
+            new = [(k, v) for k, v in headers if k.lower() not in _DROP]
+            new += [
+                (b"content-encoding", enc.encode()),
+                (b"content-length", str(len(out)).encode()),
+                (b"vary", _vary(headers)),
+            ]
+            etag = hmap.get(b"etag")
+            if etag is not None:
+                new.append((b"etag", compression.etag_with(etag.decode("latin-1"), enc).encode("latin-1")))
+            await send({**start, "headers": new})
+            await send({"type": "http.response.body", "body": out, "more_body": False})
+
+        await self.app(scope, receive, _send)
+        if start is not None and not passthrough:  # 只有 start 没有 body（异常路径）
+            await send(start)
@@ -0,0 +1,53 @@
+# app/middlewares/metrics.py
+import time
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from app.services import metrics
+
+# /metrics 自身与健康检查不计入（避免抓取流量污染 SLA 统计）
+SKIP_PATHS = {"/metrics", "/v1/health", "/v1/ready"}
+_FORMATS = {"json", "csv", "arrow", "parquet"}
+
+
+def route_template(scope) -> str:
+    # 用路由模板而不是原始 path，避免 label 基数爆炸（/v1/ports/{unlocode}/trend）
+    # FastAPI 0.143 起 include_router 不再复制路由：scope["route"] 是原路由（不含前缀），
+    # 带前缀的有效路由在 scope["fastapi"]["effective_route_context"]；旧版本 scope["route"] 本身就带前缀
+    route = (scope.get("fastapi") or {}).get("effective_route_context") or scope.get("route")
+    if route is None or scope.get("endpoint") is None:
+        return "<unmatched>"
+    methods = getattr(route, "methods", None)
+    if methods and scope.get("method") not in methods:
+        return "<unmatched>"  # 只匹配了路径（如 OPTIONS /{full_path:path} 兜底路由）→ 405/404
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or "<unmatched>"
+
+
+def _route_template(request: Request) -> str:
+    return route_template(request.scope)
+
+
+def _format_label(request: Request) -> str:
+    fmt = (request.query_params.get("format") or "json").lower()
+    return fmt if fmt in _FORMATS else "other"
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path in SKIP_PATHS:
+            return await call_next(request)
+
+        t0 = time.perf_counter()
+        status = "500"
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            elapsed = time.perf_counter() - t0
+            labels = (request.method, _route_template(request), status, _format_label(request))
+            metrics.REQUESTS.inc(*labels)
+            metrics.LATENCY.observe(elapsed, *labels)
+            if request.headers.get("if-none-match"):
+                metrics.record_cache("http_revalidate", status == "304")
+            metrics.flush()
@@ -0,0 +1,89 @@
+# app/middlewares/profiling.py
+"""
+按需剖析：管理员 key（ADMIN_API_KEY）+ `X-Profile: 1` 时对单个请求做 span 分解与栈采样。
+
+纯 ASGI 实现（不用 BaseHTTPMiddleware）：未带 X-Profile 头时只扫一遍原始请求头就直接透传，
+不创建 Request 对象、不包 send。ADMIN_API_KEY 未配置时 main.py 根本不挂载本中间件。
+
+- ProfileMiddleware   放在最外层：决定是否剖析、记录总耗时，并回写 X-Profile-Id / Server-Timing
+- ProfileAppSpan      放在最内层：记录“路由 + 业务处理”的 span，总耗时减去它即为中间件开销
+"""
+import hmac
+import os
+
+from app.services import profiling
+
+_PROFILE_HDR = b"x-profile"
+
+
+def _admin_key() -> str:
+    return (os.getenv("ADMIN_API_KEY") or "").strip()
+
+
+def _header_map(scope) -> dict:
+    return {k.lower(): v for k, v in scope.get("headers") or []}
+
+
+def _is_admin(hdrs: dict, admin: str) -> bool:
+    key = hdrs.get(b"x-api-key", b"").decode("latin-1").strip()
+    if not key:
+        auth = hdrs.get(b"authorization", b"").decode("latin-1")
+        if auth.lower().startswith("bearer "):
+            key = auth[7:].strip()
+    return bool(key) and hmac.compare_digest(key, admin)
+
+
+class ProfileMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        # 快路径：没有 X-Profile 头 → 原样透传
+        for k, v in scope.get("headers") or ():
+            if k.lower() == _PROFILE_HDR:
+                break
+        else:
+            return await self.app(scope, receive, send)
+
+        hdrs = _header_map(scope)
+        admin = _admin_key()
+        if hdrs.get(_PROFILE_HDR, b"").strip() not in (b"1", b"true", b"on") or not admin \
+                or not _is_admin(hdrs, admin):
+            return await self.app(scope, receive, send)
+
+        rid = hdrs.get(b"x-request-id", b"").decode("latin-1") or None
+        prof, token, sampler = profiling.start(
+            scope.get("method", ""), scope.get("path", ""),
+            (scope.get("query_string") or b"").decode("latin-1"), rid,
+        )
+        status = None
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-profile-id", str(prof.id).encode()))
+                timing = profiling.server_timing(prof)
+                if timing:
+                    headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            profiling.finish(prof, token, sampler, status)
+
+
+class ProfileAppSpan:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if profiling.active() is None:
+            return await self.app(scope, receive, send)
+        with profiling.span("app"):
+            return await self.app(scope, receive, send)
@@ -4,13 +4,15 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
 from starlette.requests import Request
 
+from app.services import metrics
+
 # 可配：通过环境变量覆盖，默认 60 req / 60s
 WINDOW = int(os.getenv("RATE_WINDOW", "60"))   # seconds
 LIMIT  = int(os.getenv("RATE_LIMIT",  "60"))   # requests per window
 
 # 永远放行的路径（健康/文档/首页）
 SAFE_PATHS = {
-    "/v1/health", "/", "/openapi.json", "/docs", "/redoc", "/robots.txt",
+    "/v1/health", "/v1/ready", "/", "/openapi.json", "/docs", "/redoc", "/robots.txt", "/metrics",
 }
 
 class _Bucket:
@@ -50,6 +52,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
 
             if b.count > self.limit:
                 retry = max(1, b.window_start + self.window - now)
+                metrics.RATE_LIMITED.inc()
                 rid = request.headers.get("x-request-id", "")
                 return JSONResponse(
                     status_code=429,  # 标准码
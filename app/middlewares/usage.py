@@ -0,0 +1,43 @@
+# app/middlewares/usage.py
+"""
+按 key 计量（app/services/usage.py）：请求结束时只在内存里 +1 / +字节数，不碰 I/O。
+
+纯 ASGI，挂在鉴权之内（401 不计费）、准入控制之外（503 也记上，计费时按 status 过滤）。
+字节数 = 实际发出的响应体（压缩后）；没带 key 的请求不计量。
+"""
+from __future__ import annotations
+
+from app.middlewares.metrics import route_template
+from app.services import tiers, usage
+
+SKIP_PATHS = {"/", "/v1/health", "/v1/ready", "/metrics", "/openapi.json", "/docs", "/redoc", "/robots.txt",
+              "/v1/usage"}
+
+
+class UsageMiddleware:
+    def __init__(self, app, meter: usage.Meter | None = None):
+        self.app = app
+        self.meter = meter or usage.METER
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS" or scope.get("path") in SKIP_PATHS:
+            return await self.app(scope, receive, send)
+        key = tiers.api_key(scope)
+        if not key:
+            return await self.app(scope, receive, send)
+
+        status, nbytes = 500, 0
+
+        async def _send(message):
+            nonlocal status, nbytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                nbytes += len(message.get("body") or b"")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # 路由匹配后 scope 里才有 endpoint / path_params：请求结束再取模板
+            self.meter.record(key, route_template(scope), status, nbytes)
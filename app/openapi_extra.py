@@ -1,20 +1,158 @@
+# app/openapi_extra.py —— OpenAPI 契约：白名单 + 别名 + 鉴权方案；一次生成、预压缩、强 ETag
+"""
+/openapi.json 只生成一次（首个请求时惰性生成，不拖慢冷启动），之后直接返回预先算好的字节：
+
+- 契约：路径白名单 + 兼容别名（/v1/hs/{code}/imports）+ ApiKeyAuth 安全方案（原先两处覆盖合并为一处）
+- 字节：与 FastAPI 默认 JSONResponse 相同的紧凑序列化；gzip（mtime=0，可复现）与 brotli/zstd（可选依赖）
+  按最高级别预压缩（编解码器与协商见 app/services/compression.py）
+- 协商：按 Accept-Encoding 的 q 值选 br > zstd > gzip > identity；Vary: Accept-Encoding
+- 缓存：每个编码一个强 ETag（"<sha>" / "<sha>-gzip" / "<sha>-br" / "<sha>-zstd"），If-None-Match 命中同一内容即 304
+
+docs/openapi.json 由 scripts/export_openapi.py 从同一份 artifact 写出（字节一致）。
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+from typing import Dict, Optional, Tuple
+
+from fastapi import FastAPI, Request
 from fastapi.openapi.utils import get_openapi
+from starlette.responses import Response
+
+from app.services import compression
+
+_OPENAPI_PATH_WHITELIST = {
+    "/v1/health",
+    "/v1/meta/sources",   # 主口径
+    "/v1/sources",        # 兼容别名
+    "/v1/ports/{unlocode}/overview",
+    "/v1/ports/{unlocode}/trend",
+    "/v1/ports/{unlocode}/snapshot",
+    "/v1/ports/{unlocode}/dwell",
+    "/v1/ports/{unlocode}/alerts",
+    "/v1/hs/{hs_code}/imports",
+}
+_OPENAPI_ALIASES = {
+    "/v1/hs/{code}/imports": "/v1/hs/{hs_code}/imports",
+}
+
+_CACHE_CONTROL = "public, max-age=300"
+
+
+def _refs(node, out: set) -> set:
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/components/schemas/"):
+            out.add(ref.rsplit("/", 1)[-1])
+        for v in node.values():
+            _refs(v, out)
+    elif isinstance(node, list):
+        for v in node:
+            _refs(v, out)
+    return out
+
+
+def _prune_schemas(schema: dict) -> None:
+    """只保留白名单路径可达的 components.schemas（否则可选路由是否挂载会改变契约字节/ETag）。"""
+    schemas = (schema.get("components") or {}).get("schemas")
+    if not schemas:
+        return
+    keep, todo = set(), _refs(schema.get("paths"), set())
+    while todo:
+        name = todo.pop()
+        if name in keep or name not in schemas:
+            continue
+        keep.add(name)
+        todo |= _refs(schemas[name], set())
+    schema["components"]["schemas"] = {k: v for k, v in schemas.items() if k in keep}
+
+
+def build_schema(app: FastAPI) -> dict:
+    """Contract-only OpenAPI：白名单 + 别名 + API Key 安全方案。"""
+    schema = get_openapi(
+        title=app.title,
+        version=app.version,
+        description=getattr(app, "description", None),
+        routes=app.routes,
+    )
+
+    paths = schema.get("paths", {}) or {}
+    filtered = {k: v for k, v in paths.items() if k in _OPENAPI_PATH_WHITELIST}
+    for alias, src in _OPENAPI_ALIASES.items():
+        if src in filtered and alias not in filtered:
+            filtered[alias] = copy.deepcopy(filtered[src])
+    schema["paths"] = filtered
+    _prune_schemas(schema)
+
+    comps = schema.setdefault("components", {})
+    sec = comps.setdefault("securitySchemes", {})
+    sec["ApiKeyAuth"] = {"type": "apiKey", "in": "header", "name": "X-API-Key"}
+    schema["security"] = [{"ApiKeyAuth": []}]
+    return schema
+
+
+class OpenAPIArtifact:
+    """最终 schema 的不可变快照：dict + 各编码字节 + 强 ETag。"""
+
+    __slots__ = ("schema", "body", "tag", "variants")
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        # 与 starlette JSONResponse.render 一致
+        self.body = json.dumps(
+            schema, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+        ).encode("utf-8")
+        self.tag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (self.body, f'"{self.tag}"')}
+        for enc, fn in compression.max_codecs().items():
+            self.variants[enc] = (fn(self.body), compression.etag_with(f'"{self.tag}"', enc))
+
+    def negotiate(self, accept_encoding: Optional[str]) -> str:
+        """按 q 值挑编码；同 q 时 br > zstd > gzip > identity。"""
+        return compression.negotiate(accept_encoding, self.variants)
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """If-None-Match 弱比较：同一内容的任一编码变体都算命中。"""
+        if not if_none_match:
+            return False
+        for cand in if_none_match.split(","):
+            cand = cand.strip()
+            if cand == "*":
+                return True
+            if cand.startswith("W/"):
+                cand = cand[2:]
+            cand = cand.strip('"')
+            if cand.split("-", 1)[0] == self.tag:
+                return True
+        return False
+
+
+def artifact(app: FastAPI) -> OpenAPIArtifact:
+    art = getattr(app.state, "openapi_artifact", None)
+    if art is None:
+        art = OpenAPIArtifact(build_schema(app))
+        app.state.openapi_artifact = art
+        app.openapi_schema = art.schema
+    return art
+
+
+async def _openapi_endpoint(request: Request) -> Response:
+    art = artifact(request.app)
+    enc = art.negotiate(request.headers.get("accept-encoding"))
+    body, etag = art.variants[enc]
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": _CACHE_CONTROL}
+    if art.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if enc != "identity":
+        headers["Content-Encoding"] = enc
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
-def add_api_key_security(app):
-    def custom_openapi():
-        # 允许 FastAPI 先缓存 schema，避免重复生成
-        if app.openapi_schema:
-            return app.openapi_schema
-        schema = get_openapi(
-            title="PortPulse API",
-            version="0.1.1",
-            routes=app.routes,
-        )
-        comps = schema.setdefault("components", {})
-        sec = comps.setdefault("securitySchemes", {})
-        sec["ApiKeyAuth"] = {"type": "apiKey", "in": "header", "name": "X-API-Key"}
-        schema["security"] = [{"ApiKeyAuth": []}]
-        app.openapi_schema = schema
-        return app.openapi_schema
-    # 用我们的函数替换 openapi 生成器（仅影响文档，不影响路由执行）
-    app.openapi = custom_openapi
+def install_openapi(app: FastAPI) -> None:
+    """替换 FastAPI 自带的 /openapi.json 路由与 app.openapi()（/docs、/redoc 仍指向同一 URL）。"""
+    url = app.openapi_url or "/openapi.json"
+    app.router.routes[:] = [r for r in app.router.routes if getattr(r, "path", None) != url]
+    app.add_api_route(url, _openapi_endpoint, methods=["GET", "HEAD"], include_in_schema=False)
+    app.openapi = lambda: artifact(app).schema  # type: ignore[method-assign]
@@ -0,0 +1,58 @@
+# app/routers/admin_debug.py
+from __future__ import annotations
+import hmac, os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from app.services import profiling
+
+router = APIRouter(tags=["admin"])
+
+
+def _verify_admin_key(req: Request) -> bool:
+    """仅 ADMIN_API_KEY 可访问（X-API-Key 或 Authorization: Bearer）。"""
+    admin = (os.getenv("ADMIN_API_KEY") or "").strip()
+    if not admin:
+        raise HTTPException(status_code=503, detail="profiling disabled (no ADMIN_API_KEY set)")
+    key = req.headers.get("x-api-key") or ""
+    if not key:
+        auth = req.headers.get("authorization", "")
+        if auth.lower().startswith("bearer "):
+            key = auth[7:].strip()
+    if not hmac.compare_digest(key, admin):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return True
+
+
+@router.get("/debug/profiles", summary="Recent request profiles (ring buffer)")
+async def list_profiles(
+    _: bool = Depends(_verify_admin_key),
+    path: Optional[str] = Query(None, description="按 path 前缀过滤"),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """
+    最近的剖析结果（新→旧）。用法：对慢请求加 `X-Profile: 1`（管理员 key），
+    响应头 X-Profile-Id 即为这里的 id。
+    """
+    items = [p for p in reversed(profiling.PROFILES) if not path or p.path.startswith(path)]
+    return {
+        "buffer_size": profiling.PROFILES.maxlen,
+        "count": len(profiling.PROFILES),
+        "items": [p.summary() for p in items[:limit]],
+    }
+
+
+@router.get("/debug/profiles/{profile_id}", summary="Profile detail (spans + collapsed stacks)")
+async def get_profile(profile_id: int, _: bool = Depends(_verify_admin_key)):
+    prof = profiling.get(profile_id)
+    if prof is None:
+        raise HTTPException(status_code=404, detail="profile not found (evicted or unknown id)")
+    return prof.detail()
+
+
+@router.delete("/debug/profiles", summary="Clear profile buffer")
+async def clear_profiles(_: bool = Depends(_verify_admin_key)):
+    n = len(profiling.PROFILES)
+    profiling.PROFILES.clear()
+    return {"cleared": n}
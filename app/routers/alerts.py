@@ -1,12 +1,12 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Query, Response, Request
-from datetime import date, timedelta, datetime, timezone
-from typing import List, Optional, Tuple
-from hashlib import sha256
-import json
+from datetime import date, datetime, timezone
+from typing import Optional, Tuple
 
 # 计算服务（保持你的现有签名）
+from app.services import port_data
+from app.services.json_codec import dumps
 from app.services.alerts import compute_alerts, SeriesPoint
 
 router = APIRouter(tags=["alerts"])
@@ -26,11 +26,6 @@ except Exception:
 # =========================
 # helpers
 # =========================
-def _stable_int_from_str(s: str, mod: int) -> int:
-    """稳定整数：避免内置 hash 的随机盐，保证不同进程/时间一致。"""
-    h = sha256(s.encode("utf-8")).hexdigest()
-    return int(h[:8], 16) % mod
-
 def _parse_window_tolerant(window_q: Optional[str]) -> int:
     """
     接受 '14' 或 '14d'。默认 14，范围 [7,60]。
@@ -57,40 +52,21 @@ def _bucket_now_utc(minutes: int = 5) -> datetime:
     bm = (now.minute // minutes) * minutes
     return now.replace(minute=bm, second=0)
 
-def _json_body_and_headers(payload: dict) -> Tuple[bytes, dict]:
-    body = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
-    etag = '"' + sha256(body).hexdigest() + '"'
+async def _validated_headers(unlocode: str, w: int, bucket: str) -> Tuple[port_data.Validator, dict]:
+    """校验器来自 dwell 序列的数据版本 + (window, 桶)：重新验证时不取窗口、不算告警、不序列化。"""
+    v = await port_data.get_repository().validator("dwell", unlocode, ("alerts", w, bucket))
     headers = {
-        "ETag": etag,
-        "Cache-Control": "public, max-age=300, no-transform",
+        **v.headers(),  # 含 Cache-Control（stale-while-revalidate / stale-if-error）
         "Content-Type": "application/json; charset=utf-8",
         "Vary": "Accept-Encoding",
     }
-    return body, headers
-
-def _maybe_304(request: Request, headers: dict) -> Optional[Response]:
-    inm = request.headers.get("if-none-match")
-    if not inm:
-        return None
-    cands = [s.strip() for s in inm.split(",")]
-    if headers["ETag"] in cands or f'W/{headers["ETag"]}' in cands:
+    return v, headers
+
+def _maybe_304(request: Request, v: port_data.Validator, headers: dict) -> Optional[Response]:
+    if v.not_modified(request.headers):
         return Response(status_code=304, headers=headers)
     return None
 
-# —— demo 序列（稳定可复现）——
-def _demo_dwell_series(unlocode: str, window: int) -> List[SeriesPoint]:
-    base = 24 + _stable_int_from_str(unlocode.upper(), 7)  # 24~30 的基线
-    today = date.today()
-    pts: List[SeriesPoint] = []
-    for i in range(window):
-        d = today - timedelta(days=window - i)
-        val = float(base + ((i * 7) % 6))  # 小幅波动
-        # 对 USLAX/USNYC 后半段做轻微抬升，方便演示告警
-        if unlocode.upper() in {"USLAX", "USNYC"} and i > window // 2:
-            val += 2.5
-        pts.append(SeriesPoint(d=d, v=val))
-    return pts
-
 # =========================
 # routes
 # =========================
@@ -108,8 +84,16 @@ async def get_alerts(
     unlocode = unlocode.upper()
 
     w = _parse_window_tolerant(window)
-    # TODO: 上线后接 ETL/DB；当前用 demo 保证验收可测
-    series = _demo_dwell_series(unlocode, w)
+    bucket = _bucket_now_utc(5).isoformat()
+    v, headers = await _validated_headers(unlocode, w, bucket)
+    maybe = _maybe_304(request, v, headers)
+    if maybe:
+        return maybe
+
+    # 统一数据入口：override > DB > derived > demo（app/services/port_data.py）
+    pts, src = await port_data.get_repository().series("dwell", unlocode)
+    series = [SeriesPoint(d=date.fromisoformat(p["date"]), v=p.get("dwell_hours"))
+              for p in port_data.window(pts, w)]
 
     # 计算告警（沿用你的服务函数）
     alerts = compute_alerts(series, w)
@@ -117,29 +101,17 @@ async def get_alerts(
     payload = {
         "unlocode": unlocode,
         "window_days": w,
-        "items": [
-            {
-                "date": a.date.isoformat() if hasattr(a.date, "isoformat") else str(a.date),
-                "metric": a.metric,
-                "delta": a.delta,
-                "severity": a.severity,
-                "explain": getattr(a, "explain", None),
-            }
-            for a in alerts
-        ],
+        # Alert 是 dataclass（date/metric/delta/severity/explain），编码器直接序列化
+        "items": alerts,
         # 为 ETag 稳定增加“桶时间戳”（与 ports/meta 一致 5min）
-        "_as_of_bucket": _bucket_now_utc(5).isoformat(),
-        "_src": "demo",
+        "_as_of_bucket": bucket,
+        "_src": src,
     }
-
-    body, headers = _json_body_and_headers(payload)
-    maybe = _maybe_304(request, headers)
-    if maybe:
-        return maybe
+    body = dumps(payload)  # 排序键 + 紧凑
 
     # 透传缓存头到响应（FastAPI 默认会写自己的 Content-Type，这里覆盖为与 body 相同）
-    for k, v in headers.items():
-        response.headers[k] = v
+    for k, val in headers.items():
+        response.headers[k] = val
     return Response(content=body, headers=headers)
 
 @router.head("/ports/{unlocode}/alerts", summary="HEAD for alerts (v1)")
@@ -152,16 +124,9 @@ async def head_alerts(
     unlocode = unlocode.upper()
 
     w = _parse_window_tolerant(window)
-    # 与 GET 生成相同的 payload（不返回 body，只产出相同头部）
-    payload = {
-        "unlocode": unlocode,
-        "window_days": w,
-        "items": [],  # HEAD 不关心内容，但参与 ETag 的字段应与 GET 对齐
-        "_as_of_bucket": _bucket_now_utc(5).isoformat(),
-        "_src": "demo",
-    }
-    body, headers = _json_body_and_headers(payload)
-    maybe = _maybe_304(request, headers)
+    # 与 GET 同一个校验器（不算告警、不生成 body）
+    v, headers = await _validated_headers(unlocode, w, _bucket_now_utc(5).isoformat())
+    maybe = _maybe_304(request, v, headers)
     if maybe:
         return maybe
     return Response(status_code=200, headers=headers)
\ No newline at end of file
@@ -0,0 +1,66 @@
+# app/routers/datasets.py —— /v1/datasets：夜间全量数据集（manifest + 分区文件，Range 断点续传）
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException, Request
+from starlette.responses import FileResponse, Response
+
+from app.services import datasets, port_data
+from app.services.json_codec import json_response
+
+router = APIRouter(prefix="/v1/datasets", tags=["datasets"])
+
+# 某一天的文件内容固定（重跑同一天 ETag 会变，客户端按 ETag 重新校验即可）；latest 别名会漂移
+_CC_DAY = "public, max-age=86400"
+_CC_LATEST = "public, max-age=300"
+
+
+def _resolve(day: str) -> str:
+    d = datasets.resolve_date(day)
+    if d is None:
+        raise HTTPException(status_code=404, detail="dataset not found")
+    return d
+
+
+@router.get("", summary="Available dataset dates")
+async def list_datasets():
+    days = datasets.available_dates()
+    return json_response({"latest": days[-1] if days else None, "dates": days[::-1]},
+                         headers={"Cache-Control": _CC_LATEST})
+
+
+# GET / HEAD 分成两条路由：一条 api_route 挂两个方法会生成重复的 operationId
+@router.get("/{day}/manifest.json", summary="Dataset manifest")
+@router.head("/{day}/manifest.json", summary="Dataset manifest (HEAD)")
+async def get_manifest(day: str, request: Request):
+    d = _resolve(day)
+    m = datasets.manifest(d)
+    if m is None:
+        raise HTTPException(status_code=404, detail="dataset not found")
+    hdrs = {"ETag": m.etag, "Cache-Control": _CC_LATEST if day == "latest" else _CC_DAY,
+            "Vary": "Accept-Encoding"}
+    if port_data.etag_matches(request.headers.get("if-none-match"), m.etag):
+        return Response(status_code=304, headers=hdrs)
+    if request.method == "HEAD":
+        return Response(status_code=200, headers={**hdrs, "Content-Type": "application/json"})
+    return Response(content=m.body, media_type="application/json", headers=hdrs)
+
+
+@router.get("/{day}/{path:path}", summary="Dataset file (supports Range)")
+@router.head("/{day}/{path:path}", summary="Dataset file (HEAD)")
+async def get_file(day: str, path: str, request: Request):
+    """只发 manifest 登记过的文件；Range / If-Range / HEAD 由 FileResponse 处理，
+    服务器支持 http.response.pathsend 时零拷贝发送。"""
+    d = _resolve(day)
+    found = datasets.lookup(d, path)
+    if found is None:
+        raise HTTPException(status_code=404, detail="file not found")
+    fp, entry = found
+    etag = datasets.file_etag(entry)
+    hdrs = {"ETag": etag, "Cache-Control": _CC_LATEST if day == "latest" else _CC_DAY,
+            "Accept-Ranges": "bytes"}
+    if port_data.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=hdrs)
+    if not fp.is_file():
+        raise HTTPException(status_code=404, detail="file not found")
+    return FileResponse(fp, headers=hdrs, media_type=datasets.MEDIA_TYPES.get(entry["format"]),
+                        filename=f'{entry["unlocode"]}_{entry["kind"]}_{entry["month"]}.{entry["format"]}')
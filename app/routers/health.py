@@ -1,5 +1,8 @@
 from datetime import datetime, timezone
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.services import warmup
 
 # NOTE: 这个路由本身不依赖任何外部资源，避免启动失败或阻塞。
 router = APIRouter(prefix="/v1", tags=["meta"])
@@ -11,3 +14,11 @@ def health():
     except Exception:
         # 极端情况下也要 200
         return {"ok": False, "ts": datetime.now(timezone.utc).isoformat()}
+
+@router.get("/ready")
+def ready():
+    # 就绪探针：启动预热（app/services/warmup.py）完成前 503；存活看 /v1/health
+    st = warmup.status()
+    if st["ready"]:
+        return JSONResponse(st, headers={"Cache-Control": "no-store"})
+    return JSONResponse(st, status_code=503, headers={"Cache-Control": "no-store", "Retry-After": "1"})
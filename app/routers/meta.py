@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Request, Response
 from datetime import datetime, timezone
 from hashlib import sha256
-import json
 import os
 
+from app.services import freshness
+from app.services.json_codec import dumps
+
 router = APIRouter(prefix="/v1", tags=["meta"])
 
 # -----------------------
@@ -23,9 +25,7 @@ def _make_meta_payload(now_buck: datetime):
     """
     payload = {
         "type": "object",
-        "sources": [
-            {"name": "demo", "type": "synthetic", "freshness": "PT30M", "last_ingest_at": "2025-09-17T00:00:00Z"}
-        ],
+        "sources": _sources_from_tracker(),
         "etl": {"window": "hourly", "retries": 2, "backfill": "30d"},
         "build": {
             "version": os.getenv("PORTPULSE_VERSION", "0.1.1"),
@@ -37,9 +37,21 @@ def _make_meta_payload(now_buck: datetime):
     payload["as_of"] = payload["updated_at"]
     return payload
 
+_SOURCE_TYPES = {"override": "nowcast", "derived": "file", "db": "postgres"}
+
+def _sources_from_tracker() -> list:
+    """last_ingest_at 取自新鲜度跟踪（各数据源最近一次落地时间，跨 worker 合并 + 变更日志）。"""
+    seen = freshness.TRACKER.last_ingest_by_source()
+    if not seen:
+        return [{"name": "demo", "type": "synthetic", "freshness": "PT30M", "last_ingest_at": None}]
+    return [
+        {"name": name, "type": _SOURCE_TYPES.get(name, name), "freshness": "PT30M", "last_ingest_at": ts}
+        for name, ts in seen.items()
+    ]
+
 def _json_body_and_headers(payload: dict) -> tuple[bytes, dict]:
     # 稳定序列化（排序键、紧凑分隔符）→ 稳定 ETag
-    body = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    body = dumps(payload)
     etag = '"' + sha256(body).hexdigest() + '"'
     headers = {
         "ETag": etag,
@@ -66,7 +78,8 @@ def health():
     return {"ok": True, "ts": datetime.now(timezone.utc).isoformat()}
 
 @router.get("/meta/sources", summary="Data sources & ETL metadata")
-def meta_sources(request: Request):
+async def meta_sources(request: Request):
+    await freshness.TRACKER.sync_changes()  # 脚本 / 作业 / 其他 worker 的入库（至多每分钟读一次变更日志）
     now_buck = _bucket_now_utc(5)
     payload = _make_meta_payload(now_buck)
     body, headers = _json_body_and_headers(payload)
@@ -76,7 +89,8 @@ def meta_sources(request: Request):
     return Response(content=body, headers=headers)
 
 @router.head("/meta/sources", summary="HEAD for /meta/sources")
-def head_meta_sources(request: Request):
+async def head_meta_sources(request: Request):
+    await freshness.TRACKER.sync_changes()
     now_buck = _bucket_now_utc(5)
     payload = _make_meta_payload(now_buck)
     _body, headers = _json_body_and_headers(payload)
@@ -85,14 +99,29 @@ def head_meta_sources(request: Request):
         return maybe
     return Response(status_code=200, headers=headers)
 
+@router.get("/meta/freshness", summary="Per-port data freshness & p50/p95/p99 lag")
+async def meta_freshness(request: Request):
+    """
+    数据新鲜度（小时）：每港口滞后 + 当前/滚动 p50/p95/p99 + SLO（p95 ≤ 2h）判定。
+    各 worker 的观察经 METRICS_MULTIPROC_DIR 合并，外部入库取自变更日志（见 app/services/freshness.py）。
+    滞后按 5 分钟桶计算，保证同一桶内 ETag 稳定。
+    """
+    await freshness.TRACKER.sync_changes()
+    payload = freshness.TRACKER.snapshot(_bucket_now_utc(5))
+    body, headers = _json_body_and_headers(payload)
+    maybe = _maybe_304(request, headers)
+    if maybe:
+        return maybe
+    return Response(content=body, headers=headers)
+
 # 兼容别名：/v1/sources
 @router.get("/sources", summary="(alias) Data sources & ETL metadata")
-def sources_alias(request: Request):
-    return meta_sources(request)
+async def sources_alias(request: Request):
+    return await meta_sources(request)
 
 @router.head("/sources", summary="(alias) HEAD for /sources")
-def head_sources_alias(request: Request):
-    return head_meta_sources(request)
+async def head_sources_alias(request: Request):
+    return await head_meta_sources(request)
 
 # --- Added for acceptance: simple extra endpoints (do not require data deps) ---
 @router.get("/ping", summary="Ping (simple liveness)")
@@ -1,9 +1,12 @@
 from __future__ import annotations
 from fastapi import APIRouter, Query, Response, Request, HTTPException
-from datetime import datetime, timedelta, timezone, date
-from hashlib import sha256
+from datetime import datetime, timezone
 import re
 
+from app.services import changes, columnar, port_data
+from app.services.json_codec import dumps as json_dumps, json_response
+from app.services.profiling import span
+
 router = APIRouter(tags=["ports"])
 
 # --- Known ports（覆盖自检用到的 USLAX 等）---
@@ -24,43 +27,136 @@ def _ensure_port_exists(code: str) -> None:
     if code not in KNOWN_PORTS:
         raise HTTPException(status_code=404, detail="port not found")
 
-def _today_utc() -> date:
-    return datetime.now(timezone.utc).date()
+_CACHE_HDRS = {
+    "Cache-Control": "public, max-age=300, no-transform",
+    "Vary": "Accept-Encoding",
+}
 
-def _deterministic(num: int) -> float:
-    return (num % 100) / 100.0
+def _csv_response(body: bytes, etag: str, request: Request | None, head: bool = False,
+                  media_type: str = "text/csv; charset=utf-8") -> Response:
+    hdrs = {"ETag": etag, "Content-Type": media_type, **_CACHE_HDRS}
+    inm = request.headers.get("if-none-match") if request else None
+    if port_data.etag_matches(inm, etag):
+        return Response(status_code=304, headers=hdrs)
+    if head:
+        return Response(status_code=200, headers=hdrs)
+    return Response(content=body, media_type=media_type, headers={"ETag": etag, **_CACHE_HDRS})
 
-def _demo_overview(code: str) -> dict:
-    base = abs(hash(code)) % 1000
-    return {
-        "unlocode": code,
-        "port_name": None,
-        "country": None,
-        "arrivals_7d": (base % 30) + 50,
-        "departures_7d": (base % 30) + 45,
-        "waiting_vessels": (base % 8),
-        "avg_wait_hours": round(4.0 + (base % 120) / 10.0, 1),
-        "avg_berth_hours": round(10.0 + (base % 200) / 10.0, 1),
-        "updated_at": datetime.now(timezone.utc).isoformat(),
-    }
+_FORMAT_RE = "^(json|csv|arrow|parquet)$"
+
+# -------- 条件请求：校验器来自数据版本，先于取窗口/序列化 --------
+async def _validator(kind: str, unlocode: str, variant: tuple, weak: bool = False) -> port_data.Validator:
+    return await port_data.get_repository().validator(kind, unlocode, variant, weak=weak)
+
+def _data_headers(v: port_data.Validator, media_type: str | None = None) -> dict:
+    # Cache-Control 以校验器为准（带 stale-while-revalidate / stale-if-error；回旧值时 max-age=0）
+    hdrs = {**_CACHE_HDRS, **v.headers()}
+    if media_type:
+        hdrs["Content-Type"] = media_type
+    return hdrs
+
+def _not_modified(v: port_data.Validator, request: Request | None) -> Response | None:
+    """If-None-Match / If-Modified-Since 命中 → 304（缓存命中时只花 stat + 字典查找）。"""
+    if request is not None and v.not_modified(request.headers):
+        return Response(status_code=304, headers=_data_headers(v))
+    return None
+
+async def _columnar_response(kind: str, unlocode: str, fmt: str, days: int, fields: str | None,
+                             request: Request | None, head: bool = False, limit: int | None = None) -> Response:
+    """format=arrow（IPC stream）/ parquet；服务端未装 pyarrow → 406。"""
+    if not columnar.available():
+        raise HTTPException(status_code=406, detail=f"format={fmt} is not available on this server")
+    allowed = port_data.DWELL_FIELDS if kind == "dwell" else port_data.TREND_FIELDS
+    cols = port_data.parse_fields(fields, allowed)
+    v = await _validator(kind, unlocode, (kind, fmt, days, tuple(cols), limit))
+    nm = _not_modified(v, request)
+    if nm is not None:
+        return nm
+    if head:
+        return Response(status_code=200, headers=_data_headers(v, columnar.MEDIA_TYPES[fmt]))
+    repo = port_data.get_repository()
+    offset = 0
+    if limit:  # 与 JSON / CSV 一致：窗口内最近 limit 个点
+        pts, _ = await repo.series(kind, unlocode)
+        offset = max(0, len(port_data.window(pts, days)) - limit)
+    body, _ = await repo.columnar(kind, unlocode, fmt, days, cols, offset=offset)
+    return Response(content=body, media_type=columnar.MEDIA_TYPES[fmt], headers=_data_headers(v))
 
-def _demo_trend(code: str, days: int) -> list[dict]:
-    days = max(1, min(30, int(days or 7)))
-    today = _today_utc()
-    pts = []
-    for i in range(days):
-        d = today - timedelta(days=days - 1 - i)
-        v = _deterministic(abs(hash((code, d.toordinal()))))
-        pts.append({
-            "date": d.isoformat(),
-            "congestion_score": round(0.3 + 0.5 * v, 3)
-        })
-    return pts
-
-def _csv_and_etag(rows: list[str]) -> tuple[bytes, str]:
-    csv_text = "\n".join(rows) + "\n"
-    etag = '"' + sha256(csv_text.encode("utf-8")).hexdigest() + '"'
-    return csv_text.encode("utf-8"), etag
+def _overview_csv(data: dict) -> tuple[bytes, str]:
+    rows = ["unlocode,arrivals_7d,departures_7d,waiting_vessels,avg_wait_hours,avg_berth_hours,updated_at"]
+    rows.append(",".join([
+        data["unlocode"],
+        str(data["arrivals_7d"]),
+        str(data["departures_7d"]),
+        str(data["waiting_vessels"]),
+        str(data["avg_wait_hours"]),
+        str(data["avg_berth_hours"]),
+        data["updated_at"],
+    ]))
+    with span("serialize"):
+        body = ("\n".join(rows) + "\n").encode("utf-8")
+    return body, port_data.etag_for(body)
+
+# trend 的默认表示保持原契约：每点只有 date + congestion_score（0–1 标度），CSV 表头 date,congestion_score。
+# 仓库里的多列（vessels / avg_wait_hours / src，congestion_score 为 0–100 原始分）要显式 fields= 才返回
+def _trend_cols(fields: str | None) -> tuple | None:
+    return tuple(port_data.parse_fields(fields)) if fields else None
+
+def _legacy_points(pts: list[dict]) -> list[dict]:
+    return [{"date": p.get("date"),
+             "congestion_score": None if p.get("congestion_score") is None else round(p["congestion_score"] / 100, 3)}
+            for p in pts]
+
+def _legacy_csv(pts: list[dict]) -> bytes:
+    with span("serialize"):
+        rows = ["date,congestion_score"]
+        rows += [f'{p["date"]},{"" if p["congestion_score"] is None else p["congestion_score"]}'
+                 for p in _legacy_points(pts)]
+        return ("\n".join(rows) + "\n").encode("utf-8")
+
+def _last(pts: list[dict], limit: int | None) -> list[dict]:
+    """limit：窗口内最近 limit 个点。"""
+    return pts[-limit:] if limit else pts
+
+async def _trend_csv(unlocode: str, days: int, fields: str | None, request: Request | None,
+                     head: bool = False, limit: int | None = None) -> Response:
+    cols = _trend_cols(fields)
+    v = await _validator("trend", unlocode, ("trend", "csv", days, cols, limit))
+    nm = _not_modified(v, request)
+    if nm is not None:
+        return nm
+    media_type = "text/csv; charset=utf-8"
+    if head:
+        return Response(status_code=200, headers=_data_headers(v, media_type))
+    pts = _last(await port_data.get_repository().trend(unlocode, days), limit)
+    body = port_data.csv_bytes(pts, cols) if cols else _legacy_csv(pts)
+    return Response(content=body, media_type=media_type, headers=_data_headers(v))
+
+# -------- Changes（增量同步：since 游标之后变化过的 (port, date, metrics) 行）--------
+@router.get("/changes", summary="Changes since cursor (delta sync)")
+async def get_changes(
+    since: str | None = Query(None, description="上次响应的 next_cursor；为空=从头开始"),
+    limit: int = Query(1000, ge=1, le=5000),
+    unlocode: str | None = Query(None, description="只看某个港口"),
+    kind: str | None = Query(None, pattern="^(trend|dwell)$"),
+    request: Request = None,
+):
+    u = None
+    if unlocode:
+        u = unlocode.upper()
+        _ensure_unlocode_valid(u)
+    try:
+        body = json_dumps(await changes.page(since, limit, u, kind))
+    except changes.InvalidCursor:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    except Exception:
+        raise HTTPException(status_code=503, detail="change log unavailable")
+    etag = port_data.etag_for(body)
+    # 没有新变更时同一游标得到同一字节：轮询走 304
+    hdrs = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if port_data.etag_matches(request.headers.get("if-none-match") if request else None, etag):
+        return Response(status_code=304, headers=hdrs)
+    return Response(content=body, media_type="application/json", headers=hdrs)
 
 # -------- Overview --------
 @router.get("/{unlocode}/overview", summary="Get Overview")
@@ -71,31 +167,13 @@ async def get_overview(
     _ensure_unlocode_valid(unlocode)
     _ensure_port_exists(unlocode)
 
-    data = _demo_overview(unlocode)
+    data = port_data.get_repository().overview(unlocode)
 
     if (format or "").lower() == "csv":
-        rows = ["unlocode,arrivals_7d,departures_7d,waiting_vessels,avg_wait_hours,avg_berth_hours,updated_at"]
-        rows.append(",".join([
-            data["unlocode"],
-            str(data["arrivals_7d"]),
-            str(data["departures_7d"]),
-            str(data["waiting_vessels"]),
-            str(data["avg_wait_hours"]),
-            str(data["avg_berth_hours"]),
-            data["updated_at"],
-        ]))
-        body, etag = _csv_and_etag(rows)
-        return Response(
-            content=body,
-            media_type="text/csv; charset=utf-8",
-            headers={
-                "ETag": etag,
-                "Cache-Control": "public, max-age=300, no-transform",
-                "Vary": "Accept-Encoding",
-            },
-        )
-
-    return data
+        body, etag = _overview_csv(data)
+        return _csv_response(body, etag, None)
+
+    return json_response(data)
 
 @router.head("/{unlocode}/overview", summary="Head Overview")
 async def head_overview(
@@ -107,112 +185,104 @@ async def head_overview(
     _ensure_port_exists(unlocode)
 
     if (format or "").lower() == "csv":
-        data = _demo_overview(unlocode)
-        rows = ["unlocode,arrivals_7d,departures_7d,waiting_vessels,avg_wait_hours,avg_berth_hours,updated_at"]
-        rows.append(",".join([
-            data["unlocode"],
-            str(data["arrivals_7d"]),
-            str(data["departures_7d"]),
-            str(data["waiting_vessels"]),
-            str(data["avg_wait_hours"]),
-            str(data["avg_berth_hours"]),
-            data["updated_at"],
-        ]))
-        _, etag = _csv_and_etag(rows)
-        inm = request.headers.get("if-none-match") if request else None
-        if inm and any(etag.strip() == t.strip() or f'W/{etag}' == t.strip() for t in inm.split(",")):
-            return Response(status_code=304, headers={
-                "Content-Type": "text/csv; charset=utf-8",
-                "ETag": etag,
-                "Cache-Control": "public, max-age=300, no-transform",
-                "Vary": "Accept-Encoding",
-            })
-        return Response(status_code=200, headers={
-            "ETag": etag,
-            "Content-Type": "text/csv; charset=utf-8",
-            "Cache-Control": "public, max-age=300, no-transform",
-            "Vary": "Accept-Encoding",
-        })
+        body, etag = _overview_csv(port_data.get_repository().overview(unlocode))
+        return _csv_response(body, etag, request, head=True)
     return Response(status_code=200, headers={"Cache-Control": "public, max-age=300, no-transform"})
 
-# -------- Trend (JSON/CSV + ETag/304 + HEAD) --------
-@router.get("/{unlocode}/trend", summary="Port trend (JSON/CSV)")
+# -------- Trend (JSON/CSV/Arrow/Parquet + ETag/304 + HEAD) --------
+@router.get("/{unlocode}/trend", summary="Port trend (JSON/CSV/Arrow/Parquet)")
 async def get_trend(
     unlocode: str,
     days: int | None = Query(None, ge=1, le=30),
     window: int | None = Query(None, ge=1, le=30),
-    limit: int | None = Query(None, ge=1, le=1000),
-    format: str | None = Query(None, pattern="^(json|csv)$"),
+    limit: int | None = Query(None, ge=1, le=1000, description="只返回窗口内最近 limit 个点"),
+    fields: str | None = Query(None, description="逗号分隔，例：vessels,avg_wait_hours；"
+                               "为空=原格式（date + congestion_score，0–1）"),
+    format: str | None = Query(None, pattern=_FORMAT_RE),
     request: Request = None,
 ):
     _ensure_unlocode_valid(unlocode)
     _ensure_port_exists(unlocode)
 
     N = days or window or 7
-    pts = _demo_trend(unlocode, N)
+    fmt = (format or "").lower()
 
-    if (format or "").lower() == "csv":
-        rows = ["date,congestion_score"]
-        rows += [f'{p["date"]},{p["congestion_score"]}' for p in pts]
-        body, etag = _csv_and_etag(rows)
-        inm = request.headers.get("if-none-match") if request else None
-        if inm and any(etag.strip() == t.strip() or f'W/{etag}' == t.strip() for t in inm.split(",")):
-            return Response(status_code=304, headers={"ETag": etag,
-                "Content-Type": "text/csv; charset=utf-8",
-                "Cache-Control": "public, max-age=300, no-transform",
-                "Vary": "Accept-Encoding",})
-        return Response(
-            content=body,
-            media_type="text/csv; charset=utf-8",
-            headers={
-                "ETag": etag,
-                "Cache-Control": "public, max-age=300, no-transform",
-                "Vary": "Accept-Encoding",
-            },
-        )
-
-    return {"unlocode": unlocode, "as_of": datetime.now(timezone.utc).isoformat(), "points": pts}
+    if fmt == "csv":
+        return await _trend_csv(unlocode, N, fields, request, limit=limit)
+    if fmt in columnar.FORMATS:
+        return await _columnar_response("trend", unlocode, fmt, N, fields, request, limit=limit)
+
+    # body 里有 as_of=now：弱校验器
+    cols = _trend_cols(fields)
+    v = await _validator("trend", unlocode, ("trend", "json", N, cols, limit), weak=True)
+    nm = _not_modified(v, request)
+    if nm is not None:
+        return nm
+    pts = _last(await port_data.get_repository().trend(unlocode, N), limit)
+    as_of = datetime.now(timezone.utc).isoformat()
+    if cols is None:
+        return json_response({"unlocode": unlocode, "as_of": as_of, "points": _legacy_points(pts)},
+                             headers=_data_headers(v))
+    # 直接交给编码器：投影后的点列表不经 jsonable_encoder 重建
+    return json_response({"unlocode": unlocode, "days": N, "as_of": as_of, "points": port_data.project(pts, cols)},
+                         headers=_data_headers(v))
 
 @router.head("/{unlocode}/trend", summary="Head Trend")
 async def head_trend(
     unlocode: str,
     days: int | None = Query(None, ge=1, le=30),
     window: int | None = Query(None, ge=1, le=30),
-    format: str | None = Query(None, pattern="^(json|csv)$"),
+    limit: int | None = Query(None, ge=1, le=1000),
+    fields: str | None = Query(None),
+    format: str | None = Query(None, pattern=_FORMAT_RE),
     request: Request = None,
 ):
     _ensure_unlocode_valid(unlocode)
     _ensure_port_exists(unlocode)
 
     N = days or window or 7
-    if (format or "").lower() == "csv":
-        pts = _demo_trend(unlocode, N)
-        rows = ["date,congestion_score"]
-        rows += [f'{p["date"]},{p["congestion_score"]}' for p in pts]
-        _, etag = _csv_and_etag(rows)
-        inm = request.headers.get("if-none-match") if request else None
-        if inm and any(etag.strip() == t.strip() or f'W/{etag}' == t.strip() for t in inm.split(",")):
-            return Response(status_code=304, headers={
-                "ETag": etag,
-                "Cache-Control": "public, max-age=300, no-transform",
-                "Vary": "Accept-Encoding",
-            })
-        return Response(status_code=200, headers={"ETag": etag,
-            "Content-Type": "text/csv; charset=utf-8",
-            "Cache-Control": "public, max-age=300, no-transform",
-            "Vary": "Accept-Encoding",})
-    return Response(status_code=200, headers={"Cache-Control": "public, max-age=300, no-transform"})
+    fmt = (format or "").lower()
+    if fmt == "csv":
+        return await _trend_csv(unlocode, N, fields, request, head=True, limit=limit)
+    if fmt in columnar.FORMATS:
+        return await _columnar_response("trend", unlocode, fmt, N, fields, request, head=True, limit=limit)
+    cols = _trend_cols(fields)
+    v = await _validator("trend", unlocode, ("trend", "json", N, cols, limit), weak=True)
+    nm = _not_modified(v, request)
+    if nm is not None:
+        return nm
+    return Response(status_code=200, headers=_data_headers(v, "application/json"))
 
 # -------- Snapshot/Dwell/Alerts（自检只要 200） --------
 @router.get("/{unlocode}/snapshot", summary="Port snapshot")
 async def snapshot(unlocode: str):
     _ensure_unlocode_valid(unlocode); _ensure_port_exists(unlocode)
-    return _demo_overview(unlocode)
+    return json_response(port_data.get_repository().overview(unlocode))
 
 @router.get("/{unlocode}/dwell", summary="Dwell (demo)")
-async def dwell(unlocode: str, window: str | None = Query("14d")):
+async def dwell(
+    unlocode: str,
+    window: str | None = Query("14d"),
+    days: int | None = Query(None, ge=1, le=365),
+    format: str | None = Query(None, pattern="^(json|arrow|parquet)$"),
+    request: Request = None,
+):
     _ensure_unlocode_valid(unlocode); _ensure_port_exists(unlocode)
-    return []
+    n = days
+    if n is None:
+        try:
+            n = int(str(window or "14d").lower().rstrip("d"))
+        except ValueError:
+            n = 14
+    n = max(1, min(365, n))
+    fmt = (format or "").lower()
+    if fmt in columnar.FORMATS:
+        return await _columnar_response("dwell", unlocode, fmt, n, None, request)
+    v = await _validator("dwell", unlocode, ("dwell", "json", n))
+    nm = _not_modified(v, request)
+    if nm is not None:
+        return nm
+    return json_response(await port_data.get_repository().dwell(unlocode, n), headers=_data_headers(v))
 
 @router.get("/{unlocode}/alerts", summary="Dwell change alerts (v1)")
 async def get_alerts(unlocode: str, window: str | None = Query("14d")):
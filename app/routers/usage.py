@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from app.services import tiers, usage
+from app.services.json_codec import json_response
+
+router = APIRouter(prefix="/v1", tags=["usage"])
+
+
+@router.get("/usage", summary="API usage for the calling key (requests / bytes per day and route)")
+async def get_usage(request: Request, days: int = Query(30, ge=1, le=400)):
+    # 只回调用方自己这把 key 的用量（聚合表 + 本 worker 未刷出的增量）
+    key = tiers.api_key(request.scope)
+    if not key:
+        raise HTTPException(status_code=401, detail="API key required")
+    try:
+        body = await usage.report(key, days)
+    except Exception:
+        raise HTTPException(status_code=503, detail="usage store unavailable")
+    return json_response(body, headers={"Cache-Control": "private, no-store"})
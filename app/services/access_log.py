@@ -0,0 +1,167 @@
+# app/services/access_log.py —— 结构化 JSON 访问日志：QueueHandler → 后台线程写文件，轮转后后台压缩
+"""
+每个请求一行 JSON（ts / request_id / method / path / query / route / status / latency_ms / bytes / key / cache），
+也是回放压测（真实流量的路径 + 查询串分布）的数据来源。
+
+- 事件循环里只做：拼一个 dict + QueueHandler 入队（SimpleQueue.put，不碰 I/O、不做序列化）
+- QueueListener 的后台线程负责 JSON 序列化 + 写文件（RotatingFileHandler，ACCESS_LOG_MAX_MB / ACCESS_LOG_BACKUPS）
+- 每个 worker 写自己的文件（access.<pid>.log，或路径里写 {pid}）：多个进程的 RotatingFileHandler
+  轮转同一个文件会丢行、重复轮转
+- 轮转出去的文件另起线程 gzip（access.<pid>.log.1.gz …），写日志的线程不等压缩；
+  下一次轮转先等上一次压缩完，不会把还没压完的文件挪走或覆盖
+- 采样：2xx 只记 ACCESS_LOG_SAMPLE_2XX 的比例（默认全记），其余状态码总是全记；
+  每行带 "sample"，回放 / 统计时按 1/sample 加权还原
+- key 只记 key_id（与用量计量同一个 sha256 前缀，app/services/usage.py），不落原始 key
+
+ACCESS_LOG_FILE 默认 "-" = 写 stdout（容器里交给日志采集）；为空或 DISABLE_ACCESS_LOG 时不启用。
+cache：304 → revalidated；回旧值（X-Data-Stale）→ stale；否则取本请求 port_data 缓存的 hit / miss。
+"""
+from __future__ import annotations
+
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+import sys
+import threading
+from pathlib import Path
+from typing import Optional
+
+from app.services import json_codec
+
+LOG_FILE = os.getenv("ACCESS_LOG_FILE", "-").strip()
+SAMPLE_2XX = min(1.0, max(0.0, float(os.getenv("ACCESS_LOG_SAMPLE_2XX", "1") or 1)))
+MAX_BYTES = int(float(os.getenv("ACCESS_LOG_MAX_MB", "100")) * (1 << 20))
+BACKUPS = int(os.getenv("ACCESS_LOG_BACKUPS", "10"))
+
+LOGGER = logging.getLogger("portpulse.access")
+LOGGER.propagate = False  # 不混进应用日志
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def enabled() -> bool:
+    if os.getenv("DISABLE_ACCESS_LOG", "").strip().lower() in ("1", "true", "yes", "on"):
+        return False
+    return bool(LOG_FILE)
+
+
+def sampled(status: int) -> Optional[float]:
+    """这条要不要记：记 → 采样率；不记 → None。"""
+    if 200 <= status < 300 and SAMPLE_2XX < 1.0:
+        return SAMPLE_2XX if random.random() < SAMPLE_2XX else None
+    return 1.0
+
+
+class _Enqueue(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # 默认实现会在调用线程里 format + 复制 record；这里原样入队，序列化留给监听线程
+        return record
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        return json_codec.dumps(record.access).decode("utf-8")
+
+
+def worker_path(path: str) -> str:
+    """每个 worker 一个文件：路径里有 {pid} 就替换，否则插在扩展名前（logs/access.log → logs/access.<pid>.log）。"""
+    if path == "-":
+        return path
+    if "{pid}" in path:
+        return path.replace("{pid}", str(os.getpid()))
+    p = Path(path)
+    return str(p.with_name(f"{p.stem}.{os.getpid()}{p.suffix}"))
+
+
+class _GzipRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """轮转出去的文件在后台线程里 gzip（写日志的线程不等）。
+
+    doRollover 先把已有的 .N.gz 依次后移，再调 rotator：上一次的压缩还没写完 .1.gz 时就后移，
+    会被这次的新 .1.gz 覆盖、或把还没压的原文删掉——所以每次轮转先等上一次压缩结束。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._gzip: Optional[threading.Thread] = None
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._gzip_in_background
+
+    def doRollover(self):
+        self.wait_compressed()
+        super().doRollover()
+
+    def wait_compressed(self) -> None:
+        if self._gzip is not None:
+            self._gzip.join()
+            self._gzip = None
+
+    def _gzip_in_background(self, source: str, dest: str) -> None:
+        plain = dest[:-3] if dest.endswith(".gz") else dest + ".plain"
+        os.replace(source, plain)
+
+        def _compress():
+            tmp = dest + ".tmp"
+            try:
+                with open(plain, "rb") as src, gzip.open(tmp, "wb") as out:
+                    shutil.copyfileobj(src, out)
+                os.replace(tmp, dest)
+                os.remove(plain)
+            except OSError:
+                pass
+
+        self._gzip = threading.Thread(target=_compress, name="access-log-gzip", daemon=True)
+        self._gzip.start()
+
+    def close(self):
+        self.wait_compressed()
+        super().close()
+
+
+def _file_handler(path: str) -> logging.Handler:
+    if path == "-":
+        return logging.StreamHandler(sys.stdout)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    return _GzipRotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUPS, encoding="utf-8", delay=True)
+
+
+def start(path: Optional[str] = None) -> Optional[logging.handlers.QueueListener]:
+    """应用启动时调用：挂上队列 handler、起监听线程；返回 listener（关闭时交给 stop）。"""
+    global _listener
+    if not enabled() or _listener is not None:
+        return None
+    out = _file_handler(worker_path(path or LOG_FILE))
+    out.setFormatter(_JsonFormatter())
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    LOGGER.addHandler(_Enqueue(q))
+    LOGGER.setLevel(logging.INFO)
+    _listener = logging.handlers.QueueListener(q, out, respect_handler_level=False)
+    _listener.start()
+    return _listener
+
+
+def stop(listener: Optional[logging.handlers.QueueListener]) -> None:
+    """停止监听线程（先把队列里剩下的写完），卸下 handler。"""
+    global _listener
+    if listener is None:
+        return
+    listener.stop()
+    for h in listener.handlers:
+        h.close()
+    for h in list(LOGGER.handlers):
+        if isinstance(h, _Enqueue):
+            LOGGER.removeHandler(h)
+    if _listener is listener:
+        _listener = None
+
+
+def active() -> bool:
+    return _listener is not None
+
+
+def log(fields: dict) -> None:
+    """事件循环里调用：只入队。"""
+    LOGGER.info("access", extra={"access": fields})
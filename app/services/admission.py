@@ -0,0 +1,220 @@
+# app/services/admission.py —— 准入控制：按路由类别的自适应并发上限 + 带截止时间的短队列
+"""
+突发流量下原来是来多少收多少：所有请求一起变慢，SQL 在边缘超时之后还在排队。现在每类路由一条“车道”：
+
+    cached   缓存命中为主的只读（trend / dwell / overview / alerts / meta …）
+    db       直接打库 / 现算（/v1/ports/changes、/v1/hs、/v1/admin …）
+    export   大响应（/v1/datasets、format=arrow|parquet）
+
+- 车道内并发 < limit 直接放行；否则进短队列（ADMISSION_<LANE>_QUEUE），排队超过
+  ADMISSION_<LANE>_DEADLINE_MS 还没轮到 → 503 + Retry-After（快速失败，客户端/负载均衡去重试别处）
+- limit 按观测延迟自适应（AIMD）：首字节延迟超过目标（ADMISSION_<LANE>_TARGET_MS）→ 乘性减小
+  （一个目标时长内只减一次，同一批慢请求不连减）；未超时且车道确实吃满 → 每 limit 个请求加 1
+  上限 ADMISSION_<LANE>_LIMIT，下限 min_limit
+- 车道内按 key 等级（app/services/tiers.py）分优先级：有空位时先放 admin，再 live，最后 demo；
+  demo（含匿名）最多占 limit 的 ADMISSION_DEMO_SHARE（至少 1 个，且总能拿到这 1 个：
+  demo 一个都没在跑时它排在 live 前面），队列里也最多占同样比例
+- 每个 worker 各自一套（单事件循环，无锁）；/metrics 里 limit / inflight / queue 是各 worker 之和
+
+指标：portpulse_admission_total{lane,tier,result}、portpulse_admission_queue_wait_seconds{lane,tier}、
+      portpulse_admission_inflight / _queue{lane,tier}、portpulse_admission_limit{lane}、
+      portpulse_tier_request_duration_seconds{tier}
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+from urllib.parse import parse_qs
+
+from app.services import metrics
+from app.services.tiers import TIERS
+
+BACKOFF = 0.9  # 超目标时的乘性因子
+DEMO_SHARE = float(os.getenv("ADMISSION_DEMO_SHARE", "0.1"))
+
+RESULTS = metrics.register(metrics.Counter(
+    "portpulse_admission", "Admission decisions by lane and tier (immediate / queued / rejected_full / rejected_deadline)",
+    ("lane", "tier", "result"),
+))
+QUEUE_WAIT = metrics.register(metrics.Histogram(
+    "portpulse_admission_queue_wait_seconds", "Time admitted requests spent queued", ("lane", "tier"),
+))
+LIMIT = metrics.register(metrics.Gauge(
+    "portpulse_admission_limit", "Current adaptive concurrency limit", ("lane",),
+))
+INFLIGHT = metrics.register(metrics.Gauge(
+    "portpulse_admission_inflight", "Requests currently admitted", ("lane", "tier"),
+))
+QUEUED = metrics.register(metrics.Gauge(
+    "portpulse_admission_queue", "Requests currently waiting for admission", ("lane", "tier"),
+))
+TIER_LATENCY = metrics.register(metrics.Histogram(
+    "portpulse_tier_request_duration_seconds", "Request latency by API key tier, including admission wait", ("tier",),
+))
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+class Lane:
+    def __init__(self, name: str, max_limit: int, min_limit: int, queue: int, deadline: float, target: float,
+                 demo_share: float = DEMO_SHARE):
+        self.name = name
+        self.max_limit, self.min_limit = max(1, max_limit), max(1, min(min_limit, max_limit))
+        self.limit = float(self.max_limit)  # 从上限起步：没有压力就不收紧
+        self.queue, self.deadline, self.target = max(0, queue), deadline, target
+        self.demo_share = demo_share
+        self.inflight = 0
+        self.by_tier: Dict[str, int] = dict.fromkeys(TIERS, 0)
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {t: deque() for t in TIERS}
+        self._last_decrease = 0.0
+        self._gauges()
+
+    @classmethod
+    def from_env(cls, name: str, max_limit: int, min_limit: int, queue: int,
+                 deadline_ms: float, target_ms: float) -> "Lane":
+        p = f"ADMISSION_{name.upper()}_"
+        return cls(name, int(_env_num(p + "LIMIT", max_limit)), min_limit, int(_env_num(p + "QUEUE", queue)),
+                   _env_num(p + "DEADLINE_MS", deadline_ms) / 1000, _env_num(p + "TARGET_MS", target_ms) / 1000)
+
+    def _gauges(self) -> None:
+        LIMIT.set(int(self.limit), self.name)
+        for t in TIERS:
+            INFLIGHT.set(self.by_tier[t], self.name, t)
+            QUEUED.set(len(self._waiters[t]), self.name, t)
+
+    def _cap(self, tier: str, total: float) -> float:
+        return max(1, int(total * self.demo_share)) if tier == "demo" else total
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self._waiters.values())
+
+    def _can_start(self, tier: str) -> bool:
+        return self.inflight < int(self.limit) and self.by_tier[tier] < self._cap(tier, int(self.limit))
+
+    def _ahead(self, tier: str) -> bool:
+        """同级或更高等级有人在排队（不能插到他们前面）。"""
+        return any(self._waiters[t] for t in TIERS[:TIERS.index(tier) + 1])
+
+    def _take(self, tier: str) -> None:
+        self.inflight += 1
+        self.by_tier[tier] += 1
+
+    async def acquire(self, tier: str = "live") -> bool:
+        """拿到名额 → True；队列满或排队超时 → False（调用方回 503）。"""
+        if not self._ahead(tier) and self._can_start(tier):
+            self._take(tier)
+            RESULTS.inc(self.name, tier, "immediate")
+            INFLIGHT.set(self.by_tier[tier], self.name, tier)
+            return True
+        q = self._waiters[tier]
+        if self.queued() >= self.queue or len(q) >= self._cap(tier, self.queue):
+            RESULTS.inc(self.name, tier, "rejected_full")
+            return False
+        fut = asyncio.get_running_loop().create_future()
+        q.append(fut)
+        QUEUED.set(len(q), self.name, tier)
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(fut, self.deadline)
+        except asyncio.TimeoutError:
+            RESULTS.inc(self.name, tier, "rejected_deadline")
+            return False
+        except asyncio.CancelledError:
+            # 已被放行但调用方走了：名额还回去
+            if fut.done() and not fut.cancelled():
+                self.release(None, tier)
+            raise
+        finally:
+            try:
+                q.remove(fut)
+            except ValueError:
+                pass
+            QUEUED.set(len(q), self.name, tier)
+        QUEUE_WAIT.observe(time.perf_counter() - t0, self.name, tier)
+        RESULTS.inc(self.name, tier, "queued")
+        return True
+
+    def release(self, latency: Optional[float], tier: str = "live") -> None:
+        """请求结束；latency = 首字节延迟（None：没跑起来，不参与调整）。"""
+        if latency is not None:
+            self._adjust(latency)
+        self.inflight -= 1
+        self.by_tier[tier] -= 1
+        self._grant()
+        self._gauges()
+
+    def _adjust(self, latency: float) -> None:
+        if latency > self.target:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.target:
+                self.limit = max(float(self.min_limit), self.limit * BACKOFF)
+                self._last_decrease = now
+        elif self.queued() or self.inflight >= int(self.limit):
+            # 只在真的吃满时加：空闲时 limit 不会悄悄涨回上限
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def _next_tier(self) -> Optional[str]:
+        """下一个该放行的等级：demo 一个都没在跑时先给它保底的 1 个，其余按优先级。"""
+        if self._waiters["demo"] and self.by_tier["demo"] == 0:
+            return "demo"
+        for t in TIERS:
+            if self._waiters[t] and self._can_start(t):
+                return t
+        return None
+
+    def _grant(self) -> None:
+        while self.inflight < int(self.limit):
+            tier = self._next_tier()
+            if tier is None:
+                return
+            fut = self._waiters[tier].popleft()
+            if not fut.done():
+                self._take(tier)
+                fut.set_result(True)
+
+
+class Controller:
+    def __init__(self, lanes: Dict[str, Lane]):
+        self.lanes = lanes
+
+    @classmethod
+    def from_env(cls) -> "Controller":
+        return cls({
+            "cached": Lane.from_env("cached", 128, 8, 256, 50, 150),
+            "db": Lane.from_env("db", 16, 2, 32, 150, 300),
+            "export": Lane.from_env("export", 4, 1, 8, 1000, 2000),
+        })
+
+    def lane(self, scope) -> Lane:
+        return self.lanes[classify(scope.get("path") or "", scope.get("query_string") or b"")]
+
+
+_DB_PREFIXES = ("/v1/ports/changes", "/v1/hs/", "/v1/admin/")
+
+
+def classify(path: str, query: bytes) -> str:
+    """路由类别（只看 path / query：还没路由匹配，不能依赖 endpoint）。"""
+    if path.startswith("/v1/datasets"):
+        return "export"
+    if b"format=" in query:
+        fmt = (parse_qs(query.decode("latin-1")).get("format") or [""])[0].lower()
+        if fmt in ("arrow", "parquet"):
+            return "export"
+    if path.startswith(_DB_PREFIXES):
+        return "db"
+    return "cached"
+
+
+def enabled() -> bool:
+    return os.getenv("DISABLE_ADMISSION", "").strip().lower() not in ("1", "true", "yes", "on")
+
+
+CONTROLLER = Controller.from_env()
@@ -0,0 +1,375 @@
+# app/services/changes.py —— 变更日志：单调递增的 seq + /v1/ports/changes?since=<cursor> 增量同步
+"""
+本地镜像的客户原来只能整窗重拉再逐点比对；现在每次入库都往变更日志追加 (port, kind, date, metrics)，
+客户端拿上次的游标增量拉取：同步成本从 O(港口 × 天) 降到 O(变更数)。
+
+写入来源：
+- DB：port_snapshots / port_dwell 上的触发器（migrations/20261019_port_changes.sql），
+  trend 只记“当天最新一条快照”（与 API 口径一致）
+- 覆盖文件：services/ingesters.ingest_port_day 写完文件后 record(origin="override")
+- 派生文件：scripts/aggregate_*.py 写完文件后 record_batch(origin="derived")
+
+record() 按 (origin, kind, port, date) 存一份内容摘要（port_change_state），只有数值/src 真变了才追加；
+重复跑同一批文件、多 worker 同时写都不会产生重复变更。写失败时摘要也没更新，下次入库会补记。
+
+存储：配置了 DATABASE_URL 时与触发器同库（Postgres），否则本地 SQLite（CHANGES_DB）。
+seq 的分配与提交顺序一致（Postgres 用事务级 advisory lock 串行化写入，SQLite 用 BEGIN IMMEDIATE），
+读者按 seq > cursor 翻页不会漏掉“号小但提交晚”的行。
+
+游标对客户端不透明（base64url）。每行带 origin（override / db / derived：写入它的那一层），
+客户端按层各自保存、按 API 的分层口径取值（resolve()，见 docs/EXAMPLES.md）：
+同一 (kind, port, date) 有 override 取 override；否则该港口有任何 db 行就取 db（没有该日 = 没数据），
+都没有才取 derived；同一层内以最后一条为准。不能跨层“最后一条为准”：派生脚本晚于 DB 入库跑时，
+它追加的行并不是 API 对外的值。
+
+每次追加也是一次缓存失效事件（app/services/invalidation.py）：各 worker 据此驱逐 (port, kind) 的缓存。
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services import invalidation, json_codec, tiers
+
+SQLITE_PATH = os.getenv("CHANGES_DB", "data/changes.db")
+KINDS = ("trend", "dwell")
+ORIGINS = ("override", "db", "derived")  # 与 PortDataRepository 的分层一致：覆盖层 > DB > 派生文件
+_FIELDS = {
+    "trend": ("vessels", "avg_wait_hours", "congestion_score"),
+    "dwell": ("dwell_hours",),
+}
+_CURSOR_PREFIX = "c1."
+_PG_LOCK_KEY = "port_changes"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# --------------------------------------------------------------------
+# 游标
+# --------------------------------------------------------------------
+def encode_cursor(seq: int) -> str:
+    raw = f"{_CURSOR_PREFIX}{int(seq)}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """空游标 = 从头开始（首次全量）；格式不对 → InvalidCursor。"""
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        if not raw.startswith(_CURSOR_PREFIX):
+            raise ValueError(raw)
+        seq = int(raw[len(_CURSOR_PREFIX):])
+    except Exception:
+        raise InvalidCursor("invalid cursor") from None
+    if seq < 0:
+        raise InvalidCursor("invalid cursor")
+    return seq
+
+
+# --------------------------------------------------------------------
+# 行 / 摘要
+# --------------------------------------------------------------------
+def _metrics(kind: str, p: dict) -> dict:
+    return {f: p.get(f) for f in _FIELDS[kind]}
+
+
+def _digest(metrics: dict, src: Optional[str]) -> str:
+    # 只看数值与 src：as_of 每次入库都会变，不算数据变更
+    return hashlib.blake2b(json_codec.dumps([metrics, src]), digest_size=12).hexdigest()
+
+
+def _pending(kind: str, points: Iterable[dict], default_src: Optional[str],
+             state: Dict[str, str]) -> List[Tuple[str, dict, Optional[str], str]]:
+    """与已记录摘要不同的点 → [(date, metrics, src, digest)]（同日重复取最后一条）。"""
+    latest: Dict[str, dict] = {}
+    for p in points:
+        d = p.get("date")
+        if d:
+            latest[str(d)[:10]] = p
+    out = []
+    for d in sorted(latest):
+        p = latest[d]
+        m = _metrics(kind, p)
+        src = p.get("src") or default_src
+        dg = _digest(m, src)
+        if state.get(d) != dg:
+            out.append((d, m, src, dg))
+    return out
+
+
+def _row(seq, kind, unlocode, d, metrics, src, changed_at, origin) -> dict:
+    if isinstance(metrics, (str, bytes)):
+        metrics = json_codec.loads(metrics)
+    if isinstance(changed_at, (int, float)):
+        changed_at = datetime.fromtimestamp(changed_at, tz=timezone.utc)
+    return {
+        "seq": int(seq),
+        "unlocode": unlocode,
+        "kind": kind,
+        "date": d if isinstance(d, str) else d.isoformat(),
+        "metrics": metrics,
+        "src": src,
+        "origin": origin,
+        "changed_at": changed_at.isoformat() if changed_at is not None else None,
+    }
+
+
+def _head(unlocode, origin, d, changed_at) -> dict:
+    """每 (港口, 层) 最新一行的摘要（新鲜度跟踪启动时用，app/services/freshness.py）。"""
+    if isinstance(changed_at, (int, float)):
+        changed_at = datetime.fromtimestamp(changed_at, tz=timezone.utc)
+    return {
+        "unlocode": unlocode,
+        "origin": origin,
+        "date": d if isinstance(d, str) else d.isoformat(),
+        "changed_at": changed_at.isoformat() if changed_at is not None else None,
+    }
+
+
+# --------------------------------------------------------------------
+# Stores
+# --------------------------------------------------------------------
+class SqliteChangeLog:
+    """本地/单机用；跨进程互斥依赖 SQLite 自身的文件锁（同 etl/sharding.SqliteMembership）。"""
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # 读者不阻塞写者
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS port_changes ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " kind TEXT NOT NULL, unlocode TEXT NOT NULL, date TEXT NOT NULL,"
+                " metrics TEXT NOT NULL, src TEXT, changed_at REAL NOT NULL,"
+                " origin TEXT NOT NULL DEFAULT 'db')"
+            )
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(port_changes)")}
+            if "origin" not in cols:  # 旧库补列：之前写入的行不知道来自哪一层，origin 留空
+                conn.execute("ALTER TABLE port_changes ADD COLUMN origin TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_port_changes_unloc_seq ON port_changes (unlocode, seq)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS port_change_state ("
+                " origin TEXT NOT NULL, kind TEXT NOT NULL, unlocode TEXT NOT NULL, date TEXT NOT NULL,"
+                " digest TEXT NOT NULL, PRIMARY KEY (origin, kind, unlocode, date))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _record(self, origin: str, kind: str, unlocode: str, points: List[dict],
+                default_src: Optional[str]) -> int:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            state = dict(conn.execute(
+                "SELECT date, digest FROM port_change_state WHERE origin=? AND kind=? AND unlocode=?",
+                (origin, kind, unlocode),
+            ).fetchall())
+            todo = _pending(kind, points, default_src, state)
+            now = time.time()
+            conn.executemany(
+                "INSERT INTO port_changes(kind, unlocode, date, metrics, src, changed_at, origin)"
+                " VALUES (?,?,?,?,?,?,?)",
+                [(kind, unlocode, d, json_codec.dumps(m).decode("utf-8"), src, now, origin)
+                 for d, m, src, _ in todo],
+            )
+            conn.executemany(
+                "INSERT INTO port_change_state(origin, kind, unlocode, date, digest) VALUES (?,?,?,?,?)"
+                " ON CONFLICT(origin, kind, unlocode, date) DO UPDATE SET digest=excluded.digest",
+                [(origin, kind, unlocode, d, dg) for d, _, _, dg in todo],
+            )
+            seq = conn.execute("SELECT max(seq) FROM port_changes").fetchone()[0] if todo else 0
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:  # BEGIN 本身失败（库被锁）时没有事务可回滚，别把原异常盖掉
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        if todo:
+            try:
+                # 各 worker 的缓存失效（Postgres 那边由 port_changes 上的触发器 NOTIFY）
+                invalidation.publish_journal([(unlocode, kind, seq)])
+            except Exception:
+                pass
+        return len(todo)
+
+    def _since(self, seq: int, limit: int, unlocode: Optional[str], kind: Optional[str]) -> List[dict]:
+        sql = "SELECT seq, kind, unlocode, date, metrics, src, changed_at, origin FROM port_changes WHERE seq > ?"
+        args: list = [seq]
+        if unlocode:
+            sql += " AND unlocode = ?"
+            args.append(unlocode)
+        if kind:
+            sql += " AND kind = ?"
+            args.append(kind)
+        sql += " ORDER BY seq LIMIT ?"
+        args.append(limit)
+        conn = self._connect()
+        try:
+            return [_row(*r) for r in conn.execute(sql, args).fetchall()]
+        finally:
+            conn.close()
+
+    def _heads(self) -> Tuple[int, List[dict]]:
+        conn = self._connect()
+        try:
+            seq = conn.execute("SELECT coalesce(max(seq), 0) FROM port_changes").fetchone()[0]
+            rows = conn.execute(
+                "SELECT unlocode, origin, max(date), max(changed_at) FROM port_changes"
+                " WHERE seq <= ? GROUP BY unlocode, origin", (seq,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return seq, [_head(u, o, d, c) for u, o, d, c in rows]
+
+    async def record(self, origin, kind, unlocode, points, default_src=None) -> int:
+        return await asyncio.to_thread(self._record, origin, kind, unlocode, list(points), default_src)
+
+    async def heads(self) -> Tuple[int, List[dict]]:
+        return await asyncio.to_thread(self._heads)
+
+    async def since(self, seq, limit, unlocode=None, kind=None) -> List[dict]:
+        return await asyncio.to_thread(self._since, seq, limit, unlocode, kind)
+
+
+class PostgresChangeLog:
+    """生产用：与 port_snapshots / port_dwell 触发器同库同序列（migrations/20261019_port_changes.sql）。"""
+
+    async def _pool(self):
+        from app.services.deps import get_db_pool
+        return await get_db_pool()
+
+    async def record(self, origin, kind, unlocode, points, default_src=None) -> int:
+        pool = await self._pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                # 与触发器同一把锁：seq 分配顺序 = 提交顺序
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext($1))", _PG_LOCK_KEY)
+                rows = await conn.fetch(
+                    "SELECT date::text AS date, digest FROM port_change_state"
+                    " WHERE origin=$1 AND kind=$2 AND unlocode=$3",
+                    origin, kind, unlocode,
+                )
+                todo = _pending(kind, points, default_src, {r["date"]: r["digest"] for r in rows})
+                if not todo:
+                    return 0
+                await conn.executemany(
+                    "INSERT INTO port_changes(kind, unlocode, date, metrics, src, origin)"
+                    " VALUES ($1, $2, $3::date, $4::jsonb, $5, $6)",
+                    [(kind, unlocode, d, json_codec.dumps(m).decode("utf-8"), src, origin)
+                     for d, m, src, _ in todo],
+                )
+                await conn.executemany(
+                    "INSERT INTO port_change_state(origin, kind, unlocode, date, digest)"
+                    " VALUES ($1, $2, $3, $4::date, $5)"
+                    " ON CONFLICT (origin, kind, unlocode, date) DO UPDATE SET digest = excluded.digest",
+                    [(origin, kind, unlocode, d, dg) for d, _, _, dg in todo],
+                )
+        return len(todo)
+
+    async def since(self, seq, limit, unlocode=None, kind=None) -> List[dict]:
+        pool = await self._pool()
+        async with tiers.db_slot(), pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT seq, kind, unlocode, date, metrics::text AS metrics, src, changed_at, origin"
+                " FROM port_changes"
+                " WHERE seq > $1 AND ($2::text IS NULL OR unlocode = $2) AND ($3::text IS NULL OR kind = $3)"
+                " ORDER BY seq LIMIT $4",
+                seq, unlocode, kind, limit,
+            )
+        return [_row(r["seq"], r["kind"], r["unlocode"], r["date"], r["metrics"], r["src"], r["changed_at"],
+                     r["origin"]) for r in rows]
+
+    async def heads(self) -> Tuple[int, List[dict]]:
+        pool = await self._pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction(isolation="repeatable_read"):
+                seq = await conn.fetchval("SELECT coalesce(max(seq), 0) FROM port_changes")
+                rows = await conn.fetch(
+                    "SELECT unlocode, origin, max(date) AS date, max(changed_at) AS changed_at"
+                    " FROM port_changes WHERE seq <= $1 GROUP BY unlocode, origin", seq,
+                )
+        return seq, [_head(r["unlocode"], r["origin"], r["date"], r["changed_at"]) for r in rows]
+
+
+_STORE = None
+
+
+def get_store():
+    """DATABASE_URL → Postgres（与触发器同库）；否则 SQLite（CHANGES_DB）。测试可替换 changes._STORE。"""
+    global _STORE
+    if _STORE is None:
+        if os.getenv("DATABASE_URL") or os.getenv("DB_DSN"):
+            _STORE = PostgresChangeLog()
+        else:
+            _STORE = SqliteChangeLog(SQLITE_PATH)
+    return _STORE
+
+
+# --------------------------------------------------------------------
+# 入口
+# --------------------------------------------------------------------
+async def record(kind: str, unlocode: str, points: Sequence[dict], origin: str,
+                 default_src: Optional[str] = None) -> int:
+    """入库后调用：把与上次记录不同的点追加到变更日志；返回新增行数。"""
+    if kind not in KINDS:
+        raise ValueError(f"unknown kind: {kind}")
+    if origin not in ORIGINS:
+        raise ValueError(f"unknown origin: {origin}")
+    return await get_store().record(origin, kind, unlocode.upper(), points, default_src or origin)
+
+
+def record_batch(items: Iterable[Tuple[str, str, Sequence[dict]]], origin: str) -> int:
+    """同步入口（scripts/ 里的 ETL 脚本用）：items = [(kind, PORT, points), ...]。"""
+    async def _run() -> int:
+        try:
+            return sum([await record(k, u, pts, origin) for k, u, pts in items])
+        finally:
+            from app.services.deps import close_db_pool
+            await close_db_pool()
+
+    return asyncio.run(_run())
+
+
+async def page(cursor: Optional[str], limit: int, unlocode: Optional[str] = None,
+               kind: Optional[str] = None) -> dict:
+    """since 游标之后的一页变更；next_cursor 总是可直接用于下一次请求（无新变更时原样返回）。"""
+    seq = decode_cursor(cursor)
+    rows = await get_store().since(seq, limit + 1, unlocode, kind)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1]["seq"] if rows else seq
+    for r in rows:
+        del r["seq"]
+    return {"changes": rows, "next_cursor": encode_cursor(last), "has_more": has_more}
+
+
+def resolve(rows: Iterable[dict], mirror: Optional[Dict[tuple, Dict[str, dict]]] = None) -> Dict[tuple, dict]:
+    """按 API 的分层口径把变更行折叠成 {(kind, port, date): metrics}（客户端镜像的参考实现）。
+
+    mirror 是按层保存的状态 {(kind, port): {origin: {date: metrics}}}，增量同步时跨页复用。
+    """
+    mirror = {} if mirror is None else mirror
+    for r in rows:
+        layers = mirror.setdefault((r["kind"], r["unlocode"]), {})
+        layers.setdefault(r.get("origin") or "db", {})[r["date"]] = r["metrics"]
+    out: Dict[tuple, dict] = {}
+    for (kind, port), layers in mirror.items():
+        # 基础层：有 DB 序列就用 DB，否则派生文件；覆盖层按日期叠加在上面
+        base = layers.get("db") or layers.get("derived") or {}
+        for d, m in {**base, **layers.get("override", {})}.items():
+            out[(kind, port, d)] = m
+    return out
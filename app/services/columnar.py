@@ -0,0 +1,67 @@
+# app/services/columnar.py —— format=arrow / parquet：序列 → Arrow 表 → IPC stream / Parquet 字节
+"""
+pyarrow 在 requirements.txt 里；精简部署可以不装，此时 available() 为 False，路由返回 406、
+数据集导出只出 csv.gz。
+按需 import：pyarrow 自身导入就要上百毫秒，不进冷启动路径。
+
+表结构（列序与 CSV 一致）：
+    trend  date:date32, vessels:int64, avg_wait_hours:float64, congestion_score:float64, src:dictionary<string>
+    dwell  date:date32, dwell_hours:float64, src:dictionary<string>
+schema metadata 带 unlocode / kind / source，客户端读表即可拿到。
+
+建表只在 PortDataRepository 的缓存条目首次被请求时做一次；之后窗口是零拷贝 slice、投影是 select，
+不再经过行 dict。
+"""
+from __future__ import annotations
+
+import importlib.util
+from typing import Dict, List, Optional, Sequence
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+FORMATS = tuple(MEDIA_TYPES)
+
+_INT_FIELDS = {"vessels"}
+
+_available: Optional[bool] = None
+
+
+def available() -> bool:
+    global _available
+    if _available is None:
+        _available = importlib.util.find_spec("pyarrow") is not None
+    return _available
+
+
+def _pa():
+    import pyarrow  # noqa: 按需导入
+    return pyarrow
+
+
+def table_from_points(points: List[dict], fields: Sequence[str], metadata: Optional[Dict[str, str]] = None):
+    """升序点列表 → Arrow 表（每列一次性构建）。"""
+    pa = _pa()
+    cols = {"date": pa.array([p.get("date") for p in points], pa.string()).cast(pa.date32())}
+    for f in fields:
+        arr = pa.array([p.get(f) for p in points], from_pandas=True)  # 类型由数据推断（int/float/全空）
+        cols[f] = arr.cast(pa.int64() if f in _INT_FIELDS else pa.float64(), safe=False)
+    cols["src"] = pa.array([p.get("src") for p in points], pa.string()).dictionary_encode()
+    table = pa.table(cols)
+    if metadata:
+        table = table.replace_schema_metadata({k: str(v) for k, v in metadata.items()})
+    return table
+
+
+def encode(table, fmt: str) -> bytes:
+    pa = _pa()
+    sink = pa.BufferOutputStream()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, sink, compression="zstd")
+    else:
+        # IPC stream 不压缩：客户端可直接在收到的缓冲区上零拷贝读取
+        with pa.ipc.new_stream(sink, table.schema) as w:
+            w.write_table(table)
+    return sink.getvalue().to_pybytes()
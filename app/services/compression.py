@@ -0,0 +1,170 @@
+# app/services/compression.py —— 内容编码：编解码器注册、Accept-Encoding 协商、压缩结果缓存
+"""
+gzip 为标准库；brotli / zstandard 为可选依赖（装了才参与协商）：
+
+    pip install brotli zstandard
+
+- negotiate()        按 q 值选编码；同 q 时 br > zstd > gzip > identity
+- VariantCache       按「path + 强 ETag + 编码」缓存压缩后的字节（LRU，按总字节数和条目数限额）：
+                     同一份缓存数据被反复请求时只压缩一次
+- etag_with / strip_encoding_suffix   每个编码一个 ETag（"<tag>-gzip"），与 /openapi.json 一致
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:  # 可选：pip install brotli
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover
+    brotli = None
+
+try:  # 可选：pip install zstandard
+    import zstandard  # type: ignore
+except Exception:  # pragma: no cover
+    zstandard = None
+
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BR_QUALITY = int(os.getenv("COMPRESS_BR_QUALITY", "5"))
+ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", "6"))
+CACHE_BYTES = int(float(os.getenv("COMPRESS_CACHE_MB", "32")) * 1024 * 1024)
+CACHE_ENTRIES = int(os.getenv("COMPRESS_CACHE_ENTRIES", "4096"))
+
+# 同 q 时的优先级（靠后者胜出）
+_PREFERENCE = ("gzip", "zstd", "br")
+
+
+def _codecs(gzip_level: int, br_quality: int, zstd_level: int) -> Dict[str, Callable[[bytes], bytes]]:
+    out: Dict[str, Callable[[bytes], bytes]] = {
+        # mtime=0：同一输入字节一致（可复现，便于做 ETag / 比对）
+        "gzip": lambda b: gzip.compress(b, compresslevel=gzip_level, mtime=0),
+    }
+    if brotli is not None:
+        out["br"] = lambda b: brotli.compress(b, quality=br_quality)
+    if zstandard is not None:
+        out["zstd"] = zstandard.ZstdCompressor(level=zstd_level).compress
+    return out
+
+
+# 动态响应用的默认级别；/openapi.json 这种一次性产物用 max_codecs()
+CODECS = _codecs(GZIP_LEVEL, BR_QUALITY, ZSTD_LEVEL)
+
+
+def max_codecs() -> Dict[str, Callable[[bytes], bytes]]:
+    return _codecs(9, 11, 19)
+
+
+def negotiate(accept_encoding: Optional[str], available) -> str:
+    """按 q 值挑编码；同 q 时 br > zstd > gzip > identity。available 为可用编码名集合。"""
+    if not accept_encoding:
+        return "identity"
+    q: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[name] = weight
+    star = q.get("*")
+    best, best_q = "identity", q.get("identity", star if star is not None else 1.0)
+    for enc in _PREFERENCE:
+        if enc not in available:
+            continue
+        w = q.get(enc, star if star is not None else 0.0)
+        if w > 0 and w >= best_q:
+            best, best_q = enc, w
+    return best
+
+
+# --------------------------------------------------------------------
+# ETag：每个编码一个变体
+# --------------------------------------------------------------------
+_SUFFIX_RE = re.compile(r'^(W/)?"(.*)-(gzip|br|zstd)"$')
+
+
+def etag_with(etag: str, enc: str) -> str:
+    """'"abc"' → '"abc-gzip"'；W/ 前缀保留。"""
+    if enc == "identity" or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{enc}"'
+
+
+def strip_encoding_suffix(if_none_match: str) -> Tuple[str, Dict[str, str]]:
+    """If-None-Match 里的 "<tag>-gzip" 还原为 "<tag>"（原值保留，两者都参与比较）。
+
+    返回 (新的头值, {原始 ETag: 客户端持有的编码变体 ETag})，304 时据此回写客户端手里那一个。
+    """
+    sent: Dict[str, str] = {}
+    out: List[str] = []
+    for cand in if_none_match.split(","):
+        cand = cand.strip()
+        if not cand:
+            continue
+        out.append(cand)
+        m = _SUFFIX_RE.match(cand)
+        if m:
+            base = f'{m.group(1) or ""}"{m.group(2)}"'
+            out.append(base)
+            sent[base.removeprefix("W/")] = cand
+    return ", ".join(out), sent
+
+
+# --------------------------------------------------------------------
+# 压缩结果缓存
+# --------------------------------------------------------------------
+def etag_key(path: str, etag: bytes) -> bytes:
+    """带 ETag 的响应：path + ETag 即表示的身份，不用哈希整个 body。"""
+    return hashlib.blake2b(b"etag\0" + path.encode("utf-8") + b"\0" + etag, digest_size=16).digest()
+
+
+class VariantCache:
+    """(etag_key, 编码) → 压缩字节；压缩后不更小则记 None（下次直接发原文，不再尝试）。
+
+    None 不占字节额度，所以另有条目数上限（max_entries），否则不可压的响应会让字典无限增长。
+    """
+
+    def __init__(self, max_bytes: int = CACHE_BYTES, max_entries: int = CACHE_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.bytes = 0
+        self._data: "OrderedDict[Tuple[bytes, str], Optional[bytes]]" = OrderedDict()
+
+    def get(self, key: Tuple[bytes, str]):
+        """命中返回 (True, 字节或 None)；未命中返回 (False, None)。"""
+        if key not in self._data:
+            return False, None
+        self._data.move_to_end(key)
+        return True, self._data[key]
+
+    def put(self, key: Tuple[bytes, str], value: Optional[bytes]) -> None:
+        size = len(value) if value else 0
+        if size > self.max_bytes:
+            return
+        old = self._data.pop(key, None)
+        self.bytes -= len(old) if old else 0
+        self._data[key] = value
+        self.bytes += size
+        while (self.bytes > self.max_bytes or len(self._data) > self.max_entries) and self._data:
+            _, v = self._data.popitem(last=False)
+            self.bytes -= len(v) if v else 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.bytes = 0
+
+
+VARIANTS = VariantCache()
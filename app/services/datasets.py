@@ -0,0 +1,205 @@
+# app/services/datasets.py —— 每日全量数据集：按 港口 × 月 分区落盘（Parquet / CSV.gz）+ manifest
+"""
+要全量历史的客户原来是逐港口调 /trend 翻页；现在由夜间作业（jobs/datasets_nightly_job.py）
+从 PortDataRepository（DB / 派生文件 / 覆盖层，与 API 同一口径）一次性导出，
+API 缓存只存最近 MAX_DAYS 天，更早的历史由 repo.history() 直接读同一个后端补齐，
+/v1/datasets/{date}/... 直接发静态文件，不再经过每请求的热路径。
+
+目录（Hive 分区，pyarrow.dataset / DuckDB / Spark 可直接按目录读）：
+
+    DATASETS_DIR/2026-10-19/
+      manifest.json
+      trend/port=USLAX/month=2026-10/part.parquet
+      trend/port=USLAX/month=2026-10/part.csv.gz
+      dwell/port=USLAX/month=2026-10/part.parquet
+      ...
+
+- manifest 逐文件记录 bytes / rows / sha256；强 ETag = 内容 sha256（多副本、重跑同内容 ETag 不变）
+- 构建写在临时目录，完成后整体 rename 到位：读者只会看到完整的一天
+- gzip mtime=0、Parquet 固定参数：同样的数据同样的字节
+- 只保留最近 DATASETS_KEEP 天
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import itertools
+import os
+import shutil
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from app.services import columnar, json_codec, port_data
+
+ROOT = Path(os.getenv("DATASETS_DIR", "data/datasets"))
+KEEP_DAYS = int(os.getenv("DATASETS_KEEP", "7"))
+KINDS = ("trend", "dwell")
+MANIFEST = "manifest.json"
+
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "csv.gz": "application/gzip",
+    "json": "application/json",
+}
+
+
+def default_formats() -> List[str]:
+    return (["parquet"] if columnar.available() else []) + ["csv.gz"]
+
+
+def _fields(kind: str) -> Sequence[str]:
+    return port_data.DWELL_FIELDS if kind == "dwell" else port_data.TREND_FIELDS
+
+
+def _encode(rows: List[dict], kind: str, fmt: str, meta: Dict[str, str]) -> bytes:
+    if fmt == "parquet":
+        return columnar.encode(columnar.table_from_points(rows, _fields(kind), meta), "parquet")
+    return gzip.compress(port_data.csv_bytes(rows, _fields(kind)), compresslevel=6, mtime=0)
+
+
+def _etag(sha: str) -> str:
+    return f'"{sha}"'
+
+
+# --------------------------------------------------------------------
+# 构建（夜间作业）
+# --------------------------------------------------------------------
+async def build(day: date, ports: Iterable[str], formats: Optional[Sequence[str]] = None,
+                root: Optional[Path] = None, repo: Optional[port_data.PortDataRepository] = None) -> dict:
+    """导出 `day` 的全量数据集并原子替换到 root/<day>/；返回 manifest。"""
+    root = root or ROOT
+    repo = repo or port_data.get_repository()
+    formats = list(formats or default_formats())
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = root / f".{day.isoformat()}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    files: List[dict] = []
+    try:
+        for kind in KINDS:
+            for u in sorted({p.upper() for p in ports}):
+                pts, src = await repo.history(kind, u)  # 全量历史，不止缓存里的 MAX_DAYS 天
+                # 点已按日期升序：同月的点是连续的一段
+                for month, grp in itertools.groupby(pts, key=lambda p: (p.get("date") or "")[:7]):
+                    rows = list(grp)
+                    if not month:
+                        continue
+                    rel_dir = f"{kind}/port={u}/month={month}"
+                    (tmp / rel_dir).mkdir(parents=True, exist_ok=True)
+                    meta = {"unlocode": u, "kind": kind, "source": src, "month": month}
+                    for fmt in formats:
+                        body = _encode(rows, kind, fmt, meta)
+                        rel = f"{rel_dir}/part.{fmt}"
+                        (tmp / rel).write_bytes(body)
+                        files.append({
+                            "path": rel, "kind": kind, "unlocode": u, "month": month, "format": fmt,
+                            "rows": len(rows), "bytes": len(body), "sha256": hashlib.sha256(body).hexdigest(),
+                        })
+
+        manifest = {
+            "date": day.isoformat(),
+            "generated_at": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+            "layout": "{kind}/port={unlocode}/month={YYYY-MM}/part.{format}",
+            "formats": formats,
+            "fields": {k: ["date", *_fields(k), "src"] for k in KINDS},
+            "files": files,
+        }
+        (tmp / MANIFEST).write_bytes(json_codec.dumps(manifest))
+
+        final = root / day.isoformat()
+        old = root / f".{day.isoformat()}.old-{os.getpid()}"
+        if final.exists():
+            os.replace(final, old)
+        os.replace(tmp, final)
+        shutil.rmtree(old, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return manifest
+
+
+def prune(keep: int = KEEP_DAYS, root: Optional[Path] = None) -> List[str]:
+    """只保留最近 keep 天；返回被删除的日期。"""
+    root = root or ROOT
+    days = available_dates(root)
+    removed = days[:-keep] if keep > 0 else []
+    for d in removed:
+        shutil.rmtree(root / d, ignore_errors=True)
+    return removed
+
+
+# --------------------------------------------------------------------
+# 读取（/v1/datasets 路由）
+# --------------------------------------------------------------------
+def available_dates(root: Optional[Path] = None) -> List[str]:
+    """有 manifest 的日期目录（升序）。"""
+    root = root or ROOT
+    if not root.is_dir():
+        return []
+    out = []
+    for p in root.iterdir():
+        try:
+            date.fromisoformat(p.name)
+        except ValueError:
+            continue
+        if (p / MANIFEST).is_file():
+            out.append(p.name)
+    return sorted(out)
+
+
+def resolve_date(day: str, root: Optional[Path] = None) -> Optional[str]:
+    """'latest' → 最新日期；非法/不存在 → None。"""
+    root = root or ROOT
+    if day == "latest":
+        days = available_dates(root)
+        return days[-1] if days else None
+    try:
+        date.fromisoformat(day)
+    except ValueError:
+        return None
+    return day if (root / day / MANIFEST).is_file() else None
+
+
+class _Manifest:
+    __slots__ = ("mtime_ns", "body", "etag", "files")
+
+    def __init__(self, mtime_ns: int, body: bytes):
+        self.mtime_ns = mtime_ns
+        self.body = body
+        self.etag = _etag(hashlib.sha256(body).hexdigest())
+        self.files = {f["path"]: f for f in json_codec.loads(body).get("files", [])}
+
+
+_MANIFESTS: Dict[str, _Manifest] = {}
+
+
+def manifest(day: str, root: Optional[Path] = None) -> Optional[_Manifest]:
+    """按 mtime 缓存的 manifest（当天重跑会换目录，mtime 随之变化）。"""
+    root = root or ROOT
+    path = root / day / MANIFEST
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    key = str(path)
+    m = _MANIFESTS.get(key)
+    if m is None or m.mtime_ns != mtime_ns:
+        m = _Manifest(mtime_ns, path.read_bytes())
+        _MANIFESTS[key] = m
+    return m
+
+
+def lookup(day: str, rel: str, root: Optional[Path] = None):
+    """manifest 里登记过的文件 → (绝对路径, 条目)；未登记（含 ../ 之类）→ None。"""
+    root = root or ROOT
+    m = manifest(day, root)
+    if m is None:
+        return None
+    entry = m.files.get(rel)
+    if entry is None:
+        return None
+    return root / day / entry["path"], entry
+
+
+def file_etag(entry: dict) -> str:
+    return _etag(entry["sha256"])
@@ -26,6 +26,13 @@ async def get_db_pool():
         except Exception: pass
     return _pool or _DummyPool()
 
+async def require_db_pool():
+    """同 get_db_pool，但连不上时抛出（调用方要区分“没有数据”和“库不可用”时用）。"""
+    pool = await get_db_pool()
+    if isinstance(pool, _DummyPool):
+        raise ConnectionError("database pool unavailable")
+    return pool
+
 class _AcquireCtx:
     async def __aenter__(self): return _DummyConn()
     async def __aexit__(self, exc_type, exc, tb): return False
@@ -0,0 +1,343 @@
+# app/services/freshness.py —— 进程内数据新鲜度跟踪（替代 scripts/freshness_p95.py 的外部轮询）
+"""
+每次数据落地（覆盖文件写入、派生文件重载、DB 读取到新快照）调用 mark(port, ts, source)，
+记录“该港口最新一条数据的时间”。滞后 = now - 最新数据时间。
+
+- 当前分位：对所有已跟踪港口的滞后直接精确计算（港口数是百级）
+- 滚动分位：每 SAMPLE_SECONDS 把全部港口的滞后喂给一个对数分桶的流式分位草图
+  （DDSketch 思路，相对误差 ≤ SKETCH_ALPHA），按 SLOT_SECONDS 轮转，保留 SLOTS 个槽
+
+多进程（--workers N）与外部作业：
+- 变更日志（app/services/changes.py）：/v1/meta/* 请求时（至多每 SAMPLE_SECONDS 一次）从上次的 seq 往后读，
+  脚本 / 作业 / DB 触发器的入库不用等 worker 重读数据就能看到；首次先按 (港口, 层) 取最新一行
+- 各 worker 自己观察到的点（as_of 比变更日志的“日期”更细）写到 METRICS_MULTIPROC_DIR/freshness_<pid>.json，
+  快照时合并全部文件（取最大值、草图相加）：哪个 worker 回答都是同一份结果。未配置目录时只有本进程视图
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SLO_P95_HOURS = float(os.getenv("FRESHNESS_SLO_P95_HOURS", "2"))
+SAMPLE_SECONDS = float(os.getenv("FRESHNESS_SAMPLE_SECONDS", "60"))
+SLOT_SECONDS = float(os.getenv("FRESHNESS_SLOT_SECONDS", "300"))
+SLOTS = int(os.getenv("FRESHNESS_SLOTS", "12"))  # 默认滚动 1h
+SKETCH_ALPHA = 0.01
+
+SHARE_DIR = os.getenv("METRICS_MULTIPROC_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR") or ""
+CHANGES_PAGE = 1000
+
+OVERRIDES_DIR = Path(os.getenv("INGEST_DATA_DIR", "data/overrides"))
+DERIVED_TREND_DIR = Path("data/derived/trend")
+
+
+def parse_ts(value) -> Optional[datetime]:
+    """ISO 时间 / 日期 → aware datetime；仅日期时取当天 12:00Z（与 freshness_p95.py 一致）。"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, 12, tzinfo=timezone.utc)
+    s = str(value).strip()
+    try:
+        dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    except Exception:
+        pass
+    try:
+        return parse_ts(date.fromisoformat(s))
+    except Exception:
+        return None
+
+
+def point_ts(point: dict) -> Optional[datetime]:
+    return parse_ts(point.get("as_of") or point.get("date"))
+
+
+# --------------------------------------------------------------------
+# Streaming quantile sketch
+# --------------------------------------------------------------------
+class QuantileSketch:
+    """对数分桶草图：插入 O(1)、可合并、分位相对误差 ≤ alpha。"""
+
+    __slots__ = ("_gamma_log", "bins", "zeros", "count")
+
+    def __init__(self, alpha: float = SKETCH_ALPHA):
+        self._gamma_log = math.log((1 + alpha) / (1 - alpha))
+        self.bins: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        if x <= 1e-9:
+            self.zeros += 1
+            return
+        k = math.ceil(math.log(x) / self._gamma_log)
+        self.bins[k] = self.bins.get(k, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        self.count += other.count
+        self.zeros += other.zeros
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                # 桶 (γ^(k-1), γ^k] 的中点估计
+                return 2 * math.exp(k * self._gamma_log) / (1 + math.exp(self._gamma_log))
+        return None
+
+
+def _exact_quantile(xs: List[float], q: float) -> Optional[float]:
+    if not xs:
+        return None
+    xs = sorted(xs)
+    p = (len(xs) - 1) * q
+    i, f = int(p), p - int(p)
+    return xs[i] if f == 0 else xs[i] * (1 - f) + xs[min(i + 1, len(xs) - 1)] * f
+
+
+# --------------------------------------------------------------------
+# Tracker
+# --------------------------------------------------------------------
+class FreshnessTracker:
+    def __init__(self, share_dir: str = SHARE_DIR):
+        self.last: Dict[str, Tuple[datetime, str]] = {}
+        self.ingested_at: Dict[str, datetime] = {}  # source -> 最近一次落地时间
+        self._slots: List[Tuple[int, QuantileSketch]] = []
+        self._next_sample = 0.0
+        self.share_dir = share_dir
+        self.share_name = f"freshness_{os.getpid()}.json"
+        self._dirty = False
+        self._seq: Optional[int] = None  # 变更日志读到哪了（None = 还没初始化）
+        self._next_sync = 0.0
+
+    def mark(self, port: str, ts, source: str, ingested_at: Optional[datetime] = None) -> None:
+        self._record(port, ts, source, ingested_at)
+        self.maybe_sample()
+
+    def _record(self, port: str, ts, source: str, ingested_at: Optional[datetime]) -> None:
+        dt = parse_ts(ts)
+        if dt is None:
+            return
+        port = port.upper()
+        cur = self.last.get(port)
+        if cur is None or dt > cur[0]:
+            self.last[port] = (dt, source)
+            self._dirty = True
+        ing = ingested_at or datetime.now(timezone.utc)
+        prev = self.ingested_at.get(source)
+        if prev is None or ing > prev:
+            self.ingested_at[source] = ing
+            self._dirty = True
+
+    def lags_hours(self, now: Optional[datetime] = None, last: Optional[dict] = None) -> Dict[str, float]:
+        now = now or datetime.now(timezone.utc)
+        last = self.last if last is None else last
+        return {p: max(0.0, (now - ts).total_seconds() / 3600.0) for p, (ts, _) in last.items()}
+
+    def maybe_sample(self, force: bool = False) -> None:
+        mono = time.monotonic()
+        if not force and mono < self._next_sample:
+            return
+        self._next_sample = mono + SAMPLE_SECONDS
+        slot_id = int(time.time() // SLOT_SECONDS)
+        if not self._slots or self._slots[-1][0] != slot_id:
+            self._slots.append((slot_id, QuantileSketch()))
+            self._slots = [s for s in self._slots if s[0] > slot_id - SLOTS]
+        sketch = self._slots[-1][1]
+        for lag in self.lags_hours().values():
+            sketch.add(lag)
+        self._dirty = True
+        self.share()  # 其他 worker 至多晚 SAMPLE_SECONDS 看到本进程的观察
+
+    def rolling(self, slots: Optional[List[Tuple[int, QuantileSketch]]] = None) -> QuantileSketch:
+        merged = QuantileSketch()
+        floor = int(time.time() // SLOT_SECONDS) - SLOTS
+        for slot_id, sk in (self._slots if slots is None else slots):
+            if slot_id > floor:
+                merged.merge(sk)
+        return merged
+
+    # ----------------------------------------------------------------
+    # 跨 worker：状态文件
+    # ----------------------------------------------------------------
+    def _state(self) -> dict:
+        return {
+            "last": {p: [ts.isoformat(), src] for p, (ts, src) in self.last.items()},
+            "ingested": {src: ts.isoformat() for src, ts in self.ingested_at.items()},
+            "slots": [[sid, sk.zeros, sk.count, sk.bins] for sid, sk in self._slots],
+        }
+
+    def share(self) -> None:
+        """本进程状态写到共享目录（有变化才写，原子替换）；永不抛错。"""
+        if not self.share_dir or not self._dirty:
+            return
+        try:
+            d = Path(self.share_dir)
+            d.mkdir(parents=True, exist_ok=True)
+            tmp = d / f".{self.share_name}.tmp"
+            tmp.write_text(json.dumps(self._state(), separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, d / self.share_name)
+            self._dirty = False
+        except Exception:
+            pass
+
+    def merged(self) -> Tuple[dict, dict, List[Tuple[int, QuantileSketch]]]:
+        """全部 worker 的 (last, ingested_at, slots)；未配置共享目录时就是本进程的。"""
+        if not self.share_dir:
+            return self.last, self.ingested_at, self._slots
+        self.share()
+        last: Dict[str, Tuple[datetime, str]] = dict(self.last)
+        ingested: Dict[str, datetime] = dict(self.ingested_at)
+        sketches: Dict[int, QuantileSketch] = {}
+        for fp in Path(self.share_dir).glob("freshness_*.json"):
+            try:
+                st = json.loads(fp.read_text(encoding="utf-8"))
+            except Exception:
+                continue
+            for p, (ts, src) in (st.get("last") or {}).items():
+                dt = parse_ts(ts)
+                if dt is not None and (p not in last or dt > last[p][0]):
+                    last[p] = (dt, src)
+            for src, ts in (st.get("ingested") or {}).items():
+                dt = parse_ts(ts)
+                if dt is not None and (src not in ingested or dt > ingested[src]):
+                    ingested[src] = dt
+            for sid, zeros, count, bins in st.get("slots") or ():
+                sk = sketches.setdefault(int(sid), QuantileSketch())
+                sk.zeros += zeros
+                sk.count += count
+                for k, c in bins.items():
+                    sk.bins[int(k)] = sk.bins.get(int(k), 0) + c
+        if not sketches:  # 本进程的文件还没写出去（例如没有变化）
+            return last, ingested, self._slots
+        return last, ingested, sorted(sketches.items())
+
+    # ----------------------------------------------------------------
+    # 外部入库：变更日志
+    # ----------------------------------------------------------------
+    async def sync_changes(self, force: bool = False) -> int:
+        """从变更日志补上本进程没看到的入库（脚本 / 作业 / 其他 worker / DB 触发器）；返回处理的行数。"""
+        mono = time.monotonic()
+        if not force and mono < self._next_sync:
+            return 0
+        self._next_sync = mono + SAMPLE_SECONDS
+        from app.services import changes
+        store = changes.get_store()
+        n = 0
+        try:
+            if self._seq is None:
+                seq, heads = await store.heads()
+                for r in heads:
+                    self._record_change(r)
+                self._seq, n = seq, len(heads)
+            while True:
+                rows = await store.since(self._seq, CHANGES_PAGE)
+                for r in rows:
+                    self._record_change(r)
+                    self._seq = r["seq"]
+                n += len(rows)
+                if len(rows) < CHANGES_PAGE:
+                    break
+        except Exception:
+            return n
+        if n:
+            self.maybe_sample(force=True)
+        return n
+
+    def _record_change(self, row: dict) -> None:
+        # 变更日志只有日期（按 parse_ts 的口径解析）；changed_at 即落地时间
+        self._record(row["unlocode"], row["date"], row.get("origin") or "db", parse_ts(row.get("changed_at")))
+
+    def snapshot(self, now: Optional[datetime] = None) -> dict:
+        now = now or datetime.now(timezone.utc)
+        self.maybe_sample()
+        last, _, slots = self.merged()
+        lags = self.lags_hours(now, last)
+        ports = [
+            {
+                "unlocode": p,
+                "last_data_at": last[p][0].isoformat(),
+                "source": last[p][1],
+                "lag_hours": round(lag, 3),
+            }
+            for p, lag in sorted(lags.items())
+        ]
+        vals = list(lags.values())
+        sk = self.rolling(slots)
+
+        def _r(v):
+            return None if v is None else round(v, 3)
+
+        current = {f"p{int(q * 100)}": _r(_exact_quantile(vals, q)) for q in (0.5, 0.95, 0.99)}
+        rolling = {f"p{int(q * 100)}": _r(sk.quantile(q)) for q in (0.5, 0.95, 0.99)}
+        p95 = current["p95"]
+        return {
+            "as_of": now.isoformat(),
+            "unit": "hours",
+            "ports_tracked": len(ports),
+            "current": current,
+            "rolling": {"window_seconds": int(SLOT_SECONDS * SLOTS), "samples": sk.count, **rolling},
+            "slo": {"p95_hours_max": SLO_P95_HOURS, "ok": p95 is not None and p95 <= SLO_P95_HOURS},
+            "ports": ports,
+        }
+
+    def last_ingest_by_source(self) -> Dict[str, str]:
+        _, ingested, _ = self.merged()
+        return {src: ts.isoformat() for src, ts in sorted(ingested.items())}
+
+    # ----------------------------------------------------------------
+    def bootstrap(self) -> int:
+        """启动时从已落盘的覆盖/派生文件恢复每港口最新数据时间。"""
+        n = 0
+        for source, files in (
+            ("derived", DERIVED_TREND_DIR.glob("*.json")),
+            ("override", OVERRIDES_DIR.glob("*/trend.json")),
+        ):
+            for fp in files:
+                try:
+                    obj = json.loads(fp.read_text(encoding="utf-8")) or {}
+                    pts = obj.get("points") or []
+                    port = obj.get("unlocode") or (fp.parent.name if source == "override" else fp.stem)
+                    if not pts or not port:
+                        continue
+                    mtime = datetime.fromtimestamp(fp.stat().st_mtime, tz=timezone.utc)
+                    self._record(port, point_ts(pts[-1]), source, mtime)
+                    n += 1
+                except Exception:
+                    continue
+        self.maybe_sample(force=True)
+        return n
+
+
+TRACKER = FreshnessTracker()
+
+
+def mark(port: str, ts, source: str, ingested_at: Optional[datetime] = None) -> None:
+    """ingest 钩子：永不抛错，不影响主流程。"""
+    try:
+        TRACKER.mark(port, ts, source, ingested_at)
+    except Exception:
+        pass
+
+
+def mark_points(port: str, points: List[dict], source: str,
+                ingested_at: Optional[datetime] = None) -> None:
+    if points:
+        mark(port, point_ts(points[-1]), source, ingested_at)
@@ -1,13 +1,15 @@
 # app/services/ingesters.py
 from __future__ import annotations
 
-import os, json
+import os, json, time
 from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 from typing import Dict, List
 
 import httpx
 
+from app.services import changes, freshness, metrics
+
 # --------------------------------------------------------------------
 # Config
 # --------------------------------------------------------------------
@@ -38,10 +40,16 @@ async def _seed_from_public(port: str) -> Dict:
     """Pull /trend?window=WINDOW from public API to bootstrap overlay."""
     url = f"{PUBLIC_API_BASE}/v1/ports/{port}/trend?window={WINDOW}&format=json"
     headers = {"X-API-Key": SEED_KEY} if SEED_KEY else {}
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.get(url, headers=headers)
-        r.raise_for_status()
-        return r.json()
+    t0 = time.perf_counter()
+    status = "error"
+    try:
+        async with httpx.AsyncClient(timeout=20) as client:
+            r = await client.get(url, headers=headers)
+            status = str(r.status_code)
+            r.raise_for_status()
+            return r.json()
+    finally:
+        metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - t0, "public_api_trend", status)
 
 
 def _normalize(points: List[Dict]) -> List[Dict]:
@@ -106,5 +114,11 @@ async def ingest_port_day(port: str, day: date) -> Dict:
     # 3) 规范化并保存
     obj["points"] = _normalize(obj["points"])
     _save_json(path, obj)
+    freshness.mark_points(port, obj["points"], "override")
+    try:
+        # 变更日志（/v1/ports/changes）；写失败不影响入库，摘要未更新、下次入库会补记
+        await changes.record("trend", port, obj["points"], origin="override")
+    except Exception:
+        pass
 
     return {"port": port, "day": day_s, "points": len(obj["points"]), "file": str(path)}
\ No newline at end of file
@@ -0,0 +1,218 @@
+# app/services/invalidation.py —— 跨 worker 缓存失效总线：入库事件 → 各 worker 精确驱逐受影响的 key
+"""
+--workers N 时每个 worker 各有一份 PortDataRepository 缓存。文件类后端靠 mtime 版本号自己能发现变化，
+DB 没有廉价版本号，只能等 TTL：回填之后各 worker 还会按各自的节奏继续回旧数据。
+
+事件 = (port, dataset, version)，由变更日志（app/services/changes.py）在每次真有数据变化的写入后发出：
+
+- 配置了 DATABASE_URL：port_changes 上的语句级触发器 pg_notify（migrations/20261019_port_data_invalidate.sql），
+  覆盖 DB 入库触发器和 PostgresChangeLog.record 两条写入路径；每个 worker 用一条独立连接 LISTEN
+- 否则：SqliteChangeLog 提交后追加到本地日志文件（INVALIDATION_JOURNAL，一行一个 JSON），
+  各 worker 每 INVALIDATION_POLL 秒从上次读到的位置往后读；脚本/作业进程写、API worker 读都可以
+
+收到事件 → repo.invalidate(port, dataset)：只让这个港口这个数据集的各层条目失效（留作 stale-if-error 后备；
+失效时正在进行的回源结果也不会进缓存）。
+可能漏事件的时刻（LISTEN 连接断开重连、日志文件被轮转/截断）一律整库失效（resync），宁可多回源一次。
+总线在跑时 PORT_DATA_CACHE_TTL 可以调长（DB 数据的新鲜度不再靠 TTL）。
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.services import metrics
+
+CHANNEL = "port_data_invalidate"
+JOURNAL = Path(os.getenv("INVALIDATION_JOURNAL", "data/invalidation.log"))
+POLL_SECONDS = float(os.getenv("INVALIDATION_POLL", "0.5"))
+JOURNAL_MAX_BYTES = 1 << 20  # 超过后轮转：读者看到 inode 变了就 resync
+RECONNECT_SECONDS = 5.0
+
+EVENTS = metrics.register(metrics.Counter(
+    "portpulse_invalidation_events", "Cache invalidation events applied by this worker", ("bus",),
+))
+RESYNCS = metrics.register(metrics.Counter(
+    "portpulse_invalidation_resyncs", "Full cache flushes after the bus may have missed events", ("bus",),
+))
+
+Event = Tuple[str, str, int]  # (PORT, dataset, version)
+
+
+def enabled() -> bool:
+    return os.getenv("DISABLE_INVALIDATION_BUS", "").strip().lower() not in ("1", "true", "yes", "on")
+
+
+def _encode(port: str, dataset: str, version: int) -> str:
+    return json.dumps({"port": port, "dataset": dataset, "version": int(version)}, separators=(",", ":"))
+
+
+def _decode(line: str) -> Optional[Event]:
+    try:
+        ev = json.loads(line)
+        return str(ev["port"]).upper(), str(ev["dataset"]), int(ev.get("version") or 0)
+    except Exception:
+        return None
+
+
+# --------------------------------------------------------------------
+# 发布（文件日志；Postgres 由触发器发布）
+# --------------------------------------------------------------------
+def publish_journal(events: Iterable[Event], path: Optional[Path] = None) -> None:
+    """追加到本地日志（单次 O_APPEND write：多个写入方并发也不会交错）。"""
+    lines = "".join(_encode(*ev) + "\n" for ev in events)
+    if not lines:
+        return
+    path = path or JOURNAL
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if path.stat().st_size > JOURNAL_MAX_BYTES:
+            os.replace(path, path.with_name(path.name + ".1"))
+    except OSError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, lines.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+# --------------------------------------------------------------------
+# 订阅
+# --------------------------------------------------------------------
+class _Applier:
+    """把事件落到仓库上；同一 (port, dataset) 只处理更新的 version（PG 通知与重放可能重复）。"""
+
+    def __init__(self, repo, bus: str):
+        self.repo, self.bus = repo, bus
+        self._seen: Dict[Tuple[str, str], int] = {}
+
+    def apply(self, ev: Optional[Event]) -> None:
+        if ev is None:
+            return
+        port, dataset, version = ev
+        if version and version <= self._seen.get((port, dataset), 0):
+            return
+        self._seen[(port, dataset)] = version
+        self.repo.invalidate(port, dataset)
+        EVENTS.inc(self.bus)
+
+    def resync(self) -> None:
+        self.repo.invalidate()
+        self._seen.clear()
+        RESYNCS.inc(self.bus)
+
+
+class JournalTail:
+    """从日志文件末尾开始跟读（启动时缓存本来就是空的，不需要重放历史）。
+
+    一直持有当前文件的句柄：旧文件被轮转/删除后 inode 不会被新文件复用，比较 inode 即可发现。
+    """
+
+    def __init__(self, path: Path, applier: _Applier):
+        self.path, self.applier = path, applier
+        self._fh = None
+        self._partial = b""
+        try:
+            self._fh = open(path, "rb")
+            self._fh.seek(0, os.SEEK_END)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def poll(self) -> int:
+        """读新追加的完整行并应用；返回处理的行数。"""
+        try:
+            st = self.path.stat()
+        except OSError:
+            return 0
+        fh = self._fh
+        if fh is None or os.fstat(fh.fileno()).st_ino != st.st_ino or st.st_size < fh.tell():
+            # 轮转 / 截断：中间的事件可能看不到了
+            if fh is not None:
+                fh.close()
+                self.applier.resync()
+            self._fh, self._partial = open(self.path, "rb"), b""
+        chunk = self._fh.read()
+        if not chunk:
+            return 0
+        *lines, self._partial = (self._partial + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                self.applier.apply(_decode(line.decode("utf-8", "replace")))
+        return len(lines)
+
+    async def run(self) -> None:
+        try:
+            while True:
+                try:
+                    self.poll()
+                except Exception:
+                    pass
+                await asyncio.sleep(POLL_SECONDS)
+        finally:
+            self.close()
+
+
+async def _listen_pg(dsn: str, applier: _Applier) -> None:
+    """独立连接 LISTEN（池里的连接会被归还复用，不能挂监听）；断开 → resync 后重连。"""
+    import asyncpg
+
+    def _on_notify(_conn, _pid, _channel, payload):
+        applier.apply(_decode(payload))
+
+    first = True
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            await conn.add_listener(CHANNEL, _on_notify)
+            if not first:
+                applier.resync()  # 断开期间的通知已经丢了
+            first = False
+            while True:
+                await asyncio.sleep(RECONNECT_SECONDS)
+                await conn.execute("SELECT 1")  # 半开的 TCP 连接不会自己报错
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            first = False
+        finally:
+            if conn is not None and not conn.is_closed():
+                try:
+                    await conn.close()
+                except Exception:
+                    pass
+        await asyncio.sleep(RECONNECT_SECONDS)
+
+
+def start(repo) -> Optional[asyncio.Task]:
+    """应用启动时调用：DATABASE_URL → LISTEN，否则跟读本地日志；返回后台 Task（关闭时 cancel）。"""
+    if not enabled():
+        return None
+    dsn = os.getenv("DATABASE_URL") or os.getenv("DB_DSN")
+    if dsn:
+        try:
+            import asyncpg  # noqa: F401
+        except Exception:
+            dsn = None
+    if dsn:
+        return asyncio.ensure_future(_listen_pg(dsn, _Applier(repo, "pg")))
+    return asyncio.ensure_future(JournalTail(JOURNAL, _Applier(repo, "journal")).run())
+
+
+async def stop(task: Optional[asyncio.Task]) -> None:
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+
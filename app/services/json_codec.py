@@ -0,0 +1,75 @@
+# app/services/json_codec.py —— 全站 JSON 编码：orjson 快路径 + 排序键（稳定 ETag）+ 标准库兜底
+"""
+FastAPI 默认路径：路由返回 dict → jsonable_encoder 递归重建一遍 → json.dumps。
+365 天的 trend 有上千个字段，重建本身比序列化还贵。这里统一为：
+
+- dumps(obj) -> bytes    orjson（OPT_SORT_KEYS）；未安装时退回 json.dumps(sort_keys=True)，
+                          紧凑分隔符 + ensure_ascii=False，两条路径对常见数据字节一致
+- FastJSONResponse        create_app() 的 default_response_class；路由直接 `return json_response(payload)`
+                          可以完全跳过 jsonable_encoder（缓存里的点列表、dataclass 原样交给编码器）
+- 原生支持：dict/list/str/数字/None、date/datetime（isoformat）；
+  dataclass（按字段名排序）、Decimal、pydantic 模型、set 等走 _default
+
+ETag 一律对 dumps() 的输出取摘要：键序固定，同一数据同一字节。
+"""
+from __future__ import annotations
+
+import dataclasses
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+from starlette.responses import JSONResponse
+
+try:  # 可选：pip install orjson（requirements.txt 已列出）
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover
+    orjson = None
+
+# dataclass 交给 _default 转成 dict：orjson 原生输出按字段声明顺序，OPT_SORT_KEYS 管不到
+_ORJSON_OPTS = (
+    orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS
+) if orjson is not None else 0
+
+
+def _default(obj: Any):
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}  # 浅转换，嵌套交回编码器
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):  # pydantic v2
+        return obj.model_dump(mode="json")
+    if hasattr(obj, "dict"):  # pydantic v1
+        return obj.dict()
+    # 仅标准库路径会走到这里（orjson 原生处理）
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """排序键、紧凑、UTF-8。"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTS)
+    return json.dumps(
+        obj, default=_default, sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[dict] = None) -> FastJSONResponse:
+    """路由直接返回它可跳过 FastAPI 的 jsonable_encoder。"""
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
@@ -0,0 +1,234 @@
+# app/services/metrics.py —— 轻量 Prometheus 指标（无第三方依赖）
+"""
+进程内计数器/直方图/仪表 + Prometheus 文本格式输出。
+
+- 热路径只做 dict 查找与整数自增（单事件循环 + GIL，无需加锁）
+- 多 worker（uvicorn --workers N）：设置 METRICS_MULTIPROC_DIR 后，每个进程每隔
+  METRICS_FLUSH_SECONDS 把自身快照写到 <dir>/metrics_<pid>.json；/metrics 抓取时合并全部文件。
+  与 prometheus_client 的 multiprocess 模式一样，部署前应清空该目录。
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR") or ""
+FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+# 含 0.3s 边界，便于直接读出 SLA（p95 ≤ 300ms）达标比例
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        v = self.values
+        v[labels] = v.get(labels, 0.0) + amount
+
+    def dump(self) -> dict:
+        return {"|".join(k): v for k, v in self.values.items()}
+
+    def samples(self, state: Dict[LabelValues, float]) -> Iterable[Tuple[str, LabelValues, float]]:
+        for k, v in sorted(state.items()):
+            yield self.name + "_total", k, v
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(buckets)
+        # label -> [count_per_bucket..., +Inf 桶, sum]
+        self.values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        row = self.values.get(labels)
+        if row is None:
+            row = self.values[labels] = [0.0] * (len(self.buckets) + 2)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def dump(self) -> dict:
+        return {"|".join(k): v for k, v in self.values.items()}
+
+    def samples(self, state: Dict[LabelValues, List[float]]) -> Iterable[Tuple[str, LabelValues, float]]:
+        for k, row in sorted(state.items()):
+            acc = 0.0
+            for i, le in enumerate(self.buckets + (float("inf"),)):
+                acc += row[i]
+                yield self.name + "_bucket", k + (_fmt_le(le),), acc
+            yield self.name + "_count", k, acc
+            yield self.name + "_sum", k, row[-1]
+
+
+class Gauge:
+    """当前值（排队深度、并发上限…）；多 worker 合并时求和 = 全实例合计。"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = float(value)
+
+    def dump(self) -> dict:
+        return {"|".join(k): v for k, v in self.values.items()}
+
+    def samples(self, state: Dict[LabelValues, float]) -> Iterable[Tuple[str, LabelValues, float]]:
+        for k, v in sorted(state.items()):
+            yield self.name, k, v
+
+
+def _fmt_le(le: float) -> str:
+    return "+Inf" if le == float("inf") else repr(le)
+
+
+# --------------------------------------------------------------------
+# Registry
+# --------------------------------------------------------------------
+REQUESTS = Counter(
+    "portpulse_http_requests", "HTTP requests by route template",
+    ("method", "route", "status", "format"),
+)
+LATENCY = Histogram(
+    "portpulse_http_request_duration_seconds", "HTTP request latency (seconds)",
+    ("method", "route", "status", "format"),
+)
+CACHE = Counter(
+    "portpulse_cache_requests", "Cache lookups by cache name and result (hit/miss)",
+    ("cache", "result"),
+)
+DB_POOL_WAIT = Histogram(
+    "portpulse_db_pool_wait_seconds", "Time spent waiting for a DB pool connection",
+)
+RATE_LIMITED = Counter(
+    "portpulse_rate_limited", "Requests rejected by the rate limiter (429)",
+)
+UPSTREAM_LATENCY = Histogram(
+    "portpulse_upstream_request_duration_seconds", "Upstream fetch latency (seconds)",
+    ("upstream", "status"),
+)
+
+REGISTRY: List = [REQUESTS, LATENCY, CACHE, DB_POOL_WAIT, RATE_LIMITED, UPSTREAM_LATENCY]
+
+
+def register(metric):
+    """其他模块追加自定义指标（重复注册同名指标时返回已有对象）。"""
+    for m in REGISTRY:
+        if m.name == metric.name:
+            return m
+    REGISTRY.append(metric)
+    return metric
+
+
+# 访问日志（app/services/access_log.py）按请求放一个 dict：各层缓存的命中结果顺手记进去。
+# 放的是可变对象，下游（包括 BaseHTTPMiddleware 起的子任务）写入后上游也看得到
+REQUEST_CACHE: ContextVar[Optional[dict]] = ContextVar("portpulse_request_cache", default=None)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    result = "hit" if hit else "miss"
+    CACHE.inc(cache, result)
+    seen = REQUEST_CACHE.get()
+    if seen is not None and seen.get(cache) != "miss":  # 同一请求查了多次：有一次回源就算 miss
+        seen[cache] = result
+
+
+# --------------------------------------------------------------------
+# Multiprocess snapshot
+# --------------------------------------------------------------------
+_next_flush = 0.0
+
+
+def _snapshot() -> dict:
+    return {m.name: m.dump() for m in REGISTRY}
+
+
+def flush(force: bool = False) -> None:
+    """把本进程快照写入 MULTIPROC_DIR（原子替换）；未配置目录时为 no-op。"""
+    global _next_flush
+    if not MULTIPROC_DIR:
+        return
+    now = time.monotonic()
+    if not force and now < _next_flush:
+        return
+    _next_flush = now + FLUSH_SECONDS
+    try:
+        d = Path(MULTIPROC_DIR)
+        d.mkdir(parents=True, exist_ok=True)
+        tmp = d / f".metrics_{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(_snapshot(), separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, d / f"metrics_{os.getpid()}.json")
+    except Exception:
+        # 指标永不影响主流程
+        pass
+
+
+def _merge(acc: dict, snap: dict) -> None:
+    for name, series in snap.items():
+        dst = acc.setdefault(name, {})
+        for k, v in series.items():
+            if isinstance(v, list):
+                cur = dst.get(k)
+                dst[k] = list(v) if cur is None else [a + b for a, b in zip(cur, v)]
+            else:
+                dst[k] = dst.get(k, 0.0) + v
+
+
+def collect() -> dict:
+    """合并所有进程（含本进程最新状态）的快照。"""
+    acc: dict = {}
+    if MULTIPROC_DIR:
+        flush(force=True)
+        for fp in Path(MULTIPROC_DIR).glob("metrics_*.json"):
+            try:
+                _merge(acc, json.loads(fp.read_text(encoding="utf-8")))
+            except Exception:
+                continue
+    else:
+        _merge(acc, _snapshot())
+    return acc
+
+
+def _fmt_value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(state: Optional[dict] = None) -> str:
+    """Prometheus text exposition format 0.0.4。"""
+    state = collect() if state is None else state
+    out: List[str] = []
+    for m in REGISTRY:
+        series = {tuple(k.split("|")) if k else (): v for k, v in state.get(m.name, {}).items()}
+        out.append(f"# HELP {m.name} {m.doc}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        for sample, labels, value in m.samples(series):
+            names = m.labels + (("le",) if sample.endswith("_bucket") else ())
+            if names:
+                lbl = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, labels))
+                out.append(f"{sample}{{{lbl}}} {_fmt_value(value)}")
+            else:
+                out.append(f"{sample} {_fmt_value(value)}")
+    return "\n".join(out) + "\n"
@@ -1,10 +1,14 @@
 # app/services/overrides.py
 from __future__ import annotations
 import os, json
-from datetime import date, timedelta
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from app.services import freshness
+from app.services.port_data import sort_points, window as _window
+from app.services.profiling import span
+
 # 兼容环境变量；未设置时使用项目内默认目录
 DATA_DIR = Path(os.getenv("INGEST_DATA_DIR", "data/overrides"))
 
@@ -12,14 +16,15 @@ def _safe_load_json(path: Path) -> Optional[dict]:
     if not path.exists():
         return None
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        with span("file_io"):
+            return json.loads(path.read_text(encoding="utf-8"))
     except Exception:
         return None
 
 def _sort_points(points: List[Dict]) -> List[Dict]:
-    # 保障按日期升序
+    # 保障按日期升序（已有序时不重排）
     try:
-        return sorted(points, key=lambda p: p.get("date", ""))
+        return sort_points(points)
     except Exception:
         return points
 
@@ -31,16 +36,11 @@ def apply_window(points: List[Dict], window: Optional[int]) -> List[Dict]:
     if not points or not window or window <= 0:
         return points
     pts = _sort_points(points)
-    try:
-        last_day = date.fromisoformat(pts[-1]["date"])  # may raise
-        start = last_day - timedelta(days=window - 1)
-        res = [p for p in pts if "date" in p and date.fromisoformat(p["date"]) >= start]
-        # Defensive cap: if override file wasn't trimmed, keep only tail window items
-        if len(res) > window * 2:
-            res = res[-window:]
-        return res
-    except Exception:
-        return pts[-window:]
+    res = _window(pts, window)
+    # Defensive cap: if override file wasn't trimmed, keep only tail window items
+    if len(res) > window * 2:
+        res = res[-window:]
+    return res
 
 def load_trend_override(port: str, window: Optional[int] = None) -> Optional[Dict]:
     """
@@ -54,6 +54,9 @@ def load_trend_override(port: str, window: Optional[int] = None) -> Optional[Dic
 
     pts: List[Dict] = obj.get("points", []) or []
     pts = _sort_points(pts)
+    # 其他 worker 写入的覆盖文件也能反映到本进程的新鲜度
+    freshness.mark_points(port, pts, "override",
+                          ingested_at=datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc))
 
     pts = apply_window(pts, window)
 
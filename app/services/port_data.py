@@ -0,0 +1,850 @@
+# app/services/port_data.py —— 港口数据统一入口：多后端分层合并 + 进程内读穿缓存 + 统一窗口/投影/CSV
+"""
+原先四条路径各自取数、各自截窗口、各自拼 CSV：ports.py（demo）、ports_trio.py（派生文件）、
+services/overrides.py（覆盖文件）、ports_extra.py（SQL）。现在统一为：
+
+    PortDataRepository
+      ├─ OverrideBackend   data/overrides/{PORT}/trend.json   （nowcast 覆盖）
+      ├─ PostgresBackend   port_snapshots / port_dwell        （未配置 DATABASE_URL 时跳过）
+      ├─ DerivedBackend    data/derived/{trend,dwell}/{PORT}.json
+      └─ DemoBackend       稳定可复现的合成序列（兜底，永远有数）
+
+- 合并：两层。基础层按 PORT_DATA_BACKENDS 顺序（默认 db,derived,demo）取第一个非空序列；
+  覆盖层（override，overlay=True）按日期逐点叠加到基础层之上（merge_points，O(n+m) 归并），
+  只覆盖 nowcast 那几天，其余天仍是 DB/派生数据；每个点的 src 标明来源
+- 缓存：按 (kind, port, tz) 缓存**全量**序列（最多 MAX_DAYS 天，升序），窗口/投影都在缓存之后做；
+  命中时用各后端的廉价版本号（文件 mtime / 当天日期）校验，PORT_DATA_CACHE_TTL 兜底（DB 没有版本号）。
+  两层各自缓存：覆盖文件变了只重做归并，不重查 DB
+- 过期（RFC 5861 语义）：PORT_DATA_CACHE_TTL 是软期限，过了之后 PORT_DATA_SWR 秒内先回旧值、后台刷新
+  （stale-while-revalidate，延迟不随回源抖动）；回源失败（DB 断连 / 超时 / 文件写了一半）时，
+  上一次的好数据继续服务到 PORT_DATA_STALE_TTL（stale-if-error，硬期限，从取数时刻算），
+  而不是悄悄退到 demo / 空序列。回旧值的响应带 Warning / X-Data-Stale（见 Validator.headers）
+- 缓存里的点是共享的：调用方只读，需要改字段请先 project()
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import bisect
+import csv
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import date, datetime, timedelta, timezone
+from hashlib import blake2b, sha256
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services import columnar, freshness, json_codec, metrics, tiers
+from app.services.singleflight import SingleFlight
+from app.services.profiling import span
+
+MAX_DAYS = 365
+CACHE_TTL = float(os.getenv("PORT_DATA_CACHE_TTL", "60"))
+CACHE_SIZE = int(os.getenv("PORT_DATA_CACHE_SIZE", "2048"))
+LOAD_TIMEOUT = float(os.getenv("PORT_DATA_LOAD_TIMEOUT", "10"))
+SWR_SECONDS = int(os.getenv("PORT_DATA_SWR", "60"))
+STALE_TTL = int(os.getenv("PORT_DATA_STALE_TTL", "3600"))
+ERROR_RETRY = 5.0  # 回源失败后多久再试（回旧值期间每 key 至多这个频率打后端）
+BACKEND_ORDER = [b.strip() for b in os.getenv("PORT_DATA_BACKENDS", "override,db,derived,demo").split(",") if b.strip()]
+
+DERIVED_DIR = Path("data/derived")
+
+TREND_FIELDS = ("vessels", "avg_wait_hours", "congestion_score")
+DWELL_FIELDS = ("dwell_hours",)
+
+# 数据端点的 HTTP 缓存策略：下游（CDN / 浏览器）也按同样的窗口回旧值
+CACHE_CONTROL = f"public, max-age=300, stale-while-revalidate={SWR_SECONDS}, stale-if-error={STALE_TTL}, no-transform"
+CACHE_CONTROL_STALE = "public, max-age=0, no-transform"  # 本身已是旧值：下游不要再缓存
+
+BACKEND_ERRORS = metrics.register(metrics.Counter(
+    "portpulse_port_data_backend_errors", "Port data backend load failures", ("backend",),
+))
+STALE_SERVED = metrics.register(metrics.Counter(
+    "portpulse_port_data_stale_served", "Responses served from stale cache entries", ("reason",),
+))
+
+# -----------------------------
+# SQL（scripts/db_bench.py 直接复用这些语句做 EXPLAIN 回归，改动请同步跑一次）
+# -----------------------------
+SQL_DWELL_WINDOW = """
+SELECT date, dwell_hours, src
+FROM port_dwell
+WHERE unlocode = $1
+  AND date >= CURRENT_DATE - $2::int
+ORDER BY date ASC
+"""
+
+# 每天取最新一条快照；仅选覆盖索引里的列（Index Only Scan）
+# 后端一次取满窗口写入缓存，分页（游标）在缓存之后做，这里不分页
+SQL_TREND_DAILY = """
+WITH s AS (
+  SELECT DATE_TRUNC('day', snapshot_ts AT TIME ZONE $3) AS d,
+         snapshot_ts, vessels, avg_wait_hours, congestion_score, src, src_loaded_at
+  FROM port_snapshots
+  WHERE unlocode = $1
+    AND snapshot_ts >= (CURRENT_DATE - $2::int)
+),
+r AS (
+  SELECT *,
+         ROW_NUMBER() OVER (PARTITION BY d ORDER BY snapshot_ts DESC) AS rn
+  FROM s
+)
+SELECT (d AT TIME ZONE $3)::date AS date, snapshot_ts, vessels, avg_wait_hours, congestion_score, src,
+       src_loaded_at
+FROM r
+WHERE rn = 1
+ORDER BY date ASC
+LIMIT $4
+"""
+
+# 数据集导出（app/services/datasets.py）用：缓存窗口（MAX_DAYS）之前的全部历史，$2 = 窗口第一天（不含）。
+# 只在夜间作业里跑，不进缓存
+SQL_DWELL_HISTORY = """
+SELECT date, dwell_hours, src
+FROM port_dwell
+WHERE unlocode = $1
+  AND date < $2::date
+ORDER BY date ASC
+"""
+
+SQL_TREND_HISTORY = """
+WITH s AS (
+  SELECT DATE_TRUNC('day', snapshot_ts AT TIME ZONE $3) AS d,
+         snapshot_ts, vessels, avg_wait_hours, congestion_score, src
+  FROM port_snapshots
+  WHERE unlocode = $1
+    AND snapshot_ts < ($2::date)::timestamp AT TIME ZONE $3
+),
+r AS (
+  SELECT *,
+         ROW_NUMBER() OVER (PARTITION BY d ORDER BY snapshot_ts DESC) AS rn
+  FROM s
+)
+SELECT (d AT TIME ZONE $3)::date AS date, snapshot_ts, vessels, avg_wait_hours, congestion_score, src
+FROM r
+WHERE rn = 1
+ORDER BY date ASC
+"""
+
+
+# --------------------------------------------------------------------
+# 窗口 / 投影 / CSV（唯一实现）
+# --------------------------------------------------------------------
+def _date_key(p: dict) -> str:
+    return p.get("date") or ""
+
+
+def sort_points(points: List[dict]) -> List[dict]:
+    """按日期升序；已有序时原样返回（O(n) 检查，避免每次都排序）。"""
+    for a, b in zip(points, points[1:]):
+        if _date_key(a) > _date_key(b):
+            return sorted(points, key=_date_key)
+    return points
+
+
+def window_start(points: List[dict], days: Optional[int]) -> int:
+    """窗口起点下标：以最后一点的日期为终点的最近 `days` 天（含当天）；points 须升序。"""
+    if not points or not days or days <= 0:
+        return 0
+    try:
+        start = (date.fromisoformat(points[-1]["date"]) - timedelta(days=days - 1)).isoformat()
+    except Exception:
+        return max(0, len(points) - days)
+    return bisect.bisect_left(points, start, key=_date_key)
+
+
+def window(points: List[dict], days: Optional[int]) -> List[dict]:
+    """以最后一点的日期为终点取最近 `days` 天（含当天）；points 须升序。days 为空/<=0 → 原样返回。"""
+    i = window_start(points, days)
+    return points[i:] if i else points
+
+
+# --------------------------------------------------------------------
+# 游标分页（keyset：(unlocode, date)）
+# --------------------------------------------------------------------
+_CURSOR_PREFIX = "p1."
+
+
+def encode_cursor(unlocode: str, after: str) -> str:
+    """不透明游标：上一页最后一个点的 (PORT, date)。"""
+    raw = f"{_CURSOR_PREFIX}{unlocode.upper()}.{after}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, unlocode: str) -> str:
+    """→ 上一页最后一天（YYYY-MM-DD）；格式不对或不是这个港口的游标 → ValueError。"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        prefix, u, after = raw.split(".", 2)
+        date.fromisoformat(after)
+    except Exception:
+        raise ValueError("invalid cursor") from None
+    if prefix + "." != _CURSOR_PREFIX or u != unlocode.upper():
+        raise ValueError("invalid cursor")
+    return after
+
+
+def page_bounds(points: List[dict], days: Optional[int], after: Optional[str], limit: int,
+                offset: int = 0) -> Tuple[int, int]:
+    """窗口内 date > after 的 [start, end) 下标（二分定位，与页深无关）；limit<=0 → 到末尾。
+    offset 仅为兼容旧参数（相对窗口/游标起点）。"""
+    start = window_start(points, days)
+    if after:
+        start = max(start, bisect.bisect_right(points, after, key=_date_key))
+    start = min(len(points), start + max(0, offset))
+    end = len(points) if limit <= 0 else min(len(points), start + limit)
+    return start, end
+
+
+def page(points: List[dict], days: Optional[int], after: Optional[str], limit: int,
+         unlocode: str, offset: int = 0) -> Tuple[List[dict], Optional[str]]:
+    """一页点 + 下一页游标（没有下一页 → None）；points 须升序。"""
+    start, end = page_bounds(points, days, after, limit, offset)
+    rows = points[start:end]
+    nxt = encode_cursor(unlocode, rows[-1]["date"]) if rows and end < len(points) else None
+    return rows, nxt
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str] = TREND_FIELDS) -> List[str]:
+    """`fields=a,b` → 按规范顺序的子集；为空或全无效 → 全部。"""
+    if not fields:
+        return list(allowed)
+    want = {f.strip() for f in fields.split(",") if f.strip()}
+    return [f for f in allowed if f in want] or list(allowed)
+
+
+def project(points: Iterable[dict], fields: Sequence[str]) -> List[dict]:
+    """只保留 date + fields + src（缺失字段以 None 占位，与数据字典一致）。"""
+    return [{"date": p.get("date"), **{f: p.get(f) for f in fields}, "src": p.get("src")} for p in points]
+
+
+def csv_bytes(points: Iterable[dict], fields: Sequence[str]) -> bytes:
+    """表头 date,<fields>,src；None 写空串。"""
+    with span("serialize"):
+        buf = io.StringIO()
+        w = csv.writer(buf, lineterminator="\n")
+        w.writerow(["date", *fields, "src"])
+        for p in points:
+            w.writerow([p.get("date"), *("" if p.get(f) is None else p.get(f) for f in fields), p.get("src") or ""])
+        return buf.getvalue().encode("utf-8")
+
+
+def merge_points(base: List[dict], overlay: List[dict], overlay_src: str = "override",
+                 base_src: str = "") -> List[dict]:
+    """两个升序序列按日期归并（O(n+m)，不排序）；同一天以 overlay 为准。
+
+    每个点保留自身 src（nowcast / ais / demo …），缺失时记为所在层的后端名；
+    只复制需要补 src 的点，其余点与缓存共享。
+    """
+    out: List[dict] = []
+    i = j = 0
+    n, m = len(base), len(overlay)
+    while i < n or j < m:
+        if j >= m or (i < n and _date_key(base[i]) < _date_key(overlay[j])):
+            p = base[i]
+            i += 1
+            if not p.get("src") and base_src:
+                p = {**p, "src": base_src}
+        else:
+            p = overlay[j]
+            d = _date_key(p)
+            j += 1
+            while i < n and _date_key(base[i]) == d:  # 同日 base 让位
+                i += 1
+            if j < m and _date_key(overlay[j]) == d:  # overlay 内同日重复：取最后一条
+                continue
+            if not p.get("src") and overlay_src:
+                p = {**p, "src": overlay_src}
+        if out and _date_key(out[-1]) == _date_key(p):
+            out[-1] = p
+        else:
+            out.append(p)
+    return out
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + sha256(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 用弱比较：忽略两边的 W/ 前缀。"""
+    if not if_none_match:
+        return False
+    bare = etag.removeprefix("W/")
+    for t in if_none_match.split(","):
+        t = t.strip()
+        if t == "*" or t.removeprefix("W/") == bare:
+            return True
+    return False
+
+
+class Validator:
+    """条件请求校验器：ETag / Last-Modified 由数据版本 + 表示参数得出，不需要先生成 body。
+
+    stale：None / "revalidating"（软期限已过，后台刷新中）/ "error"（回源失败，上一次的好数据）；
+    age：数据取到至今的秒数。
+    """
+
+    __slots__ = ("etag", "modified", "stale", "age")
+
+    def __init__(self, etag: str, modified: Optional[datetime], stale: Optional[str] = None, age: int = 0):
+        self.etag, self.modified, self.stale, self.age = etag, modified, stale, age
+
+    def headers(self) -> Dict[str, str]:
+        """ETag / Last-Modified / Cache-Control；回旧值时加 Warning + X-Data-Stale。"""
+        h = {"ETag": self.etag, "Cache-Control": CACHE_CONTROL_STALE if self.stale else CACHE_CONTROL}
+        if self.modified is not None:
+            h["Last-Modified"] = format_datetime(self.modified, usegmt=True)
+        if self.stale:
+            h["Warning"] = '111 - "Revalidation Failed"' if self.stale == "error" else '110 - "Response is Stale"'
+            h["X-Data-Stale"] = f"{self.stale}; age={self.age}"
+        return h
+
+    def not_modified(self, headers) -> bool:
+        """If-None-Match 优先（RFC 9110 §13.2.2）；没有时才看 If-Modified-Since（秒级精度）。"""
+        inm = headers.get("if-none-match")
+        if inm is not None:
+            return etag_matches(inm, self.etag)
+        ims = headers.get("if-modified-since")
+        if not ims or self.modified is None:
+            return False
+        try:
+            since = parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return int(self.modified.timestamp()) <= since.timestamp()
+
+
+# --------------------------------------------------------------------
+# Backends
+# --------------------------------------------------------------------
+def _stable_int(s: str, mod: int) -> int:
+    """稳定整数：内置 hash() 每进程加盐，多 worker 下 demo 序列/ETag 会不一致。"""
+    return int(sha256(s.encode("utf-8")).hexdigest()[:8], 16) % mod
+
+
+def _mtime_ns(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _mtime_dt(ns: Optional[int]) -> Optional[datetime]:
+    return None if ns is None else datetime.fromtimestamp(ns / 1e9, tz=timezone.utc)
+
+
+def _num(v, cast=float):
+    return None if v is None else cast(v)
+
+
+class Backend:
+    name = "base"
+    kinds: Tuple[str, ...] = ("trend", "dwell")
+    overlay = False  # True：逐点叠加到基础序列之上，而不是整段替换
+
+    async def load(self, kind: str, unlocode: str, tz: str) -> Optional[List[dict]]:
+        """返回升序全量序列（最多 MAX_DAYS 天）；无数据返回 None。"""
+        return None
+
+    def version(self, kind: str, unlocode: str):
+        """廉价的变更标记（命中缓存时比较）；None 表示只能靠 TTL。"""
+        return None
+
+    def modified(self, kind: str, unlocode: str) -> Optional[datetime]:
+        """最近一次 load() 的数据最后变更时间（Last-Modified）；None 表示未知（只发 ETag）。"""
+        return None
+
+    async def history(self, kind: str, unlocode: str, tz: str, before: str) -> Optional[List[dict]]:
+        """`before`（YYYY-MM-DD，不含）之前的全部历史，升序；不支持 / 没有 → None。数据集导出用。"""
+        return None
+
+
+class DemoBackend(Backend):
+    """稳定可复现的合成序列（按日期而非窗口下标生成：不同 days 取到的同一天数值一致）。"""
+
+    name = "demo"
+    BUMPED = {"USLAX", "USNYC", "USNYN"}  # 最近 7 天轻微抬升，方便演示告警
+
+    def version(self, kind, unlocode):
+        return datetime.now(timezone.utc).date()
+
+    def modified(self, kind, unlocode):
+        # 序列按日期生成：当天 0 点之后不再变化
+        return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    async def load(self, kind, unlocode, tz):
+        today = datetime.now(timezone.utc).date()
+        base = 24 + _stable_int(unlocode, 7)
+        pts = []
+        for i in range(MAX_DAYS):
+            d = today - timedelta(days=MAX_DAYS - 1 - i)
+            n = d.toordinal()
+            bump = unlocode in self.BUMPED and (today - d).days < 7
+            if kind == "dwell":
+                v = float(base + (n * 7) % 6) + (2.5 if bump else 0.0)
+                pts.append({"date": d.isoformat(), "dwell_hours": round(v, 2), "src": "demo"})
+            else:
+                v = float(base + (n * 5) % 9) + (3.0 if bump else 0.0)
+                pts.append({
+                    "date": d.isoformat(),
+                    "vessels": 80 + (n * 3) % 40,
+                    "avg_wait_hours": round(v, 2),
+                    "congestion_score": min(100, int(50 + v - 24)),
+                    "src": "demo",
+                })
+        return pts
+
+    def overview(self, unlocode: str) -> dict:
+        base = _stable_int(unlocode, 1000)
+        return {
+            "unlocode": unlocode,
+            "port_name": None,
+            "country": None,
+            "arrivals_7d": (base % 30) + 50,
+            "departures_7d": (base % 30) + 45,
+            "waiting_vessels": (base % 8),
+            "avg_wait_hours": round(4.0 + (base % 120) / 10.0, 1),
+            "avg_berth_hours": round(10.0 + (base % 200) / 10.0, 1),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+
+class DerivedBackend(Backend):
+    """ETL 产出的派生文件：data/derived/{trend,dwell}/{PORT}.json"""
+
+    name = "derived"
+
+    def __init__(self, root: Path = DERIVED_DIR):
+        self.root = root
+
+    def _path(self, kind, unlocode) -> Path:
+        return self.root / kind / f"{unlocode}.json"
+
+    def version(self, kind, unlocode):
+        return _mtime_ns(self._path(kind, unlocode))
+
+    def modified(self, kind, unlocode):
+        return _mtime_dt(self.version(kind, unlocode))
+
+    async def load(self, kind, unlocode, tz):
+        path = self._path(kind, unlocode)
+        if not path.exists():
+            return None
+        # 解析失败（写了一半 / 损坏）照常抛出：仓库回上一次的好数据
+        with span("file_io"):
+            pts = (json.loads(path.read_text(encoding="utf-8")) or {}).get("points") or []
+        pts = sort_points([p for p in pts if p.get("date")])
+        if kind == "trend":
+            freshness.mark_points(unlocode, pts, "derived",
+                                  ingested_at=datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc))
+        return pts[-MAX_DAYS:] or None
+
+    async def history(self, kind, unlocode, tz, before):
+        path = self._path(kind, unlocode)
+        if not path.exists():
+            return None
+        pts = (json.loads(path.read_text(encoding="utf-8")) or {}).get("points") or []
+        return sort_points([p for p in pts if p.get("date") and p["date"] < before]) or None
+
+
+class OverrideBackend(Backend):
+    """nowcast 覆盖文件（services/overrides.py 负责读写格式与新鲜度标记）。"""
+
+    name = "override"
+    kinds = ("trend",)
+    overlay = True
+
+    def version(self, kind, unlocode):
+        if kind not in self.kinds:
+            return None
+        from app.services.overrides import DATA_DIR
+        return _mtime_ns(DATA_DIR / unlocode / "trend.json")
+
+    def modified(self, kind, unlocode):
+        return _mtime_dt(self.version(kind, unlocode))
+
+    async def load(self, kind, unlocode, tz):
+        if kind not in self.kinds:
+            return None
+        from app.services.overrides import load_trend_override
+        ov = load_trend_override(unlocode)
+        return ov["points"][-MAX_DAYS:] if ov and ov.get("points") else None
+
+
+class PostgresBackend(Backend):
+    """port_snapshots / port_dwell；连接池复用 app/services/deps.py。
+
+    未配置库 → None；连不上 / 查询失败 → 抛出，由仓库决定回上一次的好数据还是降级到下一个后端
+    （吞掉异常返回 None 会让 DB 抖一下就悄悄换成 demo 数据）。
+    """
+
+    name = "db"
+
+    def __init__(self):
+        # (kind, PORT) → 最近一次 load 的 max(src_loaded_at, snapshot_ts)；回填旧日期也会推进它
+        self._modified: Dict[Tuple[str, str], datetime] = {}
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(os.getenv("DATABASE_URL") or os.getenv("DB_DSN"))
+
+    def modified(self, kind, unlocode):
+        return self._modified.get((kind, unlocode))
+
+    async def load(self, kind, unlocode, tz):
+        if not self.enabled():
+            return None
+        from app.services.deps import require_db_pool
+        pool = await require_db_pool()  # 空壳池会返回空结果集：当成故障，而不是“没数据”
+        t0 = time.perf_counter()
+        async with tiers.db_slot(), pool.acquire() as conn:
+            metrics.DB_POOL_WAIT.observe(time.perf_counter() - t0)
+            with span("sql"):
+                if kind == "dwell":
+                    rows = await conn.fetch(SQL_DWELL_WINDOW, unlocode, MAX_DAYS)
+                else:
+                    # 含今天共 MAX_DAYS + 1 个自然日
+                    rows = await conn.fetch(SQL_TREND_DAILY, unlocode, MAX_DAYS, tz, MAX_DAYS + 1)
+        if not rows:
+            return None
+        if kind == "dwell":
+            return [{"date": r["date"].isoformat(), "dwell_hours": _num(r["dwell_hours"]), "src": r["src"]}
+                    for r in rows]
+        pts = [
+            {
+                "date": r["date"].isoformat(),
+                "vessels": _num(r["vessels"], int),
+                "avg_wait_hours": _num(r["avg_wait_hours"]),
+                "congestion_score": _num(r["congestion_score"]),
+                "src": r["src"],
+                "as_of": r["snapshot_ts"].isoformat(),
+            }
+            for r in rows
+        ]
+        last = rows[-1]["snapshot_ts"]
+        freshness.mark(unlocode, last, "db", ingested_at=last)
+        self._modified[(kind, unlocode)] = max(max(r["src_loaded_at"] or r["snapshot_ts"], r["snapshot_ts"])
+                                               for r in rows)
+        return pts
+
+    async def history(self, kind, unlocode, tz, before):
+        if not self.enabled():
+            return None
+        from app.services.deps import require_db_pool
+        pool = await require_db_pool()
+        async with tiers.db_slot(), pool.acquire() as conn:
+            if kind == "dwell":
+                rows = await conn.fetch(SQL_DWELL_HISTORY, unlocode, date.fromisoformat(before))
+                return [{"date": r["date"].isoformat(), "dwell_hours": _num(r["dwell_hours"]), "src": r["src"]}
+                        for r in rows] or None
+            rows = await conn.fetch(SQL_TREND_HISTORY, unlocode, date.fromisoformat(before), tz)
+        return [
+            {
+                "date": r["date"].isoformat(),
+                "vessels": _num(r["vessels"], int),
+                "avg_wait_hours": _num(r["avg_wait_hours"]),
+                "congestion_score": _num(r["congestion_score"]),
+                "src": r["src"],
+                "as_of": r["snapshot_ts"].isoformat(),
+            }
+            for r in rows
+        ] or None
+
+
+BACKENDS = {
+    "override": OverrideBackend,
+    "db": PostgresBackend,
+    "derived": DerivedBackend,
+    "demo": DemoBackend,
+}
+
+
+# --------------------------------------------------------------------
+# Repository
+# --------------------------------------------------------------------
+_BLOBS_PER_ENTRY = 8
+
+
+class _Entry:
+    __slots__ = ("points", "source", "versions", "expires", "modified", "loaded", "error", "tag", "table", "blobs")
+
+    def __init__(self, points, source, versions, expires, modified=None, loaded=0.0, error=False):
+        self.points, self.source, self.versions, self.expires = points, source, versions, expires
+        self.modified: Optional[datetime] = modified
+        self.loaded = loaded  # 取数时刻（monotonic）：硬期限从这里算，回旧值不会顺延
+        self.error = error  # True：回源失败，这是上一次的好数据
+        self.tag: Optional[str] = None  # 内容摘要（首次条件请求时算一次）
+        self.table = None  # Arrow 表（首次 format=arrow/parquet 时惰性构建）
+        self.blobs: Dict[tuple, Tuple[bytes, str]] = {}  # (fmt, days, fields, offset, limit, after) → (字节, ETag)
+
+    def stale_copy(self, versions: tuple, expires: float) -> "_Entry":
+        """回源失败时的替身：同样的数据（摘要 / Arrow 表 / 编码结果照用），标记 error，短期后重试。"""
+        ent = _Entry(self.points, self.source, versions, expires, self.modified, self.loaded, error=True)
+        ent.tag, ent.table, ent.blobs = self.tag, self.table, self.blobs
+        return ent
+
+
+class PortDataRepository:
+    def __init__(self, backends: Sequence[Backend], ttl: float = CACHE_TTL, size: int = CACHE_SIZE,
+                 swr: float = SWR_SECONDS, stale_ttl: float = STALE_TTL):
+        self.backends = list(backends)
+        self.demo = next((b for b in self.backends if isinstance(b, DemoBackend)), DemoBackend())
+        self.ttl = ttl  # 软期限
+        self.size = size
+        self.swr = swr  # 软期限之后先回旧值、后台刷新的窗口
+        self.stale_ttl = stale_ttl  # 硬期限：回源失败时旧值最多用到取数后这么久
+        # key = (layer, kind, PORT, tz)，layer ∈ base / overlay / merged
+        self._cache: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        # 同一 key 的并发未命中只回源一次（缓存同时失效时的惊群）
+        self._flights = SingleFlight("port_data", LOAD_TIMEOUT)
+        self._refreshing: Dict[tuple, asyncio.Task] = {}  # 后台刷新（stale-while-revalidate）
+        # invalidate() 的代数：并进 versions，失效后旧条目只能当 stale-if-error 的后备，不再算命中；
+        # 失效之前就开始的回源（读的是写入之前的数据）结果也不会再进缓存
+        self._epoch = 0
+        self._gens: Dict[tuple, int] = {}  # PORT / (kind, PORT) → 代数
+
+    def _gen(self, kind: str, u: str) -> tuple:
+        return (self._epoch, self._gens.get(u, 0), self._gens.get((kind, u), 0))
+
+    def _versions(self, kind: str, u: str, backends: Sequence[Backend]) -> tuple:
+        return (*(b.version(kind, u) for b in backends), self._gen(kind, u))
+
+    def _layer_backends(self, kind: str, overlay: bool) -> List[Backend]:
+        return [b for b in self.backends if kind in b.kinds and b.overlay == overlay]
+
+    def _lookup(self, key: tuple, versions: tuple, now: float) -> Optional[_Entry]:
+        ent = self._cache.get(key)
+        if ent is not None and ent.versions == versions and now < ent.expires:
+            self._cache.move_to_end(key)
+            return ent
+        return None
+
+    def _store(self, key: tuple, ent: _Entry) -> _Entry:
+        self._cache[key] = ent
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+        return ent
+
+    def _store_current(self, key: tuple, ent: _Entry) -> _Entry:
+        """回源期间被 invalidate() 过（代数变了）：这份数据是写入之前读的，不进缓存，只回给本次调用方。"""
+        if ent.versions[-1] != self._gen(key[1], key[2]):
+            return ent
+        return self._store(key, ent)
+
+    def _usable_stale(self, ent: Optional[_Entry], now: float) -> bool:
+        """回源失败时能否回这个旧条目：有数据且未过硬期限。"""
+        return ent is not None and bool(ent.points) and now < ent.loaded + self.stale_ttl
+
+    def _retry_at(self, now: float) -> float:
+        return now + min(self.ttl, ERROR_RETRY)
+
+    async def _layer(self, layer: str, kind: str, u: str, tz: str, now: float) -> _Entry:
+        """单层：该层第一个非空后端的全量序列（各层独立缓存）。"""
+        backends = self._layer_backends(kind, layer == "overlay")
+        versions = self._versions(kind, u, backends)
+        key = (layer, kind, u, tz)
+        ent = self._lookup(key, versions, now)
+        if ent is not None:
+            return ent
+        prev = self._cache.get(key)
+        points, source, modified, failed = [], "none", None, False
+        for b in backends:
+            try:
+                pts = await b.load(kind, u, tz)
+            except Exception:
+                BACKEND_ERRORS.inc(b.name)
+                if self._usable_stale(prev, now):
+                    # stale-if-error：回上一次的好数据，而不是悄悄降级到下一个后端（demo / 空）
+                    return self._store_current(key, prev.stale_copy(versions, self._retry_at(now)))
+                failed, pts = True, None
+            if pts:
+                points, source, modified = pts, b.name, b.modified(kind, u)
+                break
+        # 没有旧值可回、降级到了低优先级后端：尽快重试上游
+        expires = self._retry_at(now) if failed else now + self.ttl
+        return self._store_current(key, _Entry(points, source, versions, expires, modified, now))
+
+    async def series(self, kind: str, unlocode: str, tz: str = "UTC") -> Tuple[List[dict], str]:
+        """全量升序序列 + 来源（"db" / "override+db" …；读穿缓存）。"""
+        ent = await self._merged(kind, unlocode.upper(), tz)
+        return ent.points, ent.source
+
+    async def history(self, kind: str, unlocode: str, tz: str = "UTC") -> Tuple[List[dict], str]:
+        """全量历史（数据集导出用）：缓存里的最近 MAX_DAYS 天 + 基础层来源后端在此之前的点。
+
+        更早的部分直接读后端、不进缓存（一年以上的序列只有夜间作业要）；只接同一个后端的历史，
+        不把 db 的近一年和 derived 的更早数据拼在一起。
+        """
+        u = unlocode.upper()
+        pts, src = await self.series(kind, u, tz)
+        if not pts:
+            return pts, src
+        base = await self._layer("base", kind, u, tz, time.monotonic())
+        b = next((b for b in self._layer_backends(kind, False) if b.name == base.source), None)
+        older = await b.history(kind, u, tz, pts[0]["date"]) if b is not None else None
+        return (older + pts if older else pts), src
+
+    async def _merged(self, kind: str, u: str, tz: str) -> _Entry:
+        key = ("merged", kind, u, tz)
+        versions = self._versions(kind, u, [b for b in self.backends if kind in b.kinds])
+        now = time.monotonic()
+        ent = self._cache.get(key)
+        if ent is not None and ent.versions == versions and now < ent.expires + self.swr:
+            metrics.record_cache("port_data", True)
+            self._cache.move_to_end(key)
+            if now >= ent.expires:
+                # 软期限已过：先回旧值，后台刷新（同一 key 只起一个）
+                self._refresh(key, versions)
+            return ent
+        metrics.record_cache("port_data", False)
+        try:
+            # flight 按 versions 区分：失效之后的请求不会并到失效之前就开始的那次回源上
+            return await self._shared_build(key, versions)
+        except Exception:
+            # 回源整体失败（超时等）：硬期限内回旧值；否则照常抛出（TimeoutError → 503）
+            if not self._usable_stale(ent, now):
+                raise
+            return self._store_current(key, ent.stale_copy(versions, self._retry_at(now)))
+
+    def _refresh(self, key: tuple, versions: tuple) -> None:
+        if key in self._refreshing:
+            return
+
+        async def run():
+            try:
+                await self._shared_build(key, versions)
+            except Exception:
+                pass  # 旧值继续服务（至多到硬期限），下一个请求再触发刷新
+
+        task = asyncio.ensure_future(run())
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _t, k=key: self._refreshing.pop(k, None))
+
+    async def _shared_build(self, key: tuple, versions: tuple) -> _Entry:
+        # 合并回源的结果各等级共用：按 live 取 DB，demo 发起的 flight 不拖住并上来的付费请求
+        return await self._flights.do((key, versions), lambda: tiers.shared(lambda: self._build_merged(key, versions)))
+
+    async def _build_merged(self, key: tuple, versions: tuple) -> _Entry:
+        _, kind, u, tz = key
+        now = time.monotonic()
+        base = await self._layer("base", kind, u, tz, now)
+        over = await self._layer("overlay", kind, u, tz, now)
+        if over.points and base.points:
+            points = window(merge_points(base.points, over.points, over.source, base.source), MAX_DAYS)
+            source = f"{over.source}+{base.source}"
+            modified = max(over.modified, base.modified) if over.modified and base.modified else None
+        elif over.points:
+            points, source = merge_points([], over.points, over.source), over.source
+            modified = over.modified
+        else:
+            points, source, modified = base.points, base.source, base.modified
+        return self._store_current(key, _Entry(points, source, versions, min(base.expires, over.expires),
+                                               modified, min(base.loaded, over.loaded), base.error or over.error))
+
+    async def validator(self, kind: str, unlocode: str, variant: tuple, tz: str = "UTC",
+                        weak: bool = False) -> Validator:
+        """条件请求用：缓存命中时只有各后端 version()（stat）+ 字典查找，不序列化、不哈希 body。
+
+        ETag = 内容摘要（每个缓存条目算一次）+ 表示参数（variant：路由/格式/窗口/字段…），
+        同样的数据在各 worker、各次重载之间 ETag 一致。body 里带“当前时间”之类字段的表示请用 weak。
+        回的是旧值时 Validator.stale 非空（路由把 headers() 原样带上即可）。
+        """
+        ent = await self._merged(kind, unlocode.upper(), tz)
+        if ent.tag is None:
+            ent.tag = blake2b(json_codec.dumps([ent.source, ent.points]), digest_size=12).hexdigest()
+        v = blake2b(repr(variant).encode("utf-8"), digest_size=6).hexdigest()
+        etag = f'"{ent.tag}-{v}"'
+        now = time.monotonic()
+        stale = "error" if ent.error else "revalidating" if now >= ent.expires else None
+        if stale:
+            STALE_SERVED.inc(stale)
+        return Validator(f"W/{etag}" if weak else etag, ent.modified, stale, int(now - ent.loaded))
+
+    async def columnar(self, kind: str, unlocode: str, fmt: str, days: Optional[int] = None,
+                       fields: Optional[Sequence[str]] = None, tz: str = "UTC",
+                       offset: int = 0, limit: int = 0, after: Optional[str] = None) -> Tuple[bytes, str]:
+        """format=arrow|parquet 的 (字节, ETag)。
+
+        Arrow 表按缓存条目建一次；窗口/游标(after)/offset/limit 是零拷贝 slice，投影是 select；
+        编码结果也挂在条目上（数据变了条目整体失效）。需要 columnar.available()。
+        """
+        u = unlocode.upper()
+        ent = await self._merged(kind, u, tz)
+        allowed = DWELL_FIELDS if kind == "dwell" else TREND_FIELDS
+        fields = tuple(fields or allowed)
+        key = (fmt, days, fields, offset, limit, after)
+        blob = ent.blobs.get(key)
+        if blob is not None:
+            return blob
+        if ent.table is None:
+            ent.table = columnar.table_from_points(ent.points, allowed,
+                                                   {"unlocode": u, "kind": kind, "source": ent.source})
+        start, end = page_bounds(ent.points, days, after, limit, offset)
+        table = ent.table.slice(start, end - start).select(["date", *fields, "src"])
+        with span("serialize"):
+            body = columnar.encode(table, fmt)
+        blob = (body, etag_for(body))
+        if len(ent.blobs) >= _BLOBS_PER_ENTRY:
+            ent.blobs.pop(next(iter(ent.blobs)))
+        ent.blobs[key] = blob
+        return blob
+
+    async def trend(self, unlocode: str, days: Optional[int] = None, tz: str = "UTC") -> List[dict]:
+        pts, _ = await self.series("trend", unlocode, tz)
+        return window(pts, days)
+
+    async def trend_page(self, unlocode: str, days: Optional[int], after: Optional[str], limit: int,
+                         tz: str = "UTC", offset: int = 0) -> Tuple[List[dict], Optional[str]]:
+        """游标分页：(这一页的点, 下一页游标)；after 为 decode_cursor() 的结果。"""
+        pts, _ = await self.series("trend", unlocode, tz)
+        return page(pts, days, after, limit, unlocode, offset)
+
+    async def dwell(self, unlocode: str, days: Optional[int] = None) -> List[dict]:
+        pts, _ = await self.series("dwell", unlocode)
+        return window(pts, days)
+
+    async def latest(self, unlocode: str) -> Optional[dict]:
+        pts, _ = await self.series("trend", unlocode)
+        return pts[-1] if pts else None
+
+    def overview(self, unlocode: str) -> dict:
+        """看板聚合（到港/离港等计数目前只有 demo 口径）。"""
+        return self.demo.overview(unlocode.upper())
+
+    def invalidate(self, unlocode: Optional[str] = None, kind: Optional[str] = None) -> None:
+        """让某港口（可再限定 trend / dwell）的各层条目失效；都不给 → 全部失效。
+
+        不删条目：代数 +1（versions 对不上，不再算命中）并立即过期，旧值留作 stale-if-error 的后备
+        （回填后紧接着 DB 出错，仍回上一次的好数据而不是 503 / 空）。
+        """
+        if unlocode is None:
+            self._epoch += 1
+            keys = list(self._cache)
+        else:
+            u = unlocode.upper()
+            g = u if kind is None else (kind, u)
+            self._gens[g] = self._gens.get(g, 0) + 1
+            keys = [k for k in self._cache if k[2] == u and (kind is None or k[1] == kind)]
+        for key in keys:
+            self._cache[key].expires = 0.0
+
+
+def _build_default() -> PortDataRepository:
+    backends = [BACKENDS[name]() for name in BACKEND_ORDER if name in BACKENDS]
+    return PortDataRepository(backends or [DemoBackend()])
+
+
+REPO = _build_default()
+
+
+def get_repository() -> PortDataRepository:
+    """FastAPI 依赖 / 直接调用均可；测试可替换 port_data.REPO。"""
+    return REPO
@@ -0,0 +1,190 @@
+# app/services/profiling.py —— 单请求剖析：span 分解 + 统计式栈采样 + 内存环形缓冲
+"""
+仅当管理员 key + `X-Profile: 1` 时启用（见 app/middlewares/profiling.py）。
+
+- span(name)：代码里标注热点段（file_io / sql / serialize ...）；未剖析时返回共享的空上下文，
+  开销仅为一次 ContextVar.get()
+- StackSampler：后台线程按固定间隔读 sys._current_frames()，聚合为 collapsed stacks
+  （可直接喂给 flamegraph.pl / speedscope）。采样是线程级的：同一事件循环上并发的
+  其他请求也会出现在栈里，仅用于排障
+- PROFILES：最近 PROFILE_BUFFER_SIZE 条结果，供 /v1/admin/debug/profiles 浏览
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
+
+BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "2")) / 1000.0
+MAX_DEPTH = 64
+TOP_STACKS = 50
+
+_current: ContextVar[Optional["Profile"]] = ContextVar("portpulse_profile", default=None)
+_ids = itertools.count(1)
+
+
+class Profile:
+    __slots__ = ("id", "request_id", "method", "path", "query", "started_at", "t0",
+                 "duration_ms", "status", "spans", "stacks", "samples")
+
+    def __init__(self, method: str, path: str, query: str, request_id: Optional[str]):
+        self.id = next(_ids)
+        self.request_id = request_id
+        self.method, self.path, self.query = method, path, query
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.t0 = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.spans: List[dict] = []
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def span_totals(self) -> Dict[str, float]:
+        out: Dict[str, float] = {}
+        for s in self.spans:
+            out[s["name"]] = round(out.get(s["name"], 0.0) + s["ms"], 3)
+        return out
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "span_totals_ms": self.span_totals(),
+            "samples": self.samples,
+        }
+
+    def detail(self) -> dict:
+        d = self.summary()
+        d["spans"] = self.spans
+        d["sample_interval_ms"] = SAMPLE_INTERVAL * 1000.0
+        d["stacks"] = [{"stack": k, "count": c} for k, c in self.stacks.most_common(TOP_STACKS)]
+        return d
+
+
+PROFILES: Deque[Profile] = deque(maxlen=BUFFER_SIZE)
+
+
+# --------------------------------------------------------------------
+# Spans
+# --------------------------------------------------------------------
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profile", "name", "t")
+
+    def __init__(self, profile: Profile, name: str):
+        self.profile, self.name = profile, name
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        now = time.perf_counter()
+        self.profile.spans.append({
+            "name": self.name,
+            "start_ms": round((self.t - self.profile.t0) * 1000.0, 3),
+            "ms": round((now - self.t) * 1000.0, 3),
+        })
+        return False
+
+
+def span(name: str):
+    """`with span("sql"): ...` —— 未剖析时零分配。"""
+    prof = _current.get()
+    if prof is None:
+        return _NULL_SPAN
+    return _Span(prof, name)
+
+
+def active() -> Optional[Profile]:
+    return _current.get()
+
+
+# --------------------------------------------------------------------
+# Stack sampler
+# --------------------------------------------------------------------
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None and len(parts) < MAX_DEPTH:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, profile: Profile, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="portpulse-profiler", daemon=True)
+        self.profile = profile
+        self.interval = interval
+        self._stop_evt = threading.Event()
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop_evt.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = _collapse(frame)
+                self.profile.stacks[f"{names.get(tid, tid)};{stack}"] += 1
+            self.profile.samples += 1
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+        self.join(timeout=1)
+
+
+# --------------------------------------------------------------------
+# Lifecycle（由中间件调用）
+# --------------------------------------------------------------------
+def start(method: str, path: str, query: str, request_id: Optional[str]):
+    prof = Profile(method, path, query, request_id)
+    token = _current.set(prof)
+    sampler = StackSampler(prof)
+    sampler.start()
+    return prof, token, sampler
+
+
+def finish(prof: Profile, token, sampler: StackSampler, status: Optional[int]) -> None:
+    sampler.stop()
+    _current.reset(token)
+    prof.duration_ms = round((time.perf_counter() - prof.t0) * 1000.0, 3)
+    prof.status = status
+    PROFILES.append(prof)
+
+
+def get(profile_id: int) -> Optional[Profile]:
+    for p in PROFILES:
+        if p.id == profile_id:
+            return p
+    return None
+
+
+def server_timing(prof: Profile) -> str:
+    return ", ".join(f"{name};dur={ms}" for name, ms in prof.span_totals().items())
@@ -0,0 +1,69 @@
+# app/services/singleflight.py —— 相同 key 的并发计算合并为一次（single-flight）
+"""
+5 分钟桶翻转时几十个看板同时请求同一个 /trend?days=30：缓存同时失效，每个请求各自查一遍 DB。
+这里让同一 key 的并发调用共享一个进行中的 Task：
+
+- 第一个调用者（leader）启动计算；之后到达的（waiter）直接等同一个结果
+- 计算跑在独立 Task 里，调用方只 await shield(task)：任何一个调用方被取消（客户端断开）
+  都不会取消共享计算，其余等待者照常拿到结果；全部调用方都走了，计算仍会跑完并写入缓存
+- 每个 key 的计算有超时（timeout）：超时后该次计算被取消，等待者收到 TimeoutError，
+  下一个请求会重新发起；不会有永远挂住的 flight
+- 计算抛异常：同一批等待者收到同一个异常，之后的调用重新计算（失败不缓存）
+
+指标：portpulse_singleflight_calls_total{name, role=leader|waiter}、
+      portpulse_singleflight_timeouts_total{name}
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from app.services import metrics
+
+CALLS = metrics.register(metrics.Counter(
+    "portpulse_singleflight_calls", "Single-flight calls by role (waiter = coalesced onto an in-flight call)",
+    ("name", "role"),
+))
+TIMEOUTS = metrics.register(metrics.Counter(
+    "portpulse_singleflight_timeouts", "Single-flight computations cancelled by their per-key timeout",
+    ("name",),
+))
+
+
+class SingleFlight:
+    def __init__(self, name: str, timeout: Optional[float] = None):
+        self.name = name
+        self.timeout = timeout
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]],
+                 timeout: Optional[float] = None) -> Any:
+        """同一 key 并发调用只执行一次 fn()；timeout 为本 key 计算的上限（None → 实例默认）。"""
+        task = self._inflight.get(key)
+        if task is None:
+            CALLS.inc(self.name, "leader")
+            task = asyncio.ensure_future(self._run(fn, self.timeout if timeout is None else timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        else:
+            CALLS.inc(self.name, "waiter")
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        # 完成（含失败/取消）即摘除：失败不缓存，下一个调用重新计算
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # 调用方都已离开时，避免 "exception was never retrieved"
+
+    async def _run(self, fn: Callable[[], Awaitable[Any]], timeout: Optional[float]) -> Any:
+        if not timeout or timeout <= 0:
+            return await fn()
+        try:
+            return await asyncio.wait_for(fn(), timeout)
+        except asyncio.TimeoutError:
+            TIMEOUTS.inc(self.name)
+            raise
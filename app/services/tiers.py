@@ -0,0 +1,75 @@
+# app/services/tiers.py —— API key 等级：demo（含匿名）/ live（付费）/ admin
+"""
+准入控制（app/services/admission.py）按等级排优先级：admin > live > demo；demo 只拿一小份并发，
+DB 连接也只给 demo 留 DB_DEMO_SLOTS 个（文档页上的 demo key 被人刮数据时不拖慢付费客户）。
+
+等级按请求里的 key 判定（X-API-Key 或 Authorization: Bearer），与鉴权中间件同一套环境变量：
+ADMIN_API_KEY → admin；NEXT_PUBLIC_DEMO_API_KEY 或没带 key → demo；其余（已通过鉴权的）→ live。
+当前请求的等级放在 contextvar TIER 里，下游（DB 取数）据此限流。
+合并计算（single-flight、SWR 后台刷新）用 shared() 包一层按 live 跑：Task 会拷贝发起者的 context，
+否则 demo 发起的 flight 会让并在上面的付费请求一起排 demo 的 DB 槽位。
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional, TypeVar
+
+TIERS = ("admin", "live", "demo")  # 优先级从高到低
+DB_DEMO_SLOTS = int(os.getenv("DB_DEMO_SLOTS", "1"))
+
+TIER: ContextVar[str] = ContextVar("portpulse_tier", default="live")
+
+T = TypeVar("T")
+
+
+def api_key(scope) -> Optional[str]:
+    auth = None
+    for k, v in scope.get("headers") or ():
+        k = k.lower()
+        if k == b"x-api-key":
+            return v.decode("latin-1").strip() or None
+        if k == b"authorization":
+            auth = v.decode("latin-1")
+    if auth and auth.lower().startswith("bearer "):
+        return auth[7:].strip() or None
+    return None
+
+
+def tier_for(scope) -> str:
+    key = api_key(scope)
+    if not key:
+        return "demo"
+    admin = os.getenv("ADMIN_API_KEY", "").strip()
+    if admin and key == admin:
+        return "admin"
+    if key == os.getenv("NEXT_PUBLIC_DEMO_API_KEY", "dev_demo_123").strip():
+        return "demo"
+    return "live"
+
+
+_db_demo: Optional[asyncio.Semaphore] = None
+
+
+@asynccontextmanager
+async def db_slot():
+    """取 DB 连接前包一层：demo 等级最多 DB_DEMO_SLOTS 个并发，其余等级只受连接池本身限制。"""
+    global _db_demo
+    if TIER.get() != "demo" or DB_DEMO_SLOTS <= 0:
+        yield
+        return
+    if _db_demo is None:
+        _db_demo = asyncio.Semaphore(DB_DEMO_SLOTS)
+    async with _db_demo:
+        yield
+
+
+async def shared(fn: Callable[[], Awaitable[T]]) -> T:
+    """按 live 等级执行 fn()：结果由多个请求（可能不同等级）共用，不跟随发起者的等级限流。"""
+    token = TIER.set("live")
+    try:
+        return await fn()
+    finally:
+        TIER.reset(token)
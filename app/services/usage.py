@@ -0,0 +1,266 @@
+# app/services/usage.py —— 按 key 计量（计费用）：请求里只加内存计数，后台定期批量 upsert
+"""
+计费（docs/PRICING*.md）要按 key 的请求数 / 字节数。每个请求写一次库太贵，所以：
+
+- 中间件（app/middlewares/usage.py）只在内存里累加 (key_id, route, status, day) → [requests, bytes]
+- 后台任务每 USAGE_FLUSH_SECONDS 秒把这段时间的增量一次性 upsert（requests = requests + 增量）
+- 关闭 worker 时（lifespan 退出）再刷一次；写库失败的增量并回内存，下次再写
+
+key 不落库，只存 key_id = sha256(key) 前 16 位十六进制；route 是路由模板（不是原始 path，基数可控）。
+存储：配置了 DATABASE_URL → Postgres 表 api_usage（migrations/20261019_api_usage.sql），否则本地 SQLite（USAGE_DB）。
+
+GET /v1/usage 读的就是这张聚合表（再加上本 worker 还没刷出去的增量）。
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.services import metrics
+
+SQLITE_PATH = os.getenv("USAGE_DB", "data/usage.db")
+FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "10"))
+
+Row = Tuple[str, str, str, int, int, int]  # (day, key_id, route, status, requests, bytes)
+
+FLUSHES = metrics.register(metrics.Counter(
+    "portpulse_usage_flushes", "Usage meter flushes by outcome", ("outcome",),
+))
+FLUSH_ROWS = metrics.register(metrics.Counter(
+    "portpulse_usage_flushed_rows", "Aggregated usage rows upserted",
+))
+
+
+def enabled() -> bool:
+    return os.getenv("DISABLE_USAGE_METERING", "").strip().lower() not in ("1", "true", "yes", "on")
+
+
+def key_id(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+# --------------------------------------------------------------------
+# Stores
+# --------------------------------------------------------------------
+class SqliteUsageStore:
+    """本地/单机用；多 worker 同时刷靠 SQLite 自身的文件锁（同 changes.SqliteChangeLog）。"""
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_usage ("
+                " day TEXT NOT NULL, key_id TEXT NOT NULL, route TEXT NOT NULL, status INTEGER NOT NULL,"
+                " requests INTEGER NOT NULL, bytes INTEGER NOT NULL,"
+                " PRIMARY KEY (key_id, day, route, status))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _upsert(self, rows: List[Row]) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO api_usage(day, key_id, route, status, requests, bytes) VALUES (?,?,?,?,?,?)"
+                " ON CONFLICT(key_id, day, route, status) DO UPDATE SET"
+                " requests = requests + excluded.requests, bytes = bytes + excluded.bytes",
+                rows,
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:  # BEGIN 本身失败（库被锁）时没有事务可回滚，别把原异常盖掉
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _query(self, kid: str, since: str) -> List[Row]:
+        conn = self._connect()
+        try:
+            return [tuple(r) for r in conn.execute(
+                "SELECT day, key_id, route, status, requests, bytes FROM api_usage"
+                " WHERE key_id = ? AND day >= ? ORDER BY day, route, status",
+                (kid, since),
+            ).fetchall()]
+        finally:
+            conn.close()
+
+    async def upsert(self, rows: List[Row]) -> None:
+        await asyncio.to_thread(self._upsert, rows)
+
+    async def query(self, kid: str, since: str) -> List[Row]:
+        return await asyncio.to_thread(self._query, kid, since)
+
+
+class PostgresUsageStore:
+    """生产用：api_usage（migrations/20261019_api_usage.sql）；一次刷新 = 一条 executemany + 一个事务。"""
+
+    async def upsert(self, rows: List[Row]) -> None:
+        from app.services.deps import require_db_pool
+        pool = await require_db_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany(
+                    "INSERT INTO api_usage(day, key_id, route, status, requests, bytes)"
+                    " VALUES ($1::date, $2, $3, $4, $5, $6)"
+                    " ON CONFLICT (key_id, day, route, status) DO UPDATE SET"
+                    " requests = api_usage.requests + excluded.requests,"
+                    " bytes = api_usage.bytes + excluded.bytes",
+                    rows,
+                )
+
+    async def query(self, kid: str, since: str) -> List[Row]:
+        from app.services.deps import require_db_pool
+        pool = await require_db_pool()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT day::text AS day, key_id, route, status, requests, bytes FROM api_usage"
+                " WHERE key_id = $1 AND day >= $2::date ORDER BY day, route, status",
+                kid, since,
+            )
+        return [(r["day"], r["key_id"], r["route"], r["status"], r["requests"], r["bytes"]) for r in rows]
+
+
+_STORE = None
+
+
+def get_store():
+    """DATABASE_URL → Postgres；否则 SQLite（USAGE_DB）。测试可替换 usage._STORE。"""
+    global _STORE
+    if _STORE is None:
+        if os.getenv("DATABASE_URL") or os.getenv("DB_DSN"):
+            _STORE = PostgresUsageStore()
+        else:
+            _STORE = SqliteUsageStore(SQLITE_PATH)
+    return _STORE
+
+
+# --------------------------------------------------------------------
+# 内存计数
+# --------------------------------------------------------------------
+class Meter:
+    """每个 worker 一个（单事件循环，无锁）。"""
+
+    def __init__(self):
+        self.pending: Dict[Tuple[str, str, str, int], List[int]] = {}
+
+    def record(self, key: str, route: str, status: int, nbytes: int) -> None:
+        k = (_today(), key_id(key), route, int(status))
+        row = self.pending.get(k)
+        if row is None:
+            self.pending[k] = [1, nbytes]
+        else:
+            row[0] += 1
+            row[1] += nbytes
+
+    def _merge(self, rows: List[Row]) -> None:
+        for day, kid, route, status, n, b in rows:
+            row = self.pending.setdefault((day, kid, route, status), [0, 0])
+            row[0] += n
+            row[1] += b
+
+    async def flush(self) -> int:
+        """把累计的增量写进存储；失败或被取消时并回内存（不丢计数）。返回写出的行数。"""
+        if not self.pending:
+            return 0
+        batch, self.pending = self.pending, {}
+        rows = [(*k, n, b) for k, (n, b) in batch.items()]
+        write = asyncio.ensure_future(get_store().upsert(rows))
+        cancelled = False
+        try:
+            await asyncio.shield(write)
+        except asyncio.CancelledError:
+            # 关闭时取消了刷新任务：写入已经发出（SQLite 在线程里停不下来），等它有结果再决定并不并回——
+            # 直接并回的话，写成功的这批会被最后一次刷新再记一遍
+            cancelled = True
+            try:
+                await write
+            except BaseException:
+                pass
+        except Exception:
+            pass
+        ok = write.done() and not write.cancelled() and write.exception() is None
+        if ok:
+            FLUSHES.inc("ok")
+            FLUSH_ROWS.inc(amount=len(rows))
+        else:
+            self._merge(rows)
+            FLUSHES.inc("error")
+        if cancelled:
+            raise asyncio.CancelledError
+        return len(rows) if ok else 0
+
+    def unflushed(self, kid: str, since: str) -> List[Row]:
+        return [(*k, n, b) for k, (n, b) in self.pending.items() if k[1] == kid and k[0] >= since]
+
+
+METER = Meter()
+
+
+async def _flush_loop(meter: Meter) -> None:
+    try:
+        while True:
+            await asyncio.sleep(FLUSH_SECONDS)
+            await meter.flush()
+    finally:
+        # worker 关闭（cancel）：最后再刷一次；shield 住，stop() 的等待再被取消也写得完
+        await asyncio.shield(meter.flush())
+
+
+def start() -> Optional[asyncio.Task]:
+    """应用启动时调用；返回后台 Task（关闭时交给 stop）。"""
+    if not enabled():
+        return None
+    return asyncio.ensure_future(_flush_loop(METER))
+
+
+async def stop(task: Optional[asyncio.Task]) -> None:
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+
+
+# --------------------------------------------------------------------
+# /v1/usage
+# --------------------------------------------------------------------
+async def report(key: str, days: int) -> dict:
+    """某个 key 最近 days 天（UTC，含今天）的用量：按天、按路由/状态码、合计。"""
+    kid = key_id(key)
+    since = (date.fromisoformat(_today()) - timedelta(days=days - 1)).isoformat()
+    agg: Dict[Tuple[str, str, int], List[int]] = {}
+    for day, _, route, status, n, b in [*await get_store().query(kid, since), *METER.unflushed(kid, since)]:
+        row = agg.setdefault((day, route, int(status)), [0, 0])
+        row[0] += n
+        row[1] += b
+
+    by_day: Dict[str, List[int]] = {}
+    by_route: Dict[Tuple[str, int], List[int]] = {}
+    for (day, route, status), (n, b) in agg.items():
+        for acc, k in ((by_day, day), (by_route, (route, status))):
+            row = acc.setdefault(k, [0, 0])
+            row[0] += n
+            row[1] += b
+    return {
+        "key_id": kid,
+        "since": since,
+        "days": [{"date": d, "requests": n, "bytes": b} for d, (n, b) in sorted(by_day.items())],
+        "routes": [{"route": r, "status": s, "requests": n, "bytes": b} for (r, s), (n, b) in sorted(by_route.items())],
+        "total": {"requests": sum(n for n, _ in by_day.values()), "bytes": sum(b for _, b in by_day.values())},
+    }
@@ -0,0 +1,179 @@
+# app/services/warmup.py —— 启动预热：Core30 港口的序列 / 热点响应 / 压缩变体，预热完成前 /v1/ready = 503
+"""
+每次发布后，各港口的第一批请求都要走冷路径：读派生文件 / DB 首查 / 序列化 / 压缩，p95 随滚动发布抖一下。
+启动后在后台把热点先走一遍：
+
+1. PortDataRepository.series(trend / dwell)：每港口全量序列进缓存（与路由同一个仓库）
+2. 热点 URL（WARM_PATHS）在进程内直接打一遍 路由 + 压缩中间件：序列化、ETag 摘要、
+   gzip / br / zstd 变体都进各自的缓存（不经过鉴权/限流/指标中间件，不算真实流量）
+
+港口：WARMUP_PORTS 为空 → Core30（admin_backfill._core30，同 CORE30_PORTS）；
+      逗号列表 → 就用这些；*.yaml / *.yml 路径 → 读其中的 unlocode（如 ports_p1.yaml）。
+并发上限 WARMUP_CONCURRENCY；总时长上限 WARMUP_TIMEOUT 秒（超时也放行 ready，不让发布卡死）。
+
+/v1/ready 给负载均衡 / k8s readinessProbe 用；/v1/health 仍是永远 200 的存活探针。
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from app.services import compression, metrics, port_data
+
+CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "8"))
+TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "60"))
+
+# (路径模板, 查询串)：与看板/客户最常见的请求一致
+WARM_PATHS = (
+    ("/v1/ports/{u}/trend", "days=7"),
+    ("/v1/ports/{u}/trend", "days=30"),
+    ("/v1/ports/{u}/trend", "days=30&format=csv"),
+    ("/v1/ports/{u}/dwell", ""),
+    ("/v1/ports/{u}/overview", ""),
+    ("/v1/ports/{u}/alerts", ""),
+)
+
+WARMED = metrics.register(metrics.Counter(
+    "portpulse_warmup_requests", "Startup warmup requests by outcome", ("outcome",),
+))
+
+_UNLOCODE_RE = re.compile(r"unlocode:\s*['\"]?([A-Z0-9]{5})")
+
+
+def enabled() -> bool:
+    return os.getenv("DISABLE_WARMUP", "").strip().lower() not in ("1", "true", "yes", "on")
+
+
+def warm_ports() -> List[str]:
+    spec = os.getenv("WARMUP_PORTS", "").strip()
+    if not spec:
+        from app.routers.admin_backfill import _core30
+        return list(_core30())
+    if spec.endswith((".yaml", ".yml")):
+        try:
+            text = Path(spec).read_text(encoding="utf-8")
+        except OSError:
+            return []
+        # 只要 unlocode 一列：正则即可，不为启动引入 yaml 依赖
+        return list(dict.fromkeys(_UNLOCODE_RE.findall(text)))
+    return [p.strip().upper() for p in spec.split(",") if p.strip()]
+
+
+class _State:
+    def __init__(self):
+        self.ready = not enabled()
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.timed_out = False
+        self.started: Optional[float] = None
+        self.seconds: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready, "warmed": self.done, "failed": self.failed, "total": self.total,
+            "timed_out": self.timed_out, "seconds": self.seconds,
+        }
+
+
+STATE = _State()
+
+
+def status() -> dict:
+    return STATE.as_dict()
+
+
+async def _get(asgi, app, path: str, query: str, encoding: str) -> int:
+    """进程内直接调一次 ASGI；返回状态码。"""
+    status = 0
+    headers = [(b"host", b"warmup"), (b"accept-encoding", encoding.encode("ascii"))]
+    demo = os.getenv("NEXT_PUBLIC_DEMO_API_KEY")
+    if demo:
+        headers.append((b"x-api-key", demo.encode("utf-8")))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode("utf-8"), "root_path": "", "query_string": query.encode("ascii"),
+        "headers": headers, "client": ("127.0.0.1", 0), "server": ("warmup", 80), "app": app,
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await asgi(scope, receive, send)
+    return status
+
+
+async def _warm(asgi, app, path: str, query: str, encoding: str) -> None:
+    """预热一个 URL；非 2xx / 304（路由报错、港口不存在…）算失败，而不是“预热过了”。"""
+    status = await _get(asgi, app, path, query, encoding)
+    if not (200 <= status < 300 or status == 304):
+        raise RuntimeError(f"warmup {path}?{query}: HTTP {status}")
+
+
+def _inner_stack(app):
+    """路由 + 框架内层（异常处理 / AsyncExitStack）+ 压缩中间件：
+    绕开鉴权 / 限流 / 指标等外层中间件，预热不算流量。"""
+    from fastapi.middleware.asyncexitstack import AsyncExitStackMiddleware
+    from starlette.middleware.exceptions import ExceptionMiddleware
+
+    from app.middlewares.compression import CompressionMiddleware
+
+    handlers = {k: v for k, v in app.exception_handlers.items() if k not in (500, Exception)}
+    return CompressionMiddleware(ExceptionMiddleware(AsyncExitStackMiddleware(app.router), handlers=handlers))
+
+
+async def run(app, ports: Optional[Sequence[str]] = None) -> dict:
+    """预热一遍；完成（或超时）后 STATE.ready = True。"""
+    ports = [p.upper() for p in (ports if ports is not None else warm_ports())]
+    repo = port_data.get_repository()
+    asgi = _inner_stack(app)
+    encodings = ["identity", *compression.CODECS]
+    STATE.ready, STATE.timed_out, STATE.done, STATE.failed = False, False, 0, 0
+    STATE.total = len(ports) * (2 + len(WARM_PATHS) * len(encodings))
+    STATE.started = time.monotonic()
+    sem = asyncio.Semaphore(max(1, CONCURRENCY))
+
+    async def one(fn):
+        async with sem:
+            try:
+                await fn()
+                WARMED.inc("ok")
+            except Exception:
+                STATE.failed += 1
+                WARMED.inc("error")
+            STATE.done += 1
+
+    async def port_jobs(u: str):
+        # 先把两条序列放进缓存，之后的 URL 都是缓存命中
+        await asyncio.gather(*(one(lambda k=k: repo.series(k, u)) for k in ("trend", "dwell")))
+        await asyncio.gather(*(
+            one(lambda p=p, q=q, e=e: _warm(asgi, app, p.format(u=u), q, e))
+            for p, q in WARM_PATHS for e in encodings
+        ))
+
+    try:
+        await asyncio.wait_for(asyncio.gather(*(port_jobs(u) for u in ports)), TIMEOUT)
+    except asyncio.TimeoutError:
+        STATE.timed_out = True
+    finally:
+        STATE.seconds = round(time.monotonic() - STATE.started, 3)
+        STATE.ready = True
+    return status()
+
+
+def start(app) -> Optional[asyncio.Task]:
+    """应用启动时调用：后台预热（不阻塞监听端口，/v1/health 立刻可用）。"""
+    if not enabled():
+        STATE.ready = True
+        return None
+    STATE.ready = False
+    return asyncio.ensure_future(run(app))
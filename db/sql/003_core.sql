@@ -19,6 +19,8 @@ CREATE TABLE IF NOT EXISTS port_snapshots (
   congestion_score DOUBLE PRECISION,
   src TEXT DEFAULT 'prod'
 );
+-- 入库时间（migrations/20250822 的覆盖索引 INCLUDE 了它；老库已有该列）
+ALTER TABLE port_snapshots ADD COLUMN IF NOT EXISTS src_loaded_at TIMESTAMPTZ DEFAULT now();
 -- 去重与加速
 CREATE UNIQUE INDEX IF NOT EXISTS ux_snap_unloc_ts ON port_snapshots(unlocode, snapshot_ts);
 CREATE INDEX IF NOT EXISTS ix_snap_unloc_ts_desc ON port_snapshots(unlocode, snapshot_ts DESC);
@@ -1,5 +1,20 @@
 import os, requests
 
+
+def _read_table(content, fmt="arrow"):
+    """bytes -> pyarrow.Table; the IPC stream is read zero-copy from the response buffer."""
+    import pyarrow as pa
+    buf = pa.py_buffer(content)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(pa.BufferReader(buf))
+    return pa.ipc.open_stream(buf).read_all()
+
+
+def _to_df(table):
+    # split_blocks + self_destruct: no consolidation copy, Arrow buffers freed as columns convert
+    return table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
+
 class PortPulseClient:
     def __init__(self, base_url="https://api.useportpulse.com", api_key=None, timeout=15):
         self.base = base_url.rstrip("/")
@@ -24,3 +39,23 @@ class PortPulseClient:
                        params={"days": days, "format": "csv"},
                        headers=headers, timeout=10)
         return r.status_code, r.text, r.headers.get("etag")
+
+    # --- Arrow / Parquet (pip install pyarrow pandas) ---
+    def trend_table(self, unlocode, days=7, fields=None, format="arrow"):
+        params = {"days": days, "format": format}
+        if fields: params["fields"] = fields
+        r = self.s.get(f"{self.base}/v1/ports/{unlocode}/trend", params=params, timeout=10)
+        r.raise_for_status()
+        return _read_table(r.content, format)
+
+    def trend_df(self, unlocode, days=7, fields=None, format="arrow"):
+        return _to_df(self.trend_table(unlocode, days, fields, format))
+
+    def dwell_table(self, unlocode, days=14, format="arrow"):
+        r = self.s.get(f"{self.base}/v1/ports/{unlocode}/dwell",
+                       params={"days": days, "format": format}, timeout=10)
+        r.raise_for_status()
+        return _read_table(r.content, format)
+
+    def dwell_df(self, unlocode, days=14, format="arrow"):
+        return _to_df(self.dwell_table(unlocode, days, format))
@@ -0,0 +1,292 @@
+# etl/sharding.py —— ETL 分片：一致性哈希 + 成员租约（Postgres / SQLite）
+"""
+把港口（或任意作业 key）按一致性哈希分配给多个 ETL worker。
+
+- 成员表：每个 worker 定期续租（lease_expires_at = now + ttl）；租约过期即视为下线
+- 哈希环：只由“存活成员”构成，成员增减时只有受影响的那一段 key 会迁移
+- 未配置 ETL_SHARD_DSN 时完全旁路：my_shard(keys) 原样返回（单进程行为不变）
+- 成员只在进程存活期间在环上：一次性作业（cron 脚本）在 my_shard 里入环、后台续租，进程退出时离开；
+  否则每次运行的 <hostname>-<pid> 都会留在环上占着一段 key，后面的运行就会漏掉这些 key
+- 入环后先等成员集合稳定（settle）再分 key：cron 同时拉起的几个作业各自入环有先后，
+  先到的那个若立刻按“只有自己”的环过滤，就会拿走全部 key，和后到的重复执行；
+  环取 settle 期间见过的全部成员（同批里先做完、已离环的那个的份不再重做）
+
+环境变量：
+  ETL_SHARD_DSN            postgres://... 或 sqlite:///path/to/etl_workers.db（或直接给文件路径）
+  ETL_WORKER_ID            worker 标识；默认 <hostname>-<pid>
+  ETL_SHARD_LEASE_SECONDS  租约时长（存活期间每 1/3 续一次）；进程被 kill -9 时它那段 key 最多空缺这么久
+  ETL_SHARD_VNODES         每个成员的虚拟节点数（越大越均匀）
+  ETL_SHARD_SETTLE_SECONDS 一次性作业入环后，相隔这么久的一次读取里不再有新成员才开始分 key（最多等一个租约）；
+                           同时拉起的作业启动先后差应小于它
+"""
+from __future__ import annotations
+
+import atexit
+import bisect
+import hashlib
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+DSN = os.getenv("ETL_SHARD_DSN", "").strip()
+LEASE_SECONDS = int(os.getenv("ETL_SHARD_LEASE_SECONDS", "120"))
+VNODES = int(os.getenv("ETL_SHARD_VNODES", "64"))
+SETTLE_SECONDS = float(os.getenv("ETL_SHARD_SETTLE_SECONDS", "5"))
+PORTS_FILE = Path(os.getenv("PORTS_FILE", "ports_p1.yaml"))
+
+
+def _hash(s: str) -> int:
+    # 稳定哈希（不能用内置 hash：有进程级随机盐）
+    return int.from_bytes(hashlib.sha1(s.encode("utf-8")).digest()[:8], "big")
+
+
+def current_worker_id() -> str:
+    wid = os.getenv("ETL_WORKER_ID", "").strip()
+    return wid or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def p1_ports(path: Path = PORTS_FILE) -> List[str]:
+    """ports_p1.yaml 里的 UNLOCODE 列表（与 scripts/ 下的解析方式一致）。"""
+    return re.findall(r"unlocode:\s*([A-Z]{5})", path.read_text(encoding="utf-8"))
+
+
+# --------------------------------------------------------------------
+# Hash ring
+# --------------------------------------------------------------------
+class HashRing:
+    """一致性哈希环；每个成员放 `vnodes` 个虚拟节点。"""
+
+    def __init__(self, members: Iterable[str], vnodes: int = VNODES):
+        self.vnodes = max(1, vnodes)
+        self.members = sorted(set(members))
+        points = []
+        for m in self.members:
+            for i in range(self.vnodes):
+                points.append((_hash(f"{m}#{i}"), m))
+        points.sort()
+        self._hashes = [h for h, _ in points]
+        self._owners = [m for _, m in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        i = bisect.bisect_right(self._hashes, _hash(key))
+        return self._owners[i % len(self._owners)]
+
+    def assign(self, keys: Iterable[str]) -> dict:
+        out: dict = {m: [] for m in self.members}
+        for k in keys:
+            o = self.owner(k)
+            if o is not None:
+                out[o].append(k)
+        return out
+
+
+# --------------------------------------------------------------------
+# Membership backends
+# --------------------------------------------------------------------
+class SqliteMembership:
+    """本地/测试用成员表；跨进程互斥依赖 SQLite 自身的文件锁。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS etl_workers ("
+                " worker_id TEXT PRIMARY KEY,"
+                " lease_expires_at REAL NOT NULL,"
+                " heartbeat_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def renew(self, worker_id: str, ttl: int, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO etl_workers(worker_id, lease_expires_at, heartbeat_at) VALUES (?,?,?)"
+                " ON CONFLICT(worker_id) DO UPDATE SET"
+                " lease_expires_at=excluded.lease_expires_at, heartbeat_at=excluded.heartbeat_at",
+                (worker_id, now + ttl, now),
+            )
+
+    def leave(self, worker_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM etl_workers WHERE worker_id = ?", (worker_id,))
+
+    def alive(self, now: Optional[float] = None) -> List[str]:
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT worker_id FROM etl_workers WHERE lease_expires_at > ? ORDER BY worker_id",
+                (now,),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+
+class PostgresMembership:
+    """生产用成员表（见 migrations/20261019_etl_workers.sql）。"""
+
+    def __init__(self, dsn: str):
+        import psycopg  # 仅在分片启用时需要
+
+        self._psycopg = psycopg
+        self.dsn = dsn
+        with self._psycopg.connect(self.dsn) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS etl_workers ("
+                " worker_id TEXT PRIMARY KEY,"
+                " lease_expires_at TIMESTAMPTZ NOT NULL,"
+                " heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            )
+
+    def renew(self, worker_id: str, ttl: int) -> None:
+        with self._psycopg.connect(self.dsn) as conn:
+            conn.execute(
+                "INSERT INTO etl_workers(worker_id, lease_expires_at, heartbeat_at)"
+                " VALUES (%s, now() + make_interval(secs => %s), now())"
+                " ON CONFLICT (worker_id) DO UPDATE SET"
+                " lease_expires_at = excluded.lease_expires_at, heartbeat_at = excluded.heartbeat_at",
+                (worker_id, ttl),
+            )
+
+    def leave(self, worker_id: str) -> None:
+        with self._psycopg.connect(self.dsn) as conn:
+            conn.execute("DELETE FROM etl_workers WHERE worker_id = %s", (worker_id,))
+
+    def alive(self) -> List[str]:
+        with self._psycopg.connect(self.dsn) as conn:
+            rows = conn.execute(
+                "SELECT worker_id FROM etl_workers WHERE lease_expires_at > now() ORDER BY worker_id"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+
+def membership_from_dsn(dsn: str):
+    if dsn.startswith(("postgres://", "postgresql://")):
+        return PostgresMembership(dsn)
+    if dsn.startswith("sqlite:///"):
+        dsn = dsn[len("sqlite:///"):]
+    return SqliteMembership(dsn)
+
+
+# --------------------------------------------------------------------
+# Worker view
+# --------------------------------------------------------------------
+class ShardWorker:
+    """
+    当前 worker 的分片视图：
+      - join():   续租并刷新哈希环
+      - owns():   key 是否归我
+      - 作为 context manager 使用时，后台线程每 ttl/3 续租一次并刷新环
+        （长作业期间有 worker 死掉，它那一段会在下次刷新时自动转移过来）
+    """
+
+    def __init__(self, membership, worker_id: Optional[str] = None,
+                 ttl: int = LEASE_SECONDS, vnodes: int = VNODES):
+        self.membership = membership
+        self.worker_id = worker_id or current_worker_id()
+        self.ttl = max(1, ttl)
+        self.vnodes = vnodes
+        self.ring = HashRing([self.worker_id], vnodes)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def join(self) -> "ShardWorker":
+        self.membership.renew(self.worker_id, self.ttl)
+        self.refresh()
+        return self
+
+    def refresh(self) -> HashRing:
+        members = set(self.membership.alive())
+        members.add(self.worker_id)  # 自己刚续过租，防御时钟偏差
+        if set(self.ring.members) != members:
+            self.ring = HashRing(members, self.vnodes)
+        return self.ring
+
+    def settle(self, interval: float, max_wait: float) -> HashRing:
+        """入环后、第一次分 key 前调用：等到相隔 interval 的一次读取里不再出现新成员（最多等 max_wait 秒）。
+
+        环取这段时间里见过的全部成员：同批里跑得快的作业做完自己那份就离环了，
+        不能因为它走了就把它那份再做一遍。
+        """
+        deadline = time.monotonic() + max_wait
+        seen = set(self.refresh().members)
+        while interval > 0 and time.monotonic() < deadline:
+            time.sleep(interval)
+            cur = set(self.refresh().members)
+            if cur <= seen:
+                break
+            seen |= cur
+        if set(self.ring.members) != seen:
+            self.ring = HashRing(seen, self.vnodes)
+        return self.ring
+
+    def leave(self) -> None:
+        self.membership.leave(self.worker_id)
+
+    def owns(self, key: str) -> bool:
+        return self.ring.owner(key) == self.worker_id
+
+    def filter(self, keys: Sequence[str]) -> List[str]:
+        return [k for k in keys if self.owns(k)]
+
+    def _renew_loop(self) -> None:
+        while not self._stop.wait(self.ttl / 3.0):
+            try:
+                self.join()
+            except Exception:
+                # 续租失败不打断作业；租约到期后其他 worker 会接管
+                pass
+
+    def __enter__(self) -> "ShardWorker":
+        self.join()
+        self._thread = threading.Thread(target=self._renew_loop, name="etl-shard-lease", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        try:
+            self.leave()  # 正常退出就让出自己那段，不等租约过期
+        except Exception:
+            pass
+        return False
+
+
+def shard_worker(dsn: str = DSN) -> Optional[ShardWorker]:
+    """按 ETL_SHARD_DSN 构造 ShardWorker；未配置时返回 None（=不分片）。"""
+    if not dsn:
+        return None
+    return ShardWorker(membership_from_dsn(dsn))
+
+
+_ONE_SHOT: dict = {}
+
+
+def my_shard(keys: Sequence[str], dsn: str = DSN) -> List[str]:
+    """
+    一次性作业用：入环（后台续租）→ 等成员稳定（settle）→ 只返回归属本 worker 的 key。
+    成员资格保持到进程退出（atexit 离开），同一进程多次调用复用同一个成员（不再等待）。
+    未启用分片时原样返回全部 key。
+    """
+    if not dsn:
+        return list(keys)
+    worker = _ONE_SHOT.get(dsn)
+    if worker is None:
+        worker = shard_worker(dsn).__enter__()
+        _ONE_SHOT[dsn] = worker
+        atexit.register(worker.__exit__, None, None, None)
+        worker.settle(SETTLE_SECONDS, worker.ttl)
+    else:
+        worker.refresh()
+    return worker.filter(keys)
@@ -1,10 +1,28 @@
 """
 Minimal sample client for PortPulse API (for demos/tests).
 No external deps except 'requests'. MIT-like usage.
+The *_table / *_df methods additionally need 'pyarrow' (and 'pandas' for DataFrames).
 """
 from __future__ import annotations
 import os, typing as t, requests
 
+_MEDIA = {"arrow": "application/vnd.apache.arrow.stream", "parquet": "application/vnd.apache.parquet"}
+
+
+def _read_table(content: bytes, fmt: str = "arrow"):
+    """Response bytes -> pyarrow.Table. The IPC stream is read zero-copy from the response buffer."""
+    import pyarrow as pa
+    buf = pa.py_buffer(content)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(pa.BufferReader(buf))
+    return pa.ipc.open_stream(buf).read_all()
+
+
+def _to_df(table):
+    # split_blocks + self_destruct: skip pandas block consolidation, free Arrow buffers column by column
+    return table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
+
 class PortPulseClient:
     def __init__(self, api_key: str, base_url: str="https://api.useportpulse.com", timeout: int=15):
         self.base_url = base_url.rstrip("/")
@@ -41,3 +59,29 @@ class PortPulseClient:
             return 304, None, etag
         r.raise_for_status()
         return 200, r.text, r.headers.get("ETag")
+
+    # --- Arrow / Parquet: columnar download, no CSV/JSON parsing on the client ---
+    def _table(self, path: str, params: dict, fmt: str):
+        if fmt not in _MEDIA:
+            raise ValueError("format must be 'arrow' or 'parquet'")
+        r = self.session.get(f"{self.base_url}{path}", params={**params, "format": fmt},
+                             headers={"Accept": _MEDIA[fmt]}, timeout=self.timeout)
+        r.raise_for_status()
+        return _read_table(r.content, fmt)
+
+    def trend_table(self, unlocode: str, days: int = 7, fields: t.Optional[str] = None, format: str = "arrow"):
+        """pyarrow.Table with columns date, <fields>, src (schema metadata: unlocode/kind/source)."""
+        params: dict = {"days": days}
+        if fields:
+            params["fields"] = fields
+        return self._table(f"/v1/ports/{unlocode}/trend", params, format)
+
+    def trend_df(self, unlocode: str, days: int = 7, fields: t.Optional[str] = None, format: str = "arrow"):
+        """pandas.DataFrame via Arrow (date -> datetime64, src -> category)."""
+        return _to_df(self.trend_table(unlocode, days, fields, format))
+
+    def dwell_table(self, unlocode: str, days: int = 14, format: str = "arrow"):
+        return self._table(f"/v1/ports/{unlocode}/dwell", {"days": days}, format)
+
+    def dwell_df(self, unlocode: str, days: int = 14, format: str = "arrow"):
+        return _to_df(self.dwell_table(unlocode, days, format))
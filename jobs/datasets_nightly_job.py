@@ -0,0 +1,42 @@
+import argparse, asyncio, datetime as dt, sys
+
+from app.routers.ports import KNOWN_PORTS
+from app.services import datasets
+from etl.sharding import my_shard
+
+
+async def _build(day, ports, formats):
+    try:
+        return await datasets.build(day, ports, formats)
+    finally:
+        from app.services.deps import close_db_pool
+        await close_db_pool()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Nightly full-history dataset dump (/v1/datasets)")
+    ap.add_argument("--date", help="YYYY-MM-DD (default: today UTC)")
+    ap.add_argument("--formats", help="comma-separated: parquet,csv.gz (default: parquet if pyarrow + csv.gz)")
+    ap.add_argument("--ports", help="comma-separated UN/LOCODEs (default: all known ports)")
+    ap.add_argument("--keep", type=int, default=datasets.KEEP_DAYS, help="days to keep")
+    args = ap.parse_args(argv)
+
+    # 非港口维度作业：整个作业作为一个 key 落到某一个 worker 上
+    if not my_shard(["datasets_nightly"]):
+        print("SKIP datasets_nightly_job: not in my shard")
+        return 0
+
+    day = dt.date.fromisoformat(args.date) if args.date else dt.datetime.now(dt.timezone.utc).date()
+    ports = [p.strip().upper() for p in args.ports.split(",")] if args.ports else sorted(KNOWN_PORTS)
+    formats = [f.strip() for f in args.formats.split(",")] if args.formats else None
+
+    m = asyncio.run(_build(day, ports, formats))
+    removed = datasets.prune(args.keep)
+    total = sum(f["bytes"] for f in m["files"])
+    print(f"OK datasets_nightly_job {m['date']}: {len(m['files'])} files, {total / 1e6:.1f} MB, "
+          f"formats={','.join(m['formats'])}, pruned={removed}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,11 +2,16 @@ import os, datetime as dt
 import psycopg
 from dotenv import load_dotenv
 from etl.etl_port_lax import insert_snapshot
+from etl.sharding import my_shard
 
 load_dotenv()
 DB = os.getenv("DATABASE_URL")
 
 def run():
+    # 0) 多 worker 部署时只有 USLAX 的属主执行（ETL_SHARD_DSN 未配置则总是执行）
+    if not my_shard(["USLAX"]):
+        print("SKIP port_lax_job: USLAX not in my shard")
+        return
     # 1) 插入一条 USLAX 快照（mock）
     insert_snapshot("USLAX")
     # 2) 刷新物化视图，产出 congestion_score
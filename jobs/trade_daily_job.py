@@ -1,7 +1,12 @@
 import datetime as dt
 from etl.etl_uncomtrade import run
+from etl.sharding import my_shard
 
 if __name__ == "__main__":
+    # 非港口维度作业：整个作业作为一个 key 落到某一个 worker 上
+    if not my_shard(["trade_daily"]):
+        print("SKIP trade_daily_job: not in my shard")
+        raise SystemExit(0)
     today = dt.date.today()
     first_this_month = dt.date(today.year, today.month, 1)
     start = (first_this_month - dt.timedelta(days=365)).replace(day=1)
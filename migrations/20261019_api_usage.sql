@@ -0,0 +1,15 @@
+-- 按 key 计量（app/services/usage.py）：各 worker 每 USAGE_FLUSH_SECONDS 批量 upsert 增量
+-- key_id = sha256(api key) 前 16 位十六进制；route = 路由模板
+CREATE TABLE IF NOT EXISTS api_usage (
+  day      DATE    NOT NULL,
+  key_id   TEXT    NOT NULL,
+  route    TEXT    NOT NULL,
+  status   INTEGER NOT NULL,
+  requests BIGINT  NOT NULL DEFAULT 0,
+  bytes    BIGINT  NOT NULL DEFAULT 0,
+  PRIMARY KEY (key_id, day, route, status)
+);
+
+-- 月度账单：WHERE day >= date_trunc('month', now())
+CREATE INDEX IF NOT EXISTS idx_api_usage_day
+ON api_usage (day);
@@ -0,0 +1,10 @@
+-- ETL 分片成员表（etl/sharding.py）：每个 worker 定期续租，过期即视为下线
+CREATE TABLE IF NOT EXISTS etl_workers (
+  worker_id        TEXT PRIMARY KEY,
+  lease_expires_at TIMESTAMPTZ NOT NULL,
+  heartbeat_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- 读取存活成员：WHERE lease_expires_at > now()
+CREATE INDEX IF NOT EXISTS idx_etl_workers_lease
+ON etl_workers (lease_expires_at);
@@ -0,0 +1,82 @@
+-- 变更日志（app/services/changes.py → GET /v1/ports/changes?since=<cursor>）
+-- seq 单调递增；写入方（触发器 / changes.record）都先拿同一把事务级 advisory lock，
+-- 保证 seq 的分配顺序 = 提交顺序，读者按 seq > cursor 翻页不会漏行
+CREATE TABLE IF NOT EXISTS port_changes (
+  seq        BIGSERIAL PRIMARY KEY,
+  kind       TEXT NOT NULL,              -- trend / dwell
+  unlocode   TEXT NOT NULL,
+  date       DATE NOT NULL,
+  metrics    JSONB NOT NULL,
+  src        TEXT,
+  changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- 全量同步走主键（seq > $1 ORDER BY seq LIMIT n）；单港口同步走这个
+CREATE INDEX IF NOT EXISTS ix_port_changes_unloc_seq
+ON port_changes (unlocode, seq);
+
+-- 文件类入库（覆盖 / 派生）的内容摘要：只有数值真变了才追加变更
+CREATE TABLE IF NOT EXISTS port_change_state (
+  origin   TEXT NOT NULL,                -- override / derived
+  kind     TEXT NOT NULL,
+  unlocode TEXT NOT NULL,
+  date     DATE NOT NULL,
+  digest   TEXT NOT NULL,
+  PRIMARY KEY (origin, kind, unlocode, date)
+);
+
+-- DB 入库：port_snapshots 只记“当天最新一条快照”（与 SQL_TREND_DAILY 的口径一致，按 UTC 日）
+CREATE OR REPLACE FUNCTION port_changes_from_snapshot()
+RETURNS trigger LANGUAGE plpgsql AS
+$$
+BEGIN
+  IF TG_OP = 'UPDATE'
+     AND (OLD.snapshot_ts, OLD.vessels, OLD.avg_wait_hours, OLD.congestion_score, OLD.src)
+         IS NOT DISTINCT FROM
+         (NEW.snapshot_ts, NEW.vessels, NEW.avg_wait_hours, NEW.congestion_score, NEW.src) THEN
+    RETURN NULL;
+  END IF;
+  -- 同一天已有更晚的快照：对外数值不变（走 ix_snap_unloc_ts_desc 的范围扫描）
+  IF EXISTS (
+    SELECT 1 FROM port_snapshots s
+    WHERE s.unlocode = NEW.unlocode
+      AND s.snapshot_ts > NEW.snapshot_ts
+      AND s.snapshot_ts < (date_trunc('day', NEW.snapshot_ts AT TIME ZONE 'UTC') + interval '1 day') AT TIME ZONE 'UTC'
+  ) THEN
+    RETURN NULL;
+  END IF;
+  PERFORM pg_advisory_xact_lock(hashtext('port_changes'));
+  INSERT INTO port_changes (kind, unlocode, date, metrics, src)
+  VALUES ('trend', NEW.unlocode, (NEW.snapshot_ts AT TIME ZONE 'UTC')::date,
+          jsonb_build_object('vessels', NEW.vessels,
+                             'avg_wait_hours', NEW.avg_wait_hours,
+                             'congestion_score', NEW.congestion_score),
+          NEW.src);
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_port_snapshots_changes ON port_snapshots;
+CREATE TRIGGER trg_port_snapshots_changes
+AFTER INSERT OR UPDATE ON port_snapshots
+FOR EACH ROW EXECUTE FUNCTION port_changes_from_snapshot();
+
+CREATE OR REPLACE FUNCTION port_changes_from_dwell()
+RETURNS trigger LANGUAGE plpgsql AS
+$$
+BEGIN
+  IF TG_OP = 'UPDATE'
+     AND (OLD.dwell_hours, OLD.src) IS NOT DISTINCT FROM (NEW.dwell_hours, NEW.src) THEN
+    RETURN NULL;
+  END IF;
+  PERFORM pg_advisory_xact_lock(hashtext('port_changes'));
+  INSERT INTO port_changes (kind, unlocode, date, metrics, src)
+  VALUES ('dwell', NEW.unlocode, NEW.date, jsonb_build_object('dwell_hours', NEW.dwell_hours), NEW.src);
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_port_dwell_changes ON port_dwell;
+CREATE TRIGGER trg_port_dwell_changes
+AFTER INSERT OR UPDATE ON port_dwell
+FOR EACH ROW EXECUTE FUNCTION port_changes_from_dwell();
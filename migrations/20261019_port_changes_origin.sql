@@ -0,0 +1,4 @@
+-- 变更日志按层打标（app/services/changes.py）：override / db / derived
+-- 同一 (kind, unlocode, date) 各层可能都有行，客户端按 API 的分层口径取值（changes.resolve，docs/EXAMPLES.md）
+-- 触发器写入的行走默认值 'db'；changes.record 显式写 override / derived
+ALTER TABLE port_changes ADD COLUMN IF NOT EXISTS origin TEXT NOT NULL DEFAULT 'db';
@@ -0,0 +1,20 @@
+-- 跨 worker 缓存失效（app/services/invalidation.py LISTEN port_data_invalidate）
+-- port_changes 的所有写入（port_snapshots / port_dwell 触发器、PostgresChangeLog.record）都经过这里；
+-- 语句级 + 过渡表：一次批量入库每个 (port, kind) 只发一条通知，version = 该批最大 seq。
+-- NOTIFY 在事务提交时才投递，回滚的写入不会让缓存白白失效
+CREATE OR REPLACE FUNCTION port_changes_notify()
+RETURNS trigger LANGUAGE plpgsql AS
+$$
+BEGIN
+  PERFORM pg_notify('port_data_invalidate',
+                    json_build_object('port', unlocode, 'dataset', kind, 'version', max_seq)::text)
+  FROM (SELECT unlocode, kind, max(seq) AS max_seq FROM new_rows GROUP BY unlocode, kind) t;
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_port_changes_notify ON port_changes;
+CREATE TRIGGER trg_port_changes_notify
+AFTER INSERT ON port_changes
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION port_changes_notify();
@@ -18,11 +18,24 @@ for p in pathlib.Path("data/port_calls").glob("*.csv"):
             if not u or dh is None: continue
             d=datetime.datetime.fromisoformat(row["arrived_utc"].replace("Z","+00:00")).date().isoformat()
             daily[u][d].append(dh)
+# 多 worker 分片：只写归属本 worker 的港口（未配置 ETL_SHARD_DSN 时为全部）
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from etl.sharding import my_shard
+from app.services import changes
+mine=set(my_shard(sorted(daily)))
 outdir=pathlib.Path("data/derived/dwell"); outdir.mkdir(parents=True, exist_ok=True)
+written=[]
 for u, days in daily.items():
+    if u not in mine: continue
     pts=[]
     for d, vals in sorted(days.items()):
         pts.append({"date":d, "dwell_hours": round(statistics.median(vals),2), "src": src})
     with open(outdir/f"{u}.json","w",encoding="utf-8") as f:
         json.dump({"unlocode":u,"points":pts}, f, ensure_ascii=False)
+    written.append(("dwell", u, pts))
     print(f"Wrote {outdir}/{u}.json ({len(pts)} pts)")
+# 变更日志（/v1/ports/changes）：只追加数值真变了的点；失败不影响本次产出，下次运行会补记
+try:
+    print(f"changes={changes.record_batch(written, origin='derived')}")
+except Exception as e:
+    print(f"[warn] change log: {e}")
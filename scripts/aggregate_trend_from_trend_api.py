@@ -3,6 +3,11 @@ import os, re, json, urllib.request, datetime, pathlib, sys
 
 BASE = os.environ.get("BASE", "https://api.useportpulse.com")
 ports = re.findall(r'unlocode:\s*([A-Z]{5})', open("ports_p1.yaml", encoding="utf-8").read())
+# 多 worker 分片：只跑归属本 worker 的港口（未配置 ETL_SHARD_DSN 时为全部）
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from etl.sharding import my_shard
+from app.services import changes
+ports = my_shard(ports)
 outdir = pathlib.Path("data/derived/trend"); outdir.mkdir(parents=True, exist_ok=True)
 
 now_dt = datetime.datetime.now(datetime.timezone.utc)
@@ -10,9 +15,10 @@ now_iso = now_dt.isoformat()
 today   = now_dt.date()
 
 ok = miss = 0
+written = []
 for u in ports:
     try:
-        with urllib.request.urlopen(f"{BASE}/v1/ports/{u}/trend?days=30", timeout=30) as r:
+        with urllib.request.urlopen(f"{BASE}/v1/ports/{u}/trend?days=30&fields=vessels,avg_wait_hours,congestion_score", timeout=30) as r:
             resp = json.load(r)
     except Exception as e:
         print(f"[skip] {u}: {e}")
@@ -50,6 +56,12 @@ for u in ports:
 
     path = outdir / f"{u}.json"
     path.write_text(json.dumps(out, ensure_ascii=False), encoding="utf-8")
+    written.append(("trend", u, out["points"]))
     ok += 1
 
-print(f"wrote={ok} miss={miss}")
+# 变更日志（/v1/ports/changes）：只追加数值真变了的点；失败不影响本次产出，下次运行会补记
+try:
+    recorded = changes.record_batch(written, origin="derived")
+except Exception as e:
+    recorded = f"error: {e}"
+print(f"wrote={ok} miss={miss} changes={recorded}")
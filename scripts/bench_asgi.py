@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+进程内压测：直接驱动 app.main.create_app()，不打线上 api.useportpulse.com。
+
+- transport=asgi     httpx.ASGITransport，纯进程内（测我们自己的代码路径）
+- transport=uvicorn  本机起 uvicorn 子进程，走真实 TCP/HTTP 解析
+- 混合负载：trend/overview（JSON/CSV）、alerts、meta、HEAD、带 If-None-Match 的 304 重验证
+- 输出每个场景的 RPS 与 p50/p95/p99；与 scripts/bench_baselines.json 比较，退化或超过 SLA 即退出码 1
+
+用法：
+  python scripts/bench_asgi.py --transport asgi --duration 10 --concurrency 16
+  python scripts/bench_asgi.py --transport uvicorn --update-baseline   # 在参考机器上刷新基线
+"""
+import argparse, asyncio, json, os, pathlib, random, socket, subprocess, sys, time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DISABLE_RATELIMIT", "1")
+
+import httpx  # noqa: E402
+
+BASELINES = ROOT / "scripts" / "bench_baselines.json"
+KEY = {"X-API-Key": os.getenv("BENCH_API_KEY", "dev_demo_123")}
+PORTS = ["USLAX", "USLGB", "USNYC", "USSAV", "NLRTM", "DEHAM", "CNSHA", "SGSIN", "KRPUS", "BEANR"]
+
+# 场景：(名称, 权重, 方法, URL 模板, 是否做 304 重验证)
+SCENARIOS = [
+    ("trend_json",       30, "GET",  "/v1/ports/{u}/trend?days=30",              False),
+    ("trend_csv",        15, "GET",  "/v1/ports/{u}/trend?days=30&format=csv",   False),
+    ("trend_csv_304",    10, "GET",  "/v1/ports/{u}/trend?days=30&format=csv",   True),
+    ("overview_json",    15, "GET",  "/v1/ports/{u}/overview",                   False),
+    ("overview_csv",      5, "GET",  "/v1/ports/{u}/overview?format=csv",        False),
+    ("alerts",           15, "GET",  "/v1/ports/{u}/alerts?window=14d",          False),
+    ("alerts_304",        5, "GET",  "/v1/ports/{u}/alerts?window=14d",          True),
+    ("meta_sources",      3, "GET",  "/v1/meta/sources",                         False),
+    ("head_trend_csv",    2, "HEAD", "/v1/ports/{u}/trend?days=30&format=csv",   False),
+]
+
+
+def _pct(xs, q):
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))]
+
+
+async def _one(client, scen, etags, results):
+    name, _, method, tmpl, revalidate = scen
+    url = tmpl.format(u=random.choice(PORTS))
+    hdrs = dict(KEY)
+    if revalidate:
+        et = etags.get(url)
+        if et is None:
+            r = await client.get(url, headers=hdrs)
+            et = etags[url] = r.headers.get("etag")
+        if et:
+            hdrs["If-None-Match"] = et
+    t0 = time.perf_counter()
+    r = await client.request(method, url, headers=hdrs)
+    _ = r.content
+    dt = time.perf_counter() - t0
+    # 重验证场景：ETag 可能随 5 分钟桶轮换，200 也算正常
+    ok = r.status_code in (200, 304) if revalidate else r.status_code == 200
+    results.setdefault(name, {"lat": [], "err": 0, "codes": {}})
+    res = results[name]
+    res["lat"].append(dt)
+    res["codes"][r.status_code] = res["codes"].get(r.status_code, 0) + 1
+    if not ok:
+        res["err"] += 1
+
+
+async def _drive(client, duration, concurrency, seed):
+    random.seed(seed)
+    weights = [s[1] for s in SCENARIOS]
+    results, etags = {}, {}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            scen = random.choices(SCENARIOS, weights)[0]
+            try:
+                await _one(client, scen, etags, results)
+            except Exception:
+                results.setdefault(scen[0], {"lat": [], "err": 0, "codes": {}})["err"] += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return results, time.perf_counter() - t0
+
+
+def _summarize(results, elapsed):
+    out, all_lat = {}, []
+    for name, res in sorted(results.items()):
+        lat = res["lat"]
+        all_lat += lat
+        out[name] = {
+            "n": len(lat),
+            "rps": round(len(lat) / elapsed, 1),
+            "p50_ms": round(_pct(lat, 0.50) * 1000, 2) if lat else None,
+            "p95_ms": round(_pct(lat, 0.95) * 1000, 2) if lat else None,
+            "p99_ms": round(_pct(lat, 0.99) * 1000, 2) if lat else None,
+            "errors": res["err"],
+            "codes": {str(k): v for k, v in sorted(res["codes"].items())},
+        }
+    out["_all"] = {
+        "n": len(all_lat),
+        "rps": round(len(all_lat) / elapsed, 1),
+        "p50_ms": round(_pct(all_lat, 0.50) * 1000, 2) if all_lat else None,
+        "p95_ms": round(_pct(all_lat, 0.95) * 1000, 2) if all_lat else None,
+        "p99_ms": round(_pct(all_lat, 0.99) * 1000, 2) if all_lat else None,
+        "errors": sum(r["err"] for r in results.values()),
+    }
+    return out
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _run_uvicorn(args):
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+        cwd=str(ROOT), env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base, timeout=10,
+                                     limits=httpx.Limits(max_connections=args.concurrency)) as c:
+            for _ in range(100):
+                try:
+                    if (await c.get("/v1/health")).status_code == 200:
+                        break
+                except Exception:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not become healthy")
+            await _drive(c, min(2.0, args.duration), args.concurrency, args.seed)  # warmup
+            return await _drive(c, args.duration, args.concurrency, args.seed)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+async def _run_asgi(args):
+    from app.main import create_app
+    app = create_app()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        await _drive(c, min(2.0, args.duration), args.concurrency, args.seed)  # warmup
+        return await _drive(c, args.duration, args.concurrency, args.seed)
+
+
+def _check(summary, baseline, args):
+    failures = []
+    for name, cur in summary.items():
+        if cur["errors"]:
+            failures.append(f"{name}: {cur['errors']} errors")
+        if cur["n"] < args.min_samples:
+            continue  # 样本太少，p95 噪声大，不做门禁
+        if args.sla_p95_ms and cur["p95_ms"] is not None and cur["p95_ms"] > args.sla_p95_ms:
+            failures.append(f"{name}: p95 {cur['p95_ms']}ms > SLA {args.sla_p95_ms}ms")
+        base = (baseline or {}).get(name)
+        if not base:
+            continue
+        tol = args.tolerance
+        if cur["p95_ms"] is not None and base.get("p95_ms") and cur["p95_ms"] > base["p95_ms"] * (1 + tol):
+            failures.append(f"{name}: p95 {cur['p95_ms']}ms > baseline {base['p95_ms']}ms (+{tol:.0%})")
+        if base.get("rps") and cur["rps"] < base["rps"] * (1 - tol) and name == "_all":
+            failures.append(f"{name}: rps {cur['rps']} < baseline {base['rps']} (-{tol:.0%})")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers (transport=uvicorn)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed regression vs baseline")
+    ap.add_argument("--sla-p95-ms", type=float, default=300.0, help="absolute p95 gate (docs/SLA.md)")
+    ap.add_argument("--min-samples", type=int, default=50, help="skip p95 gates below this sample count")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--json", help="write summary JSON to this path")
+    args = ap.parse_args()
+
+    runner = _run_asgi if args.transport == "asgi" else _run_uvicorn
+    results, elapsed = asyncio.run(runner(args))
+    summary = _summarize(results, elapsed)
+
+    print(f"transport={args.transport} concurrency={args.concurrency} duration={elapsed:.1f}s")
+    print(f"{'scenario':<16}{'n':>7}{'rps':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'err':>5}")
+    for name, s in summary.items():
+        print(f"{name:<16}{s['n']:>7}{s['rps']:>9}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['errors']:>5}")
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+    all_base = json.loads(BASELINES.read_text(encoding="utf-8")) if BASELINES.exists() else {}
+    if args.update_baseline:
+        all_base[args.transport] = {
+            k: {"rps": v["rps"], "p95_ms": v["p95_ms"]} for k, v in summary.items()
+        }
+        BASELINES.write_text(json.dumps(all_base, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"baseline updated: {BASELINES} [{args.transport}]")
+        return 0
+
+    failures = _check(summary, all_base.get(args.transport), args)
+    for f in failures:
+        print("FAIL", f)
+    print("OK" if not failures else f"{len(failures)} regression(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
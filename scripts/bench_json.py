@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+JSON 序列化基准：365 天 trend 载荷，对比
+  A) 旧路径   FastAPI jsonable_encoder → starlette JSONResponse.render（标准库 json）
+  B) 新路径   app/services/json_codec.dumps（orjson + 排序键；路由直接返回 json_response()）
+  C) 兜底     json_codec 的标准库分支（未安装 orjson 时的实际表现）
+
+载荷来自 DemoBackend 的全量序列（与线上缓存里的点结构一致）。每种方式跑 --rounds 轮、
+每轮 --batch 次，取每次耗时的中位数。B 相对 A 的加速比低于 --min-speedup 时退出码 1。
+
+用法：python scripts/bench_json.py [--ports 10] [--rounds 15] [--batch 50] [--min-speedup 3] [--json out.json]
+"""
+import argparse, asyncio, json, pathlib, statistics, sys, time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from app.services import json_codec  # noqa: E402
+from app.services.port_data import MAX_DAYS, DemoBackend  # noqa: E402
+
+PORTS = ["USLAX", "USNYC", "NLRTM", "SGSIN", "CNSHA", "DEHAM", "BEANR", "KRPUS", "INNSA", "GBFXT",
+         "USLGB", "USSAV", "ESVLC", "GRPIR", "MYTPP", "THLCH", "CNNGB", "CNSZX", "USHOU", "USSEA"]
+
+
+def _payloads(n: int):
+    demo = DemoBackend()
+    out = []
+    for u in PORTS[:n]:
+        pts = asyncio.run(demo.load("trend", u, "UTC"))
+        out.append({"unlocode": u, "days": MAX_DAYS, "as_of": "2026-01-01T00:00:00+00:00", "points": pts})
+    return out
+
+
+def _old(payload):
+    return JSONResponse(content=None).render(jsonable_encoder(payload))
+
+
+def _new(payload):
+    return json_codec.dumps(payload)
+
+
+def _stdlib(payload):
+    orig = json_codec.orjson
+    json_codec.orjson = None
+    try:
+        return json_codec.dumps(payload)
+    finally:
+        json_codec.orjson = orig
+
+
+def _measure(fn, payloads, rounds: int, batch: int) -> float:
+    per_call = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for i in range(batch):
+            fn(payloads[i % len(payloads)])
+        per_call.append((time.perf_counter() - t0) / batch)
+    return statistics.median(per_call) * 1e6  # µs
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ports", type=int, default=10)
+    ap.add_argument("--rounds", type=int, default=15)
+    ap.add_argument("--batch", type=int, default=50)
+    ap.add_argument("--min-speedup", type=float, default=3.0, help="required A/B ratio (orjson only)")
+    ap.add_argument("--json", help="write summary JSON to this path")
+    args = ap.parse_args()
+
+    payloads = _payloads(max(1, min(args.ports, len(PORTS))))
+    sample = payloads[0]
+    # 同一数据，新旧两条路径解析后必须等价；兜底分支与 orjson 分支字节一致（ETag 跨环境稳定）
+    assert json.loads(_old(sample)) == json.loads(_new(sample))
+    same_bytes = _stdlib(sample) == _new(sample)
+
+    cases = {"jsonable_encoder+json": _old, "json_codec": _new}
+    if json_codec.orjson is not None:
+        cases["json_codec(stdlib)"] = _stdlib
+    for fn in cases.values():  # 预热
+        _measure(fn, payloads, 2, 5)
+
+    res = {name: round(_measure(fn, payloads, args.rounds, args.batch), 1) for name, fn in cases.items()}
+    size = len(_new(sample))
+    speedup = res["jsonable_encoder+json"] / res["json_codec"]
+
+    print(f"payload: {MAX_DAYS} points, {size} bytes; orjson={'yes' if json_codec.orjson else 'no'}; "
+          f"stdlib bytes identical={same_bytes}")
+    print(f"{'path':<24}{'µs/call':>10}{'MB/s':>9}")
+    for name, us in res.items():
+        print(f"{name:<24}{us:>10}{size / us:>9.1f}")
+    print(f"speedup (old / json_codec): {speedup:.1f}x")
+
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps({
+            "bytes": size, "orjson": json_codec.orjson is not None, "stdlib_identical": same_bytes,
+            "us_per_call": res, "speedup": round(speedup, 2),
+        }, indent=2))
+
+    if json_codec.orjson is not None and speedup < args.min_speedup:
+        print(f"FAIL speedup {speedup:.1f}x < {args.min_speedup}x")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+验证按需剖析在“未开启”时零开销：同一进程内分别构建
+  A) 未挂载剖析中间件（无 ADMIN_API_KEY）
+  B) 已挂载剖析中间件，但请求不带 X-Profile
+对同一 trend 请求交替压测，比较每请求耗时中位数。超出阈值则退出码 1。
+
+用法：python scripts/bench_profiling_overhead.py [--rounds 20] [--batch 200] [--max-overhead-pct 3]
+"""
+import argparse, asyncio, os, pathlib, statistics, sys, time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ.setdefault("DISABLE_RATELIMIT", "1")
+
+import httpx  # noqa: E402
+
+URL = "/v1/ports/USLAX/trend?days=30&format=csv"
+HDRS = {"X-API-Key": "dev_demo_123"}
+
+
+def _build(admin_key):
+    if admin_key:
+        os.environ["ADMIN_API_KEY"] = admin_key
+    else:
+        os.environ.pop("ADMIN_API_KEY", None)
+    from app.main import create_app
+    return create_app()
+
+
+async def _batch(client, n):
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        r = await client.get(URL, headers=HDRS)
+        out.append(time.perf_counter() - t0)
+        assert r.status_code == 200, r.status_code
+    return out
+
+
+async def main(args):
+    plain = _build(None)
+    profiled = _build("pp_admin_bench")
+    assert any(m.cls.__name__ == "ProfileMiddleware" for m in profiled.user_middleware)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=plain), base_url="http://bench") as a, \
+               httpx.AsyncClient(transport=httpx.ASGITransport(app=profiled), base_url="http://bench") as b:
+        await _batch(a, 50); await _batch(b, 50)  # warmup
+        ta, tb = [], []
+        for i in range(args.rounds):
+            # 交替顺序，抵消漂移
+            if i % 2:
+                ta += await _batch(a, args.batch); tb += await _batch(b, args.batch)
+            else:
+                tb += await _batch(b, args.batch); ta += await _batch(a, args.batch)
+
+    ma, mb = statistics.median(ta) * 1e6, statistics.median(tb) * 1e6
+    pct = (mb - ma) / ma * 100.0
+    print(f"requests/side={len(ta)}  without={ma:.1f}us  with(header off)={mb:.1f}us  overhead={pct:+.2f}%")
+    return 0 if pct <= args.max_overhead_pct else 1
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("--batch", type=int, default=200)
+    ap.add_argument("--max-overhead-pct", type=float, default=3.0)
+    sys.exit(asyncio.run(main(ap.parse_args())))
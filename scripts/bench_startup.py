@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+冷启动基准：每轮起一个全新解释器跑 `python -X importtime -c "import app.main"`，
+统计 app.main 的累计导入耗时（含 create_app()），取中位数；列出最重的模块便于定位。
+
+- 与 scripts/bench_baselines.json 的 "startup" 段比较，超过 (1 + tolerance) 倍 + slack 即退出码 1
+- 按当前环境变量导入（ENABLE_PORTS_TRIO / ADMIN_API_KEY / SENTRY_DSN 会影响结果），
+  刷新基线时请用与 CI 相同的环境
+
+用法：
+  python scripts/bench_startup.py --runs 7
+  python scripts/bench_startup.py --top 30               # 看最重的 30 个模块（按 self 时间）
+  python scripts/bench_startup.py --update-baseline
+"""
+import argparse, json, os, pathlib, re, statistics, subprocess, sys, time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+BASELINES = ROOT / "scripts" / "bench_baselines.json"
+TARGET = "app.main"
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def _parse(stderr: str):
+    """→ {module: (self_us, cumulative_us, depth)}"""
+    out = {}
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            out[m.group(4)] = (int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2)
+    return out
+
+
+def _one_run():
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", f"import {TARGET}"],
+        cwd=str(ROOT), env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {TARGET} failed:\n{proc.stderr[-2000:]}")
+    mods = _parse(proc.stderr)
+    if TARGET not in mods:
+        raise RuntimeError("no importtime line for app.main (is -X importtime supported?)")
+    return wall, mods
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15, help="show N heaviest modules by self time")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed regression vs baseline")
+    ap.add_argument("--slack-ms", type=float, default=20.0, help="absolute slack (process noise)")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--json", help="write summary JSON to this path")
+    args = ap.parse_args()
+
+    _one_run()  # 预热 .pyc / 文件缓存
+    walls, imports, runs = [], [], []
+    for _ in range(args.runs):
+        wall, mods = _one_run()
+        walls.append(wall * 1000.0)
+        imports.append(mods[TARGET][1] / 1000.0)
+        runs.append(mods)
+
+    # 各模块取多轮中位数
+    names = set().union(*runs)
+    per_mod = {
+        n: (statistics.median(r[n][0] for r in runs if n in r) / 1000.0,
+            statistics.median(r[n][1] for r in runs if n in r) / 1000.0)
+        for n in names
+    }
+    summary = {
+        "runs": args.runs,
+        "import_ms": round(statistics.median(imports), 2),
+        "process_ms": round(statistics.median(walls), 2),
+        "modules": len(names),
+        "app_modules": {n: round(c, 2) for n, (_, c) in sorted(per_mod.items()) if n.startswith("app.")},
+    }
+
+    print(f"runs={args.runs} modules={summary['modules']}")
+    print(f"import {TARGET}: {summary['import_ms']} ms (median, incl. create_app)   process: {summary['process_ms']} ms")
+    print(f"\n{'module':<48}{'self_ms':>10}{'cum_ms':>10}")
+    for n, (self_ms, cum_ms) in sorted(per_mod.items(), key=lambda kv: -kv[1][0])[:args.top]:
+        print(f"{n:<48}{self_ms:>10.2f}{cum_ms:>10.2f}")
+    print(f"\n{'app module':<48}{'cum_ms':>10}")
+    for n, cum_ms in sorted(summary["app_modules"].items(), key=lambda kv: -kv[1]):
+        print(f"{n:<48}{cum_ms:>10.2f}")
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+    all_base = json.loads(BASELINES.read_text(encoding="utf-8")) if BASELINES.exists() else {}
+    if args.update_baseline:
+        all_base["startup"] = {"import_ms": summary["import_ms"], "process_ms": summary["process_ms"]}
+        BASELINES.write_text(json.dumps(all_base, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"baseline updated: {BASELINES} [startup]")
+        return 0
+
+    failures = []
+    base = all_base.get("startup") or {}
+    for key in ("import_ms", "process_ms"):
+        b = base.get(key)
+        if b and summary[key] > b * (1 + args.tolerance) + args.slack_ms:
+            failures.append(f"{key} {summary[key]}ms > baseline {b}ms (+{args.tolerance:.0%} +{args.slack_ms}ms)")
+    for f in failures:
+        print("FAIL", f)
+    print("OK" if not failures else f"{len(failures)} regression(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+本地 Postgres 查询基准 + 执行计划回归检查（替代 docs/DB_BENCHMARK.md 里那次手工 EXPLAIN）。
+
+- 只连本机库（localhost / 127.0.0.1 / unix socket），远程库需显式 --allow-remote
+- 在独立 schema（默认 portpulse_bench）里建表：db/sql/003_core.sql + migrations/*.sql，
+  不碰 public 下的数据；每次运行先 DROP SCHEMA 重建
+- 按 --ports/--days/--per-day 用 generate_series 灌合成 port_snapshots / port_dwell，VACUUM ANALYZE
+- 对 app/services/port_data.py（PostgresBackend）的每条 SQL（dwell 窗口 / 每日最新快照 trend）：
+  PREPARE → 反复 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) EXECUTE，取 Execution Time 中位数
+- 门禁：计划里对目标表的扫描必须是预期覆盖索引上的 Index Only Scan；
+  执行时间不得超过 scripts/db_bench_baseline.json 的 (1 + tolerance) 倍 + slack
+
+用法：
+  DATABASE_URL=postgresql://postgres@localhost:5432/postgres python scripts/db_bench.py
+  python scripts/db_bench.py --ports 500 --days 365 --per-day 4 --update-baseline
+"""
+import argparse, json, os, pathlib, re, statistics, sys
+from datetime import date, timedelta
+from urllib.parse import urlparse
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services.port_data import (  # noqa: E402
+    MAX_DAYS, SQL_DWELL_HISTORY, SQL_DWELL_WINDOW, SQL_TREND_DAILY, SQL_TREND_HISTORY,
+)
+
+BASELINE = ROOT / "scripts" / "db_bench_baseline.json"
+LOCAL_HOSTS = {"", "localhost", "127.0.0.1", "::1"}
+
+# (名称, SQL, PREPARE 参数类型, 参数（与 PostgresBackend 实际下发的一致）, {表: 预期索引})
+QUERIES = [
+    ("dwell_window", SQL_DWELL_WINDOW, "text, int",
+     lambda a: (a.unlocode, MAX_DAYS),
+     {"port_dwell": "idx_dwell_unloc_date_cover"}),
+    ("trend_daily", SQL_TREND_DAILY, "text, int, text, int",
+     lambda a: (a.unlocode, MAX_DAYS, "UTC", MAX_DAYS + 1),
+     {"port_snapshots": "idx_snapshots_unloc_ts_cover"}),
+    # 数据集导出：缓存窗口之前的全部历史
+    ("dwell_history", SQL_DWELL_HISTORY, "text, date",
+     lambda a: (a.unlocode, (date.today() - timedelta(days=MAX_DAYS)).isoformat()),
+     {"port_dwell": "idx_dwell_unloc_date_cover"}),
+    ("trend_history", SQL_TREND_HISTORY, "text, date, text",
+     lambda a: (a.unlocode, (date.today() - timedelta(days=MAX_DAYS)).isoformat(), "UTC"),
+     {"port_snapshots": "idx_snapshots_unloc_ts_cover"}),
+]
+
+
+def _redact(dsn: str) -> str:
+    return re.sub(r"//([^:/@]+)(:[^@]*)?@", r"//\1:***@", dsn)
+
+
+def _is_local(dsn: str) -> bool:
+    host = urlparse(dsn).hostname or ""
+    return host in LOCAL_HOSTS or host.startswith("/")
+
+
+def _split_sql(text: str):
+    """按分号切语句（跳过 -- 注释与 $$ 函数体）；CONCURRENTLY 不能放进同一个隐式事务里。"""
+    out, buf, in_dollar = [], [], False
+    for line in text.splitlines():
+        if not in_dollar and line.strip().startswith("--"):
+            continue
+        buf.append(line)
+        if line.count("$$") % 2:
+            in_dollar = not in_dollar
+        if not in_dollar and line.rstrip().endswith(";"):
+            stmt = "\n".join(buf).strip()
+            if stmt.upper() not in ("BEGIN;", "COMMIT;"):
+                out.append(stmt)
+            buf = []
+    tail = "\n".join(buf).strip()
+    if tail:
+        out.append(tail)
+    return out
+
+
+def _setup(conn, args):
+    cur = conn.cursor()
+    cur.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+    cur.execute(f'CREATE SCHEMA "{args.schema}"')
+    cur.execute(f'SET search_path TO "{args.schema}", public')
+    files = [ROOT / "db" / "sql" / "003_core.sql"] + sorted((ROOT / "migrations").glob("*.sql"))
+    for fp in files:
+        for stmt in _split_sql(fp.read_text(encoding="utf-8")):
+            cur.execute(stmt)
+        print(f"applied {fp.relative_to(ROOT)}")
+
+
+def _seed(conn, args):
+    cur = conn.cursor()
+    step = 24.0 / args.per_day
+    cur.execute(
+        """
+        INSERT INTO port_snapshots (unlocode, snapshot_ts, vessels, avg_wait_hours, congestion_score, src)
+        SELECT 'X' || lpad(p::text, 4, '0'),
+               date_trunc('day', now()) - make_interval(days => d) + (k * %s) * interval '1 hour',
+               (random() * 80)::int, random() * 48, random() * 100, 'bench'
+        FROM generate_series(0, %s - 1) p,
+             generate_series(0, %s - 1) d,
+             generate_series(0, %s - 1) k
+        """,
+        (step, args.ports, args.days, args.per_day),
+    )
+    cur.execute(
+        """
+        INSERT INTO port_dwell (unlocode, date, dwell_hours, src)
+        SELECT 'X' || lpad(p::text, 4, '0'), CURRENT_DATE - d, 12 + random() * 36, 'bench'
+        FROM generate_series(0, %s - 1) p, generate_series(0, %s - 1) d
+        """,
+        (args.ports, args.days),
+    )
+    # 可见性图要刷新，否则 Index Only Scan 仍会回表（Heap Fetches > 0）
+    cur.execute("VACUUM ANALYZE port_snapshots")
+    cur.execute("VACUUM ANALYZE port_dwell")
+    n = args.ports * args.days
+    print(f"seeded port_snapshots={n * args.per_day} port_dwell={n}")
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans") or []:
+        yield from _walk(child)
+
+
+def _literal(v) -> str:
+    if isinstance(v, str):
+        return "'" + v.replace("'", "''") + "'"
+    return str(int(v))
+
+
+def _bench_query(conn, name, sql, types, params, args):
+    cur = conn.cursor()
+    cur.execute("DEALLOCATE ALL")
+    cur.execute(f"PREPARE {name} ({types}) AS {sql}")
+    execute = f"EXECUTE {name} ({', '.join(_literal(p) for p in params)})"
+    times, plan = [], None
+    for i in range(args.warmup + args.repeat):
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {execute}")
+        doc = cur.fetchone()[0]
+        doc = doc[0] if isinstance(doc, list) else json.loads(doc)[0]
+        if i >= args.warmup:
+            times.append(doc["Execution Time"])
+        plan = doc
+    return statistics.median(times), plan
+
+
+def _check_plan(plan, expect):
+    """对每张目标表：必须出现在预期索引上的 Index Only Scan。"""
+    problems = []
+    scans = [n for n in _walk(plan["Plan"]) if n.get("Relation Name") in expect]
+    for table, index in expect.items():
+        hits = [n for n in scans if n.get("Relation Name") == table]
+        if not hits:
+            problems.append(f"{table}: not scanned?")
+            continue
+        for n in hits:
+            if n["Node Type"] != "Index Only Scan" or n.get("Index Name") != index:
+                problems.append(f"{table}: {n['Node Type']} on {n.get('Index Name') or '-'} (want Index Only Scan on {index})")
+    return problems, scans
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dsn", default=os.getenv("DATABASE_URL", "postgresql://postgres@localhost:5432/postgres"))
+    ap.add_argument("--allow-remote", action="store_true", help="允许非本机库（会 DROP/CREATE bench schema）")
+    ap.add_argument("--schema", default="portpulse_bench")
+    ap.add_argument("--ports", type=int, default=200)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--per-day", type=int, default=4, help="snapshots per port per day")
+    ap.add_argument("--unlocode", default="X0007", help="被测港口（合成代码 X0000..）")
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--tolerance", type=float, default=0.5, help="allowed regression vs baseline")
+    ap.add_argument("--slack-ms", type=float, default=0.5, help="absolute slack for sub-ms queries")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--json", help="write results (incl. plans) to this path")
+    ap.add_argument("--keep", action="store_true", help="保留 bench schema 便于手工排查")
+    args = ap.parse_args()
+
+    if not _is_local(args.dsn) and not args.allow_remote:
+        print(f"refusing non-local database {_redact(args.dsn)} (use --allow-remote)")
+        return 2
+
+    import psycopg
+
+    scale = f"ports={args.ports},days={args.days},per_day={args.per_day}"
+    print(f"dsn={_redact(args.dsn)} schema={args.schema} {scale}")
+    results = {}
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        _setup(conn, args)
+        _seed(conn, args)
+        for name, sql, types, build, expect in QUERIES:
+            ms, plan = _bench_query(conn, name, sql, types, build(args), args)
+            problems, scans = _check_plan(plan, expect)
+            results[name] = {
+                "exec_ms": round(ms, 3),
+                "plan_ok": not problems,
+                "problems": problems,
+                "heap_fetches": sum(n.get("Heap Fetches", 0) for n in scans),
+                "plan": plan,
+            }
+        if not args.keep:
+            conn.execute(f'DROP SCHEMA IF EXISTS "{args.schema}" CASCADE')
+
+    print(f"{'query':<18}{'exec_ms':>10}{'heap':>7}  plan")
+    for name, r in results.items():
+        print(f"{name:<18}{r['exec_ms']:>10}{r['heap_fetches']:>7}  {'ok' if r['plan_ok'] else 'REGRESSED'}")
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(results, indent=2, default=str), encoding="utf-8")
+
+    all_base = json.loads(BASELINE.read_text(encoding="utf-8")) if BASELINE.exists() else {}
+    if args.update_baseline:
+        all_base[scale] = {k: {"exec_ms": v["exec_ms"]} for k, v in results.items()}
+        BASELINE.write_text(json.dumps(all_base, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"baseline updated: {BASELINE} [{scale}]")
+
+    failures = []
+    base = all_base.get(scale) or {}
+    for name, r in results.items():
+        failures += [f"{name}: {p}" for p in r["problems"]]
+        b = (base.get(name) or {}).get("exec_ms")
+        if b is not None and r["exec_ms"] > b * (1 + args.tolerance) + args.slack_ms:
+            failures.append(f"{name}: {r['exec_ms']}ms > baseline {b}ms (+{args.tolerance:.0%} +{args.slack_ms}ms)")
+    if not base:
+        print(f"no baseline for [{scale}]; only plan shape is gated")
+    for f in failures:
+        print("FAIL", f)
+    print("OK" if not failures else f"{len(failures)} regression(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,7 +12,8 @@ psql_run() {
 }
 
 echo "=== PortPulse Database Index Verification ==="
-echo "DATABASE_URL: ${DATABASE_URL}"
+# 口令打码，避免输出被贴进文档/工单（见 docs/DB_BENCHMARK.md）
+echo "DATABASE_URL: $(printf '%s' "$DATABASE_URL" | sed -E 's#//([^:/@]+):[^@]*@#//\1:***@#')"
 echo "UNLOCODE    : ${UNLOCODE}"
 
 # 1) 最新 snapshot（应命中覆盖索引：idx_snapshots_unloc_ts_cover；目标是 Index Only Scan）
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+从与线上 /openapi.json 相同的 artifact（app/openapi_extra.py）写出 docs/openapi.json，字节一致。
+
+用法：
+  python scripts/export_openapi.py            # 写 docs/openapi.json
+  python scripts/export_openapi.py --check    # 仅校验已提交文件是否最新（CI 用），不一致退出码 1
+"""
+import argparse, pathlib, sys, warnings
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+OUT = ROOT / "docs" / "openapi.json"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default=str(OUT))
+    ap.add_argument("--check", action="store_true")
+    args = ap.parse_args()
+
+    warnings.filterwarnings("ignore", message="Duplicate Operation ID")
+    from app.main import app
+    from app.openapi_extra import artifact
+
+    art = artifact(app)
+    out = pathlib.Path(args.out)
+    if args.check:
+        cur = out.read_bytes() if out.exists() else b""
+        if cur != art.body:
+            print(f"{out} is stale (etag {art.tag}); run: python scripts/export_openapi.py")
+            return 1
+        print(f"{out} up to date (etag {art.tag})")
+        return 0
+    out.write_bytes(art.body)
+    print(f"wrote {out} ({len(art.body)} bytes, etag {art.tag})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
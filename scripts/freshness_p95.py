@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import sys, json, urllib.request, re, statistics, datetime
+import os, sys, json, urllib.request, re, statistics, datetime
 BASE=sys.argv[1] if len(sys.argv)>1 else "https://api.useportpulse.com"
 ports=re.findall(r'unlocode:\s*([A-Z]{5})', open("ports_p1.yaml",encoding="utf-8").read())
 delays=[]
@@ -20,6 +20,19 @@ def jget(url, timeout=10):
     with urllib.request.urlopen(url, timeout=timeout) as r:
         return json.load(r)
 
+# 优先使用服务端进程内计算的新鲜度（/v1/meta/freshness）；不可用时回退到逐港口轮询
+try:
+    req=urllib.request.Request(f"{BASE}/v1/meta/freshness",
+                               headers={"X-API-Key": os.environ.get("API_KEY","dev_demo_123")})
+    with urllib.request.urlopen(req, timeout=12) as r:
+        fr=json.load(r)
+    p95=fr["current"]["p95"]
+    if p95 is not None:
+        print(f"ports={fr['ports_tracked']}  source=service  p95_h={p95:.2f}  rolling_p95_h={fr['rolling']['p95']}")
+        sys.exit(0 if p95<=2.0 else 1)
+except Exception as e:
+    print(f"[fallback] /v1/meta/freshness unavailable: {e}")
+
 for u in ports:
     dt=None
     try:
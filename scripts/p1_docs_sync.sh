@@ -1,8 +1,9 @@
 #!/usr/bin/env bash
 set -euo pipefail
-curl -fsSL https://api.useportpulse.com/openapi.json -o docs/openapi.json
+# 与线上 /openapi.json 同一份 artifact（app/openapi_extra.py）
+python scripts/export_openapi.py
 git add docs/openapi.json
-git diff --cached --quiet || git commit -m "docs: update openapi.json from prod"
+git diff --cached --quiet || git commit -m "docs: regenerate openapi.json"
 git pull --rebase origin main || true
 git push origin main || true
 echo "[ok] docs synced (if push succeeded)"
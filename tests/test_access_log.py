@@ -0,0 +1,50 @@
+# tests/test_access_log.py
+import gzip
+import json
+import logging
+import os
+
+from fastapi.testclient import TestClient
+
+from app.services import access_log, usage
+
+
+def test_access_log_lines_are_json_with_hashed_key_and_sampled_2xx(tmp_path, monkeypatch):
+    monkeypatch.setattr(access_log, "LOG_FILE", str(tmp_path / "access.log"))
+    path = tmp_path / f"access.{os.getpid()}.log"  # 每个 worker 一个文件
+    monkeypatch.setenv("DISABLE_WARMUP", "1")
+    from app.main import create_app
+
+    h = {"X-API-Key": "dev_demo_123"}
+    with TestClient(create_app()) as c:
+        c.get("/v1/ports/USLAX/trend?days=7", headers={**h, "X-Request-ID": "rid-1"})
+        c.get("/v1/ports/USLAX/trend?days=7", headers=h)
+        c.get("/v1/health")
+        monkeypatch.setattr(access_log, "SAMPLE_2XX", 0.0)
+        c.get("/v1/ports/USLAX/trend?days=7", headers=h)  # 2xx 采样率 0：不记
+        c.get("/v1/ports/USLAX/trend")  # 401 总是记
+    lines = [json.loads(x) for x in path.read_text().splitlines()]  # lifespan 退出时已写完
+
+    assert [x["status"] for x in lines] == [200, 200, 401]
+    first, second = lines[0], lines[1]
+    assert first["request_id"] == "rid-1" and first["route"] == "/v1/ports/{unlocode}/trend"
+    assert first["query"] == "days=7" and first["bytes"] > 0 and first["sample"] == 1.0
+    assert first["key"] == usage.key_id("dev_demo_123") and "dev_demo_123" not in path.read_text()
+    assert first["cache"] == "miss" and second["cache"] == "hit"
+
+
+def test_rotated_files_are_gzipped_in_the_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(access_log, "MAX_BYTES", 200)
+    h = access_log._file_handler(str(tmp_path / "access.log"))
+    h.setFormatter(access_log._JsonFormatter())
+    for i in range(10):
+        rec = logging.LogRecord("portpulse.access", logging.INFO, __file__, 0, "access", None, None)
+        rec.access = {"i": i, "pad": "x" * 50}
+        h.handle(rec)
+    h.close()  # 等最后一次压缩写完
+    # 连续多次轮转：每次先等上一次压缩结束，一行不丢、不留未压缩的中间文件
+    rotated = sorted(tmp_path.glob("access.log.*"))
+    assert len(rotated) > 1 and all(p.suffix == ".gz" for p in rotated)
+    lines = [json.loads(x) for p in rotated for x in gzip.decompress(p.read_bytes()).splitlines()]
+    lines += [json.loads(x) for x in (tmp_path / "access.log").read_text().splitlines()]
+    assert sorted(x["i"] for x in lines) == list(range(10)) and lines[0]["pad"] == "x" * 50
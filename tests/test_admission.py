@@ -0,0 +1,70 @@
+# tests/test_admission.py
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.middlewares.admission import AdmissionMiddleware
+from app.services import admission
+
+
+def test_queue_deadline_rejects_and_release_hands_slot_to_waiter():
+    lane = admission.Lane("t", max_limit=1, min_limit=1, queue=1, deadline=0.05, target=1.0)
+
+    async def main():
+        assert await lane.acquire()
+        assert not await lane.acquire()  # 排队超时
+        waiter = asyncio.ensure_future(lane.acquire())
+        await asyncio.sleep(0)
+        assert not await lane.acquire()  # 队列已满
+        lane.release(0.01)
+        assert await waiter and lane.inflight == 1
+
+    asyncio.run(main())
+
+
+def test_aimd_backs_off_on_slow_responses_and_recovers_when_saturated():
+    lane = admission.Lane("t", max_limit=10, min_limit=2, queue=0, deadline=0.0, target=0.1)
+    lane.inflight = 1
+    lane.release(0.5)
+    assert lane.limit == 9.0
+    lane.inflight = 1
+    lane.release(0.5)  # 同一个目标时长内不连减
+    assert lane.limit == 9.0
+    lane.inflight = 9
+    lane.release(0.01)
+    assert 9.0 < lane.limit <= 10.0
+
+
+def test_middleware_sheds_with_503_and_retry_after():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    lane = admission.Lane("cached", max_limit=1, min_limit=1, queue=0, deadline=0.01, target=1.0)
+    ctrl = admission.Controller({"cached": lane, "db": lane, "export": lane})
+    c = TestClient(AdmissionMiddleware(app, ctrl))
+    assert c.get("/v1/ports/USLAX/trend").status_code == 200
+    lane.inflight = 1  # 占满
+    r = c.get("/v1/ports/USLAX/trend")
+    assert r.status_code == 503 and r.headers["retry-after"] == "1"
+    assert c.get("/v1/health").status_code == 200
+    assert admission.classify("/v1/ports/USLAX/trend", b"format=parquet&days=30") == "export"
+
+
+def test_paid_tier_jumps_demo_queue_but_demo_keeps_one_slot():
+    lane = admission.Lane("t", max_limit=4, min_limit=1, queue=4, deadline=1.0, target=1.0, demo_share=0.25)
+
+    async def main():
+        assert await lane.acquire("demo")
+        assert await lane.acquire("live") and await lane.acquire("live") and await lane.acquire("live")
+        demo = asyncio.ensure_future(lane.acquire("demo"))
+        live = asyncio.ensure_future(lane.acquire("live"))
+        await asyncio.sleep(0)
+        assert not await lane.acquire("demo")  # demo 队列只占 1/4
+        lane.release(0.01, "live")  # demo 已占满自己那 1 个：先放 live
+        assert await live and not demo.done()
+        lane.release(0.01, "demo")
+        assert await demo
+
+    asyncio.run(main())
+    assert admission.Lane._cap(lane, "demo", 40) == 10
@@ -0,0 +1,66 @@
+# tests/test_changes.py
+import asyncio
+
+import pytest
+
+from app.services import changes
+
+
+def test_record_only_appends_real_changes_and_pages_by_cursor(tmp_path, monkeypatch):
+    monkeypatch.setattr(changes, "_STORE", changes.SqliteChangeLog(str(tmp_path / "changes.db")))
+    pts = [{"date": f"2026-10-0{i}", "vessels": 80 + i, "avg_wait_hours": 30.0, "congestion_score": 56,
+            "src": "nowcast", "as_of": "t0"} for i in range(1, 4)]
+    assert asyncio.run(changes.record("trend", "uslax", pts, origin="override")) == 3
+    # 重跑同一批（只有 as_of 变了）→ 不产生变更
+    again = [{**p, "as_of": "t1"} for p in pts]
+    assert asyncio.run(changes.record("trend", "USLAX", again, origin="override")) == 0
+    assert asyncio.run(changes.record("trend", "USLAX", [{**pts[1], "vessels": 1}], origin="override")) == 1
+
+    page = asyncio.run(changes.page(None, 2))
+    assert [r["date"] for r in page["changes"]] == ["2026-10-01", "2026-10-02"] and page["has_more"]
+    page = asyncio.run(changes.page(page["next_cursor"], 2))
+    assert [(r["date"], r["metrics"]["vessels"]) for r in page["changes"]] == [("2026-10-03", 83), ("2026-10-02", 1)]
+    assert not page["has_more"]
+    # 没有新变更：游标原样返回
+    tail = asyncio.run(changes.page(page["next_cursor"], 2))
+    assert tail == {"changes": [], "next_cursor": page["next_cursor"], "has_more": False}
+
+    with pytest.raises(changes.InvalidCursor):
+        changes.decode_cursor("bogus")
+
+
+def test_rows_are_tagged_by_origin_and_resolve_follows_layer_precedence(tmp_path, monkeypatch):
+    monkeypatch.setattr(changes, "_STORE", changes.SqliteChangeLog(str(tmp_path / "changes.db")))
+
+    def pt(d, v):
+        return {"date": d, "vessels": v, "avg_wait_hours": 1.0, "congestion_score": 1, "src": "x"}
+
+    # DB 入库 → 派生脚本晚于它跑（同一天不同数值）→ nowcast 覆盖其中一天
+    asyncio.run(changes.record("trend", "USLAX", [pt("2026-10-01", 10), pt("2026-10-02", 20)], origin="db"))
+    asyncio.run(changes.record("trend", "USLAX", [pt("2026-10-02", 99), pt("2026-10-03", 99)], origin="derived"))
+    asyncio.run(changes.record("trend", "USLAX", [pt("2026-10-01", 11)], origin="override"))
+    # 没有 DB 序列的港口：派生文件就是基础层
+    asyncio.run(changes.record("trend", "USNYC", [pt("2026-10-01", 7)], origin="derived"))
+
+    rows = asyncio.run(changes.page(None, 100))["changes"]
+    assert [r["origin"] for r in rows] == ["db", "db", "derived", "derived", "override", "derived"]
+    got = {k: m["vessels"] for k, m in changes.resolve(rows).items()}
+    assert got == {("trend", "USLAX", "2026-10-01"): 11, ("trend", "USLAX", "2026-10-02"): 20,
+                   ("trend", "USNYC", "2026-10-01"): 7}
+    with pytest.raises(ValueError):
+        asyncio.run(changes.record("trend", "USLAX", [], origin="bogus"))
+
+
+def test_locked_database_surfaces_the_lock_error(tmp_path, monkeypatch):
+    import sqlite3
+
+    store = changes.SqliteChangeLog(str(tmp_path / "changes.db"))
+    monkeypatch.setattr(store, "_connect", lambda: sqlite3.connect(store.path, timeout=0, isolation_level=None))
+    holder = sqlite3.connect(store.path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")  # 另一个写者持有写锁
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            store._record("override", "trend", "USLAX", [{"date": "2026-10-01", "vessels": 1}], None)
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
@@ -0,0 +1,22 @@
+# tests/test_columnar.py
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+from app.services import columnar
+
+H = {"X-API-Key": "dev_demo_123"}
+
+
+def test_arrow_round_trips_and_falls_back_to_406_without_pyarrow(monkeypatch):
+    monkeypatch.setenv("DISABLE_WARMUP", "1")
+    from app.main import create_app
+
+    with TestClient(create_app()) as c:
+        r = c.get("/v1/ports/USLAX/trend?days=5&format=arrow", headers=H)
+        assert r.status_code == 200 and r.headers["content-type"] == columnar.MEDIA_TYPES["arrow"]
+        table = pa.ipc.open_stream(r.content).read_all()
+        assert table.num_rows == 5 and table.column_names[0] == "date"
+
+        monkeypatch.setattr(columnar, "_available", False)
+        r = c.get("/v1/ports/USLAX/trend?days=5&format=parquet", headers=H)
+        assert r.status_code == 406 and "format=parquet" in r.text
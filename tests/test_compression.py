@@ -0,0 +1,79 @@
+# tests/test_compression.py
+import gzip
+
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.middlewares.compression import CompressionMiddleware
+from app.services import compression
+
+BODY = b"date,vessels\n" + b"".join(b"2026-01-%02d,%d\n" % (d % 28 + 1, d) for d in range(200))
+ETAG = '"abc"'
+
+
+def _client():
+    async def csv(request):
+        if request.headers.get("if-none-match", "").find(ETAG) >= 0:
+            return Response(status_code=304, headers={"ETag": ETAG})
+        return Response(BODY, media_type="text/csv", headers={"ETag": ETAG})
+
+    app = Starlette(routes=[Route("/csv", csv)])
+    app.add_middleware(CompressionMiddleware)
+    return TestClient(app)
+
+
+def test_negotiate_prefers_highest_q():
+    assert compression.negotiate("gzip;q=0.5, identity;q=1", {"gzip"}) == "identity"
+    assert compression.negotiate("gzip, br", {"gzip"}) == "gzip"
+    assert compression.negotiate("*;q=0.1, identity;q=0", {"gzip"}) == "gzip"
+    assert compression.negotiate(None, {"gzip"}) == "identity"
+
+
+def test_gzip_variant_is_cached_and_etag_round_trips():
+    compression.VARIANTS.clear()
+    c = _client()
+    r = c.get("/csv", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip" and r.headers["etag"] == '"abc-gzip"'
+    assert r.content == BODY and "accept-encoding" in r.headers["vary"].lower()
+    c.get("/csv", headers={"Accept-Encoding": "gzip"})
+    assert len(compression.VARIANTS) == 1
+
+    r = c.get("/csv", headers={"Accept-Encoding": "gzip", "If-None-Match": '"abc-gzip"'})
+    assert r.status_code == 304 and r.headers["etag"] == '"abc-gzip"'
+
+    r = c.get("/csv", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers and r.headers["etag"] == ETAG
+    assert gzip.decompress(compression.CODECS["gzip"](BODY)) == BODY
+
+
+def test_only_strong_etags_reuse_variants_and_cache_is_capped():
+    compression.VARIANTS.clear()
+    n = {"calls": 0}
+
+    async def trend(request):
+        # body 每次都不同（as_of=now），弱 ETag 只随数据变：每次现压，不能发冻结的 as_of
+        n["calls"] += 1
+        body = b'{"as_of":"%d","points":' % n["calls"] + BODY.replace(b"\n", b";") + b"}"
+        return Response(body, media_type="application/json", headers={"ETag": 'W/"t1"'})
+
+    async def plain(request):
+        return Response(BODY, media_type="text/plain")  # 没有 ETag：不缓存
+
+    app = Starlette(routes=[Route("/trend", trend), Route("/plain", plain)])
+    app.add_middleware(CompressionMiddleware)
+    c = TestClient(app)
+    first = c.get("/trend", headers={"Accept-Encoding": "gzip"})
+    second = c.get("/trend", headers={"Accept-Encoding": "gzip"})
+    # TestClient 已解压：两次都是现压的新 body
+    assert first.content.startswith(b'{"as_of":"1"') and second.content.startswith(b'{"as_of":"2"')
+    assert second.headers["content-encoding"] == "gzip" and second.headers["etag"] == 'W/"t1-gzip"'
+    assert c.get("/plain", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+    assert len(compression.VARIANTS) == 0
+
+    cache = compression.VariantCache(max_bytes=1 << 20, max_entries=3)
+    for i in range(10):
+        cache.put((b"%d" % i, "gzip"), None)
+    assert len(cache) == 3 and cache.get((b"9", "gzip")) == (True, None)
+    assert cache.get((b"0", "gzip")) == (False, None)
@@ -0,0 +1,42 @@
+# tests/test_datasets.py
+import asyncio
+import gzip
+from datetime import date
+
+from app.services import datasets
+from app.services.port_data import DemoBackend, PortDataRepository
+
+
+def test_build_partitions_by_month_and_serves_from_manifest(tmp_path):
+    repo = PortDataRepository([DemoBackend()])
+    m = asyncio.run(datasets.build(date(2026, 1, 2), ["uslax"], ["csv.gz"], root=tmp_path, repo=repo))
+    trend = [f for f in m["files"] if f["kind"] == "trend"]
+    assert sum(f["rows"] for f in trend) == 365 and len({f["month"] for f in trend}) in (12, 13)
+
+    assert datasets.resolve_date("latest", tmp_path) == "2026-01-02"
+    fp, entry = datasets.lookup("2026-01-02", trend[0]["path"], tmp_path)
+    assert gzip.decompress(fp.read_bytes()).startswith(b"date,vessels,")
+    assert datasets.lookup("2026-01-02", "../manifest.json", tmp_path) is None
+
+    # 同一天重跑：原子替换，内容相同 → ETag 不变
+    m2 = asyncio.run(datasets.build(date(2026, 1, 2), ["USLAX"], ["csv.gz"], root=tmp_path, repo=repo))
+    assert [f["sha256"] for f in m2["files"]] == [f["sha256"] for f in m["files"]]
+    assert datasets.available_dates(tmp_path) == ["2026-01-02"]
+
+
+def test_build_exports_history_beyond_the_cache_window(tmp_path):
+    import json
+    from datetime import timedelta
+    from app.services.port_data import DerivedBackend, MAX_DAYS
+
+    start = date(2024, 1, 1)
+    pts = [{"date": (start + timedelta(days=i)).isoformat(), "dwell_hours": 1.0, "src": "etl"}
+           for i in range(MAX_DAYS + 100)]
+    (tmp_path / "derived" / "dwell").mkdir(parents=True)
+    (tmp_path / "derived" / "dwell" / "NLRTM.json").write_text(json.dumps({"points": pts}))
+    repo = PortDataRepository([DerivedBackend(tmp_path / "derived"), DemoBackend()])
+
+    assert len(asyncio.run(repo.dwell("NLRTM"))) == MAX_DAYS
+    m = asyncio.run(datasets.build(date(2026, 1, 2), ["NLRTM"], ["csv.gz"], root=tmp_path / "out", repo=repo))
+    dwell = [f for f in m["files"] if f["kind"] == "dwell"]
+    assert sum(f["rows"] for f in dwell) == MAX_DAYS + 100 and dwell[0]["month"] == "2024-01"
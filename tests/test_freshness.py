@@ -0,0 +1,36 @@
+# tests/test_freshness.py
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.services import changes, freshness
+
+
+def test_workers_sharing_a_dir_report_the_same_snapshot(tmp_path):
+    now = datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+    a = freshness.FreshnessTracker(str(tmp_path))
+    b = freshness.FreshnessTracker(str(tmp_path))
+    b.share_name = "freshness_b.json"  # 同一进程里模拟两个 worker
+    a.mark("USLAX", now - timedelta(hours=1), "override")  # 首次 mark 即采样并写出状态
+    b.mark("USNYC", now - timedelta(hours=3), "db")
+
+    sa, sb = a.snapshot(now), b.snapshot(now)
+    assert {p["unlocode"]: p["lag_hours"] for p in sb["ports"]} == {"USLAX": 1.0, "USNYC": 3.0}
+    assert sa["ports"] == sb["ports"] and sa["current"] == sb["current"]
+    assert set(b.last_ingest_by_source()) == {"override", "db"}
+
+
+def test_ingests_by_other_processes_arrive_through_the_change_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(changes, "_STORE", changes.SqliteChangeLog(str(tmp_path / "changes.db")))
+    pt = {"date": "2026-10-17", "vessels": 1, "avg_wait_hours": 1.0, "congestion_score": 1}
+    asyncio.run(changes.record("trend", "USLAX", [pt], origin="derived"))  # 启动前已有的行
+    t = freshness.FreshnessTracker("")
+    assert asyncio.run(t.sync_changes(force=True)) == 1
+    asyncio.run(changes.record("trend", "USLAX", [{**pt, "date": "2026-10-18"}], origin="derived"))
+    asyncio.run(changes.record("dwell", "USNYC", [{"date": "2026-10-18", "dwell_hours": 2.0}], origin="db"))
+    assert asyncio.run(t.sync_changes()) == 0  # 节流：至多每 SAMPLE_SECONDS 读一次
+    assert asyncio.run(t.sync_changes(force=True)) == 2
+
+    snap = t.snapshot(datetime(2026, 10, 18, 14, tzinfo=timezone.utc))
+    assert {p["unlocode"]: (p["source"], p["lag_hours"]) for p in snap["ports"]} == {
+        "USLAX": ("derived", 14.0), "USNYC": ("db", 14.0)}
+    assert set(t.last_ingest_by_source()) == {"derived", "db"}
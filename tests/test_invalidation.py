@@ -0,0 +1,46 @@
+# tests/test_invalidation.py
+import asyncio
+
+from app.services import invalidation
+from app.services.changes import SqliteChangeLog
+from app.services.port_data import Backend, PortDataRepository
+
+
+class _Counting(Backend):
+    name = "db"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def load(self, kind, unlocode, tz):
+        self.calls += 1
+        return [{"date": "2026-01-01", "vessels": self.calls, "dwell_hours": 1.0}]
+
+
+def test_journal_events_evict_only_the_affected_port_and_dataset(tmp_path, monkeypatch):
+    journal = tmp_path / "invalidation.log"
+    monkeypatch.setattr(invalidation, "JOURNAL", journal)
+    db = _Counting()
+    repo = PortDataRepository([db], ttl=3600)
+    tail = invalidation.JournalTail(journal, invalidation._Applier(repo, "journal"))
+
+    async def warm():
+        for u in ("USLAX", "USNYC"):
+            for kind in ("trend", "dwell"):
+                await repo.series(kind, u)
+
+    asyncio.run(warm())
+    assert db.calls == 4
+
+    # 另一个进程（ETL 脚本）写变更日志 → 追加失效事件
+    log = SqliteChangeLog(str(tmp_path / "changes.db"))
+    assert asyncio.run(log.record("derived", "trend", "USLAX", [{"date": "2026-01-01", "vessels": 9}])) == 1
+    assert tail.poll() == 1
+    asyncio.run(warm())
+    assert db.calls == 5  # 只有 USLAX/trend 重新取数
+
+    journal.unlink()  # 轮转：可能漏了事件 → 整库清空
+    invalidation.publish_journal([("USNYC", "dwell", 99)], journal)
+    tail.poll()
+    asyncio.run(warm())
+    assert db.calls == 9
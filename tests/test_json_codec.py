@@ -0,0 +1,17 @@
+# tests/test_json_codec.py
+from datetime import date
+
+from app.services import json_codec
+from app.services.alerts import Alert
+
+
+def test_sorted_compact_and_stdlib_fallback_identical():
+    obj = {"b": 1, "a": [Alert(date(2026, 1, 2), "dwell_hours", 1.5, "high", "é")], "c": None}
+    fast = json_codec.dumps(obj)
+    assert fast.startswith(b'{"a":[{"date":"2026-01-02","delta":1.5,"explain":"\xc3\xa9","metric"')
+
+    orig, json_codec.orjson = json_codec.orjson, None
+    try:
+        assert json_codec.dumps(obj) == fast
+    finally:
+        json_codec.orjson = orig
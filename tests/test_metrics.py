@@ -0,0 +1,31 @@
+# tests/test_metrics.py
+from fastapi.testclient import TestClient
+
+from app.services import metrics
+
+
+def test_route_template_uses_the_matched_route_including_prefix(monkeypatch):
+    monkeypatch.setenv("DISABLE_WARMUP", "1")
+    from app.main import create_app
+
+    h = {"X-API-Key": "dev_demo_123"}
+    with TestClient(create_app()) as c:
+        c.get("/v1/ports/USLAX/trend", headers=h)
+        c.get("/v1/ports/trend/trend", headers=h)  # 参数值与路径段同名：不能按值反推
+        c.get("/v1/datasets/2026-10-18/ports.csv", headers=h)  # {path:path}
+        c.get("/nope", headers=h)
+        body = c.get("/metrics").text
+
+    routes = {lbl[1] for lbl in metrics.REQUESTS.values}
+    assert {"/v1/ports/{unlocode}/trend", "/v1/datasets/{day}/{path}", "<unmatched>"} <= routes
+    assert not any("{unlocode}/{unlocode}" in r for r in routes)
+    assert 'route="/v1/ports/{unlocode}/trend"' in body and "portpulse_http_request_duration_seconds_bucket" in body
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("t_latency_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, "/x")
+    samples = list(h.samples(h.values))
+    assert [v for n, _, v in samples if n.endswith("_bucket")] == [1, 2, 3]
+    assert ("t_latency_seconds_count", ("/x",), 3) in samples
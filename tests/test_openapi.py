@@ -0,0 +1,29 @@
+# tests/test_openapi.py
+import gzip
+import json
+
+from fastapi.testclient import TestClient
+
+
+def test_openapi_strong_etag_304_and_encoding_variants(monkeypatch):
+    monkeypatch.setenv("DISABLE_WARMUP", "1")
+    from app.main import create_app
+
+    with TestClient(create_app()) as c:
+        plain = c.get("/openapi.json", headers={"Accept-Encoding": "identity"})
+        etag = plain.headers["etag"]
+        assert plain.status_code == 200 and not etag.startswith("W/")
+        assert "content-encoding" not in plain.headers and "Accept-Encoding" in plain.headers["vary"]
+        assert "/v1/ports/{unlocode}/trend" in plain.json()["paths"]
+
+        gz = c.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+        assert gz.headers["content-encoding"] == "gzip" and gz.headers["etag"] != etag
+        assert not gz.headers["etag"].startswith("W/")
+        assert json.loads(gzip.decompress(gz.content) if gz.content[:2] == b"\x1f\x8b" else gz.content) \
+            == plain.json()
+
+        # 同一内容的任一编码变体都命中
+        for inm in (etag, gz.headers["etag"], f"W/{etag}"):
+            r = c.get("/openapi.json", headers={"If-None-Match": inm, "Accept-Encoding": "gzip"})
+            assert r.status_code == 304 and r.content == b"" and r.headers["etag"] == gz.headers["etag"]
+        assert c.get("/openapi.json", headers={"If-None-Match": '"other"'}).status_code == 200
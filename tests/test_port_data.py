@@ -0,0 +1,244 @@
+# tests/test_port_data.py
+import asyncio
+import json
+import os
+
+import pytest
+
+from app.services import port_data
+from app.services.port_data import Backend, DemoBackend, DerivedBackend, PortDataRepository
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _pts(*days):
+    return [{"date": f"2026-01-{d:02d}", "vessels": d, "src": "t"} for d in days]
+
+
+def test_window_uses_last_date_not_count():
+    pts = _pts(1, 2, 5, 6, 7)  # 缺 3、4 号
+    assert [p["date"] for p in port_data.window(pts, 5)] == ["2026-01-05", "2026-01-06", "2026-01-07"]
+    assert port_data.window(pts, None) is pts
+
+
+
+def test_cursor_pages_walk_the_window_once():
+    pts = _pts(1, 2, 5, 6, 7, 9)
+    seen, after = [], None
+    while True:
+        rows, nxt = port_data.page(pts, 8, after, 2, "USLAX")  # 窗口 2026-01-02..09
+        seen += [p["date"][-2:] for p in rows]
+        if nxt is None:
+            break
+        after = port_data.decode_cursor(nxt, "uslax")
+    assert seen == ["02", "05", "06", "07", "09"]
+    with pytest.raises(ValueError):
+        port_data.decode_cursor(port_data.encode_cursor("USLAX", "2026-01-05"), "USNYC")
+
+
+class _Fixed(Backend):
+    def __init__(self, name, pts):
+        self.name, self.pts, self.calls = name, pts, 0
+
+    async def load(self, kind, unlocode, tz):
+        self.calls += 1
+        return self.pts
+
+
+def test_first_non_empty_backend_wins_and_is_cached():
+    empty, db = _Fixed("db", None), _Fixed("derived", _pts(1, 2))
+    repo = PortDataRepository([empty, db, DemoBackend()])
+    pts, src = _run(repo.series("trend", "uslax"))
+    assert src == "derived" and pts == _pts(1, 2)
+    _run(repo.series("trend", "USLAX"))
+    assert db.calls == 1
+
+
+def test_file_change_invalidates_cache(tmp_path):
+    (tmp_path / "trend").mkdir()
+    fp = tmp_path / "trend" / "USLAX.json"
+    fp.write_text(json.dumps({"points": _pts(1)}))
+    repo = PortDataRepository([DerivedBackend(tmp_path), DemoBackend()], ttl=3600)
+    assert len(_run(repo.trend("USLAX"))) == 1
+
+    fp.write_text(json.dumps({"points": _pts(1, 2)}))
+    st = fp.stat()
+    os.utime(fp, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert len(_run(repo.trend("USLAX"))) == 2
+
+
+def test_projection_and_csv():
+    rows = port_data.project(_pts(1), port_data.parse_fields("vessels,bogus"))
+    assert rows == [{"date": "2026-01-01", "vessels": 1, "src": "t"}]
+    assert port_data.csv_bytes(rows, ["vessels"]) == b"date,vessels,src\n2026-01-01,1,t\n"
+
+
+def test_merge_points_overlays_by_date():
+    base = _pts(1, 2, 3, 4)
+    over = [{"date": "2026-01-03", "vessels": 99, "src": "nowcast"},
+            {"date": "2026-01-05", "vessels": 5}]
+    out = port_data.merge_points(base, over, "override", "db")
+    assert [(p["date"][-2:], p["vessels"], p["src"]) for p in out] == [
+        ("01", 1, "t"), ("02", 2, "t"), ("03", 99, "nowcast"), ("04", 4, "t"), ("05", 5, "override"),
+    ]
+    assert out[0] is base[0]  # 未改动的点不复制
+
+
+class _Overlay(_Fixed):
+    overlay = True
+    kinds = ("trend",)
+
+    def __init__(self, name, pts):
+        super().__init__(name, pts)
+        self.ver = 0
+
+    def version(self, kind, unlocode):
+        return self.ver
+
+
+def test_overlay_change_remerges_without_reloading_base():
+    base, over = _Fixed("db", _pts(1, 2, 3)), _Overlay("override", [{"date": "2026-01-03", "vessels": 30}])
+    repo = PortDataRepository([over, base], ttl=3600)
+    pts, src = _run(repo.series("trend", "USLAX"))
+    assert src == "override+db" and [p["vessels"] for p in pts] == [1, 2, 30]
+
+    over.pts, over.ver = [{"date": "2026-01-04", "vessels": 40}], 1
+    pts, _ = _run(repo.series("trend", "USLAX"))
+    assert [p["vessels"] for p in pts] == [1, 2, 3, 40]
+    assert base.calls == 1 and over.calls == 2
+
+
+def test_columnar_slices_cached_table():
+    pa = pytest.importorskip("pyarrow")
+    repo = PortDataRepository([_Fixed("db", _pts(1, 2, 3, 4, 5))])
+    body, etag = _run(repo.columnar("trend", "USLAX", "arrow", days=3, fields=["vessels"], limit=2))
+    t = pa.ipc.open_stream(body).read_all()
+    assert t.column_names == ["date", "vessels", "src"] and t.column("vessels").to_pylist() == [3, 4]
+    assert _run(repo.columnar("trend", "USLAX", "arrow", days=3, fields=["vessels"], limit=2)) == (body, etag)
+
+
+def test_validator_tracks_data_version_not_body(tmp_path):
+    (tmp_path / "trend").mkdir()
+    fp = tmp_path / "trend" / "USLAX.json"
+    fp.write_text(json.dumps({"points": _pts(1, 2)}))
+    repo = PortDataRepository([DerivedBackend(tmp_path)], ttl=3600)
+    v = _run(repo.validator("trend", "USLAX", ("csv", 7)))
+    assert v.etag != _run(repo.validator("trend", "USLAX", ("csv", 14))).etag
+    assert v.not_modified({"if-none-match": f"W/{v.etag}"})
+    assert v.not_modified({"if-modified-since": v.headers()["Last-Modified"]})
+    assert not v.not_modified({"if-none-match": '"other"', "if-modified-since": v.headers()["Last-Modified"]})
+
+    fp.write_text(json.dumps({"points": _pts(1, 2, 3)}))
+    st = fp.stat()
+    os.utime(fp, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    v2 = _run(repo.validator("trend", "USLAX", ("csv", 7)))
+    assert v2.etag != v.etag and not v2.not_modified({"if-modified-since": v.headers()["Last-Modified"]})
+
+
+class _Flaky(_Fixed):
+    fail = False
+
+    async def load(self, kind, unlocode, tz):
+        if self.fail:
+            raise ConnectionError("db down")
+        return await super().load(kind, unlocode, tz)
+
+
+def test_stale_if_error_serves_last_good_until_hard_ttl():
+    db = _Flaky("db", _pts(1, 2))
+    repo = PortDataRepository([db, DemoBackend()], ttl=0, swr=0, stale_ttl=3600)
+    assert _run(repo.series("trend", "USLAX")) == (_pts(1, 2), "db")
+
+    db.fail = True
+    pts, src = _run(repo.series("trend", "USLAX"))
+    assert (pts, src) == (_pts(1, 2), "db")  # 不是 demo
+    h = _run(repo.validator("trend", "USLAX", ("json",))).headers()
+    assert h["X-Data-Stale"].startswith("error") and h["Warning"].startswith("111")
+
+    repo.stale_ttl = 0  # 过了硬期限：降级到下一个后端
+    assert _run(repo.series("trend", "USLAX"))[1] == "demo"
+
+
+def test_stale_while_revalidate_returns_old_value_then_refreshes():
+    db = _Fixed("db", _pts(1))
+    repo = PortDataRepository([db], ttl=0, swr=60)
+
+    async def main():
+        await repo.series("trend", "USLAX")
+        db.pts = _pts(1, 2)
+        v = await repo.validator("trend", "USLAX", ("json",))
+        assert v.stale == "revalidating" and "X-Data-Stale" in v.headers()
+        assert (await repo.series("trend", "USLAX"))[0] == _pts(1)  # 不等回源
+        await asyncio.gather(*repo._refreshing.values())
+        return await repo.series("trend", "USLAX")
+
+    assert _run(main())[0] == _pts(1, 2)
+
+
+def test_invalidate_during_a_load_is_not_lost_and_keeps_a_stale_fallback():
+    class _Slow(_Flaky):
+        gate = None
+
+        async def load(self, kind, unlocode, tz):
+            pts = await super().load(kind, unlocode, tz)  # 先读（写入之前的数据）
+            if self.gate is not None:
+                await self.gate.wait()
+            return pts
+
+    db = _Slow("db", _pts(1))
+    repo = PortDataRepository([db, DemoBackend()], ttl=3600, stale_ttl=3600)
+
+    async def main():
+        db.gate = asyncio.Event()
+        loading = asyncio.ensure_future(repo.series("trend", "USLAX"))
+        await asyncio.sleep(0.01)
+        db.pts = _pts(1, 2)  # 回源进行中数据被改写 + 失效事件到达
+        repo.invalidate("USLAX", "trend")
+        db.gate.set()
+        assert (await loading)[0] == _pts(1)  # 失效前发起的调用拿到旧值没问题
+        db.gate = None
+        assert (await repo.series("trend", "USLAX"))[0] == _pts(1, 2)  # 但不能进缓存
+
+        # 回填后失效、紧接着 DB 出错：回上一次的好数据，而不是降级到 demo
+        repo.invalidate("USLAX")
+        db.fail = True
+        return await repo.series("trend", "USLAX")
+
+    assert _run(main()) == (_pts(1, 2), "db")
+
+
+def test_live_waiter_on_demo_led_flight_skips_demo_db_slot(monkeypatch):
+    from app.services import tiers
+
+    class _Slotted(_Fixed):
+        gates = {}
+
+        async def load(self, kind, unlocode, tz):
+            async with tiers.db_slot():
+                if unlocode in self.gates:
+                    await self.gates[unlocode].wait()
+                return await super().load(kind, unlocode, tz)
+
+    monkeypatch.setattr(tiers, "DB_DEMO_SLOTS", 1)
+    monkeypatch.setattr(tiers, "_db_demo", None)
+    repo = PortDataRepository([_Slotted("db", _pts(1))])
+
+    async def as_tier(tier, coro):
+        tiers.TIER.set(tier)  # 各自的 Task 里设置，不影响别的请求
+        return await coro
+
+    async def main():
+        _Slotted.gates["USNYC"] = asyncio.Event()
+        scraper = asyncio.ensure_future(as_tier("demo", repo.series("trend", "USNYC")))  # 占住 demo 槽位
+        await asyncio.sleep(0.01)
+        leader = asyncio.ensure_future(as_tier("demo", repo.series("trend", "USLAX")))
+        await asyncio.sleep(0)
+        live = await asyncio.wait_for(as_tier("live", repo.series("trend", "USLAX")), 1)
+        assert (await leader) == live
+        _Slotted.gates["USNYC"].set()
+        await scraper
+        return live
+
+    assert _run(main())[0] == _pts(1)
@@ -0,0 +1,35 @@
+# tests/test_profiling.py
+from collections import deque
+
+from fastapi.testclient import TestClient
+
+from app.services import profiling
+
+
+def test_x_profile_is_admin_only_and_profiles_land_in_a_ring_buffer(monkeypatch):
+    monkeypatch.setenv("ADMIN_API_KEY", "adm_test_key")
+    monkeypatch.setenv("DISABLE_WARMUP", "1")
+    monkeypatch.setattr(profiling, "PROFILES", deque(maxlen=2))
+    from app.main import create_app
+
+    admin = {"X-API-Key": "adm_test_key"}
+    with TestClient(create_app()) as c:
+        # 非管理员 key 带 X-Profile：不剖析
+        r = c.get("/v1/ports/USLAX/trend", headers={"X-API-Key": "dev_demo_123", "X-Profile": "1"})
+        assert r.status_code == 200 and "x-profile-id" not in r.headers
+
+        ids = []
+        for _ in range(3):
+            r = c.get("/v1/ports/USLAX/trend", headers={**admin, "X-Profile": "1", "X-Request-ID": "rid-p"})
+            assert r.status_code == 200
+            ids.append(int(r.headers["x-profile-id"]))
+
+        assert c.get("/v1/admin/debug/profiles", headers={"X-API-Key": "dev_demo_123"}).status_code == 401
+        listing = c.get("/v1/admin/debug/profiles", headers=admin).json()
+        assert listing["buffer_size"] == 2 and [p["id"] for p in listing["items"]] == ids[:0:-1]
+        assert listing["items"][0]["request_id"] == "rid-p" and listing["items"][0]["status"] == 200
+
+        detail = c.get(f"/v1/admin/debug/profiles/{ids[-1]}", headers=admin).json()
+        assert {s["name"] for s in detail["spans"]} >= {"app"}
+        assert c.get(f"/v1/admin/debug/profiles/{ids[0]}", headers=admin).status_code == 404  # 已被挤出
+        assert c.delete("/v1/admin/debug/profiles", headers=admin).json() == {"cleared": 2}
@@ -0,0 +1,73 @@
+# tests/test_sharding.py
+import time
+
+from etl.sharding import HashRing, ShardWorker, SqliteMembership, my_shard
+
+PORTS = [f"P{i:04d}" for i in range(500)]
+
+
+def test_ring_only_dead_workers_keys_move():
+    before = HashRing(["w1", "w2", "w3"])
+    after = HashRing(["w1", "w3"])
+    moved = [p for p in PORTS if before.owner(p) != after.owner(p)]
+    assert moved
+    assert all(before.owner(p) == "w2" for p in moved)
+
+
+def test_ring_covers_every_key_once():
+    ring = HashRing(["a", "b", "c", "d"])
+    parts = ring.assign(PORTS)
+    assert sorted(k for ks in parts.values() for k in ks) == sorted(PORTS)
+    assert all(ks for ks in parts.values())
+
+
+def test_sqlite_lease_expiry_rebalances(tmp_path):
+    m = SqliteMembership(str(tmp_path / "workers.db"))
+    w1 = ShardWorker(m, "w1", ttl=60).join()
+    w2 = ShardWorker(m, "w2", ttl=60).join()
+    w1.refresh()
+    assert sorted(w1.filter(PORTS) + w2.filter(PORTS)) == sorted(PORTS)
+
+    # w2 租约过期（模拟宕机）→ w1 刷新后接管全部
+    m.renew("w2", ttl=-1, now=time.time())
+    w1.refresh()
+    assert w1.filter(PORTS) == PORTS
+
+
+def test_my_shard_passthrough_without_dsn():
+    assert my_shard(["USLAX", "USNYC"], dsn="") == ["USLAX", "USNYC"]
+
+
+def test_sequential_one_shot_runs_each_cover_every_key(tmp_path):
+    # cron 式的连续运行：每次都是新 pid，上一次退出时已离开，不会占着一段 key
+    import os
+    import subprocess
+    import sys
+
+    env = {**os.environ, "ETL_SHARD_DSN": f"sqlite:///{tmp_path / 'workers.db'}", "ETL_SHARD_SETTLE_SECONDS": "0.1"}
+    env.pop("ETL_WORKER_ID", None)
+    code = "from etl.sharding import my_shard; print(len(my_shard([f'P{i:02d}' for i in range(30)])))"
+    runs = [subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True,
+                           cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+            for _ in range(3)]
+    assert runs == ["30", "30", "30"]
+    assert SqliteMembership(str(tmp_path / "workers.db")).alive() == []
+
+
+def test_one_shot_jobs_started_together_split_keys_once(tmp_path):
+    # cron 同时拉起：后入环的晚一点，先到的不能按“只有自己”的环拿走全部 key
+    import os
+    import subprocess
+    import sys
+
+    env = {**os.environ, "ETL_SHARD_DSN": f"sqlite:///{tmp_path / 'workers.db'}", "ETL_SHARD_SETTLE_SECONDS": "1"}
+    env.pop("ETL_WORKER_ID", None)
+    code = "from etl.sharding import my_shard; print(','.join(my_shard([f'P{i:02d}' for i in range(30)])))"
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    procs = []
+    for _ in range(2):
+        procs.append(subprocess.Popen([sys.executable, "-c", code], env=env, cwd=cwd, stdout=subprocess.PIPE, text=True))
+        time.sleep(0.3)
+    parts = [p.communicate(timeout=30)[0].strip().split(",") for p in procs]
+    assert all(p != [""] for p in parts)
+    assert sorted(parts[0] + parts[1]) == [f"P{i:02d}" for i in range(30)]
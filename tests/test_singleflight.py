@@ -0,0 +1,53 @@
+# tests/test_singleflight.py
+import asyncio
+
+import pytest
+
+from app.services.port_data import Backend, PortDataRepository
+from app.services.singleflight import SingleFlight
+
+
+class _Slow(Backend):
+    name = "db"
+
+    def __init__(self, delay):
+        self.delay, self.calls = delay, 0
+
+    async def load(self, kind, unlocode, tz):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return [{"date": "2026-01-01", "vessels": 1, "src": "db"}]
+
+
+def test_concurrent_misses_share_one_load_and_survive_cancellation():
+    b = _Slow(0.05)
+    repo = PortDataRepository([b])
+
+    async def main():
+        tasks = [asyncio.ensure_future(repo.series("trend", "USLAX")) for _ in range(20)]
+        await asyncio.sleep(0.01)
+        tasks[0].cancel()  # leader 的客户端断开：其余等待者不受影响
+        done = await asyncio.gather(*tasks, return_exceptions=True)
+        assert isinstance(done[0], asyncio.CancelledError)
+        assert all(r[1] == "db" for r in done[1:])
+
+    asyncio.run(main())
+    assert b.calls == 1
+
+
+def test_timeout_fails_the_flight_and_next_call_retries():
+    sf = SingleFlight("t", timeout=0.01)
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(1)
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.gather(sf.do("k", slow), sf.do("k", slow))
+        assert sf.inflight() == 0
+        assert await sf.do("k", lambda: asyncio.sleep(0, result=42)) == 42
+
+    asyncio.run(main())
+    assert calls == [1]
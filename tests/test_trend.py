@@ -0,0 +1,21 @@
+# tests/test_trend.py
+from fastapi.testclient import TestClient
+
+H = {"X-API-Key": "dev_demo_123"}
+
+
+def test_default_shape_is_the_original_contract_and_fields_opt_in(monkeypatch):
+    monkeypatch.setenv("DISABLE_WARMUP", "1")
+    from app.main import create_app
+
+    with TestClient(create_app()) as c:
+        j = c.get("/v1/ports/USLAX/trend?days=7", headers=H).json()
+        assert set(j) == {"unlocode", "as_of", "points"} and len(j["points"]) == 7
+        assert all(set(p) == {"date", "congestion_score"} and 0 <= p["congestion_score"] <= 1 for p in j["points"])
+        assert c.get("/v1/ports/USLAX/trend?days=7&format=csv", headers=H).text.startswith("date,congestion_score\n")
+
+        j = c.get("/v1/ports/USLAX/trend?days=7&limit=3&fields=vessels,congestion_score", headers=H).json()
+        assert j["days"] == 7 and [set(p) for p in j["points"]] == [{"date", "vessels", "congestion_score", "src"}] * 3
+        assert all(p["congestion_score"] > 1 for p in j["points"])  # 0–100 原始分
+        csv = c.get("/v1/ports/USLAX/trend?days=7&limit=3&format=csv&fields=vessels", headers=H).text
+        assert csv.splitlines()[0] == "date,vessels,src" and len(csv.splitlines()) == 4
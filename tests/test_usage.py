@@ -0,0 +1,94 @@
+# tests/test_usage.py
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.services import usage
+
+
+class _FailingStore:
+    async def upsert(self, rows):
+        raise ConnectionError("down")
+
+
+def test_meter_batches_deltas_and_keeps_them_when_the_store_fails(tmp_path, monkeypatch):
+    meter = usage.Meter()
+    for n in (100, 50):
+        meter.record("pp_live_1", "/v1/ports/{unlocode}/trend", 200, n)
+    meter.record("pp_live_1", "/v1/ports/{unlocode}/trend", 304, 0)
+
+    monkeypatch.setattr(usage, "_STORE", _FailingStore())
+    assert asyncio.run(meter.flush()) == 0 and len(meter.pending) == 2  # 失败：并回内存
+
+    store = usage.SqliteUsageStore(str(tmp_path / "usage.db"))
+    monkeypatch.setattr(usage, "_STORE", store)
+    assert asyncio.run(meter.flush()) == 2 and not meter.pending
+    meter.record("pp_live_1", "/v1/ports/{unlocode}/trend", 200, 10)
+    asyncio.run(meter.flush())  # 第二批：累加而不是覆盖
+    rows = asyncio.run(store.query(usage.key_id("pp_live_1"), "2000-01-01"))
+    assert sorted((r[2], r[3], r[4], r[5]) for r in rows) == [
+        ("/v1/ports/{unlocode}/trend", 200, 3, 160), ("/v1/ports/{unlocode}/trend", 304, 1, 0)]
+
+
+def test_usage_endpoint_reports_the_calling_key_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(usage, "_STORE", usage.SqliteUsageStore(str(tmp_path / "usage.db")))
+    monkeypatch.setattr(usage, "METER", usage.Meter())
+    monkeypatch.setenv("DISABLE_WARMUP", "1")
+    from app.main import create_app
+
+    with TestClient(create_app()) as c:
+        h = {"X-API-Key": "dev_demo_123"}
+        assert c.get("/v1/ports/USLAX/trend", headers=h).status_code == 200
+        assert c.get("/v1/ports/ZZZZZ/trend", headers=h).status_code == 404
+        body = c.get("/v1/usage", headers=h).json()
+    assert body["key_id"] == usage.key_id("dev_demo_123") and body["total"]["requests"] == 2
+    assert {(r["route"], r["status"]) for r in body["routes"]} == {
+        ("/v1/ports/{unlocode}/trend", 200), ("/v1/ports/{unlocode}/trend", 404)}
+
+
+def test_cancelled_flush_neither_loses_nor_double_counts(monkeypatch):
+    class _SlowStore:
+        def __init__(self, fail):
+            self.fail, self.rows = fail, []
+
+        async def upsert(self, rows):
+            await asyncio.sleep(0.05)
+            if self.fail:
+                raise ConnectionError("down")
+            self.rows += rows
+
+    async def cancel_mid_write(meter):
+        task = asyncio.ensure_future(meter.flush())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    for fail in (False, True):
+        store = _SlowStore(fail)
+        monkeypatch.setattr(usage, "_STORE", store)
+        meter = usage.Meter()
+        meter.record("pp_live_1", "/v1/ports/{unlocode}/trend", 200, 100)
+        assert asyncio.run(cancel_mid_write(meter))
+        # 写成功：不并回（否则最后一次刷新会重复计数）；写失败：并回内存
+        assert (len(store.rows), len(meter.pending)) == ((0, 1) if fail else (1, 0))
+
+
+def test_locked_database_surfaces_the_lock_error(tmp_path, monkeypatch):
+    import sqlite3
+
+    import pytest
+
+    store = usage.SqliteUsageStore(str(tmp_path / "usage.db"))
+    monkeypatch.setattr(store, "_connect", lambda: sqlite3.connect(store.path, timeout=0, isolation_level=None))
+    holder = sqlite3.connect(store.path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")  # 另一个 worker 正在写
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            store._upsert([("2026-10-19", "k", "/v1/ports/{unlocode}/trend", 200, 1, 10)])
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
@@ -0,0 +1,40 @@
+# tests/test_warmup.py
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import port_data, warmup
+
+
+def test_ready_gate_opens_after_warmup(monkeypatch):
+    monkeypatch.setenv("WARMUP_PORTS", "USLAX,USNYC")
+    with TestClient(app) as c:
+        deadline = time.monotonic() + 10
+        r = c.get("/v1/ready")
+        while r.status_code == 503 and time.monotonic() < deadline:
+            assert r.headers["retry-after"] == "1"
+            time.sleep(0.05)
+            r = c.get("/v1/ready")
+        assert r.status_code == 200 and r.json()["failed"] == 0
+        assert r.json()["warmed"] == r.json()["total"] > 0
+        assert c.get("/v1/health").status_code == 200
+
+    repo = port_data.get_repository()
+    assert ("merged", "dwell", "USNYC", "UTC") in repo._cache
+
+
+def test_ports_from_yaml(tmp_path, monkeypatch):
+    f = tmp_path / "ports.yaml"
+    f.write_text("ports:\n  - {unlocode: USLAX, name: x}\n  - {unlocode: 'NLRTM', name: y}\n")
+    monkeypatch.setenv("WARMUP_PORTS", str(f))
+    assert warmup.warm_ports() == ["USLAX", "NLRTM"]
+
+
+def test_error_responses_count_as_failed(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(warmup, "WARM_PATHS", (("/v1/ports/{u}/trend", "days=7"),))
+    st = asyncio.run(warmup.run(app, ["USLAX", "ZZZZZ"]))  # ZZZZZ → 404
+    n = 1 + len(warmup.compression.CODECS)
+    assert st["ready"] and st["warmed"] == st["total"] == 2 * (2 + n) and st["failed"] == n